@@ -4,17 +4,44 @@
 """Client module."""
 
 import configparser
+import functools
 import json
 import logging.config
+import multiprocessing
 import os
+import queue
+import select
+import sys
+import threading
 import time
 
 from argparse import ArgumentParser, RawTextHelpFormatter
-from executor import Executor, ExecutionError
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from count_cache import CountCache
+from executor import Executor, ExecutionError, ignore_sigint, \
+    init_worker, run_job
 from http import client
+from log_queue import RateLimitedLog, start_queue_logging
+from result_buffer import RejectedResults, ResultBuffer
+from urllib.parse import urlencode
 
 ENV_DIR = '/home/ruslan/git/task_manager/client'
 CONF_ROOT = f'{ENV_DIR}/etc'
+# Bytes of job lines sent in one chunk by batch submission.
+BATCH_CHUNK = 65536
+# CPU heavy job types executed in process pool.
+PROCESS_JOBS = ('count', 'count_approx')
+# Job types executed by small pre-forked launcher processes.
+LAUNCHER_JOBS = ('execute', )
+# Min seconds between repeated log messages of job polling.
+POLL_LOG_INTERVAL = 60
+# Max amount of jobs claimed by one request, server rejects more.
+MAX_CLAIM = 100
+# Requests repeated after their connection turned out to be closed.
+# Repeated results of finished jobs are dropped by server.
+IDEMPOTENT_METHODS = ('GET', 'PUT')
 
 def args_parser():
     # Parsing command line arguments to run API.
@@ -32,13 +59,16 @@ def args_parser():
                                                     ' type and task argument')
     task = subsubparsers.add_parser('task', help='Create task')
     task.add_argument('-j', '--job_type',
-                      choices=['count', 'create_f', 'create_d',
-                               'delete_f', 'delete_d', 'execute', 'random'],
+                      choices=['count', 'count_approx', 'create_f',
+                               'create_d', 'delete_f', 'delete_d',
+                               'execute', 'random'],
                       required=True,
                       action='store',
                       help="Job type.\nSelect from "
                            "('count', 'create', 'delete', 'execute')\n"
                            "count - count unique words in file;\n"
+                           "count_approx - estimate unique words in files\n"
+                           "               or saved .hll sketches;\n"
                            "create_f - create file;\n"
                            "create_d - create directory;\n"
                            "delete_f - delete file;\n"
@@ -52,7 +82,32 @@ def args_parser():
                       help='Task paramater:\n'
                            'For (`count`, `create`, `delete`) '
                            'task types - file path\n'
+                           'For `count_approx` task type - '
+                           'space separated paths\n'
                            'For `execute` task_type - command')
+    task.add_argument('-p', '--priority',
+                      type=int,
+                      choices=range(10),
+                      metavar='0..9',
+                      action='store',
+                      help='Job priority, higher priority jobs are\n'
+                           'claimed first. By default 0.')
+    task.add_argument('--affinity',
+                      metavar='host or label',
+                      action='store',
+                      help='Workers of this host or label get job first,\n'
+                           'empty for any worker. By default file jobs\n'
+                           'are pinned to submitting host.')
+    batch = subsubparsers.add_parser('batch', help='Create tasks from file')
+    batch.add_argument('-f', '--file',
+                       default='-',
+                       metavar='jobs file',
+                       action='store',
+                       help='JSONL file with one job per line, for e.g.:\n'
+                            '{"job_type": "count", "job_arg": "/tmp/abc",\n'
+                            ' "priority": 5}, priority and affinity are\n'
+                            'optional.\n'
+                            'By default jobs are read from stdin.')
     # random_task = subsubparsers.add_parser('random', help='Create random tasks')
     # random_task.add_argument(dest='task_amount',
     #                          type=int,
@@ -61,30 +116,39 @@ def args_parser():
     return parser.parse_args().__dict__
 
 
-class Connection:
+class Connection(client.HTTPConnection):
 
-    """Connection context manager."""
+    """HTTP connection that tells if failed request may be repeated."""
 
-    def __init__(self, host, port):
-        """Initialize tcp server"""
-        self.__host = host
-        self.__port = port
-        self.__tcp = self.__host + ':' + self.__port
+    method = None
+    sent = False
 
-    def __enter__(self):
-        """Open connection."""
-        try:
-            self.conn = client.HTTPConnection(self.__tcp)
-        except Exception as error:
-            self.logger.error(f"Cannot connect to the server: {error}")
-            raise
-        return self.conn
+    def request(self, method, url, *args, **kwargs):
+        """Send request.
+
+        Server may close idle persistent connection, so before request
+        that must not be repeated connection is checked and opened again
+        if server closed it.
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """Close connection."""
-        self.conn.close()
-        if exc_val:
-            raise
+        :Parameters:
+            - `method`: a string with HTTP method.
+            - `url`: a string with request path.
+            - `args`, `kwargs`: other `HTTPConnection.request` arguments.
+        """
+        self.method = method
+        self.sent = False
+        if method not in IDEMPOTENT_METHODS and self.sock is not None:
+            # Idle connection is readable only at EOF or error.
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if readable:
+                self.close()
+        super().request(method, url, *args, **kwargs)
+        self.sent = True
+
+    @property
+    def repeatable(self):
+        """True if last request is idempotent or was not sent."""
+        return self.method in IDEMPOTENT_METHODS or not self.sent
 
 
 class TaskManager:
@@ -102,7 +166,11 @@ class TaskManager:
         # Logger initialization.
         logger_file = os.path.join(CONF_ROOT, "logger.conf")
         logging.config.fileConfig(logger_file)
+        # File and console output is written by background threads.
+        start_queue_logging('', 'task_manager')
         self.logger = logging.getLogger('task_manager')
+        # Polling repeats same messages, they are written once a minute.
+        self._poll_log = RateLimitedLog(self.logger, POLL_LOG_INTERVAL)
         # Config initialization.
         config_file = os.path.join(CONF_ROOT, "client.conf")
         self.config = configparser.RawConfigParser()
@@ -111,18 +179,117 @@ class TaskManager:
         self._executor = Executor(self.logger)
         self.__host = self.config.get('server', 'host')
         self.__port = self.config.get('server', 'port')
+        # Persistent connection of every thread talking to server.
+        self.__local = threading.local()
+        self.__connections = []
+        self.__connections_lock = threading.Lock()
         # Wait time for checking jobs
         self.timeout = eval(self.config.get('job_executor', 'timeout'))
+        # Seconds server holds get_job request waiting for jobs.
+        self.long_poll = self.config.getfloat('job_executor', 'long_poll',
+                                              fallback=0)
+        # Pool sizes and max amount of claimed not reported jobs.
+        self.threads = self.config.getint('job_executor', 'threads',
+                                          fallback=4)
+        self.processes = self.config.getint('job_executor', 'processes',
+                                            fallback=os.cpu_count())
+        self.prefetch = self.config.getint(
+            'job_executor', 'prefetch',
+            fallback=2 * (self.threads + self.processes))
+        # Results are reported by batches of `report_batch` results
+        # or every `report_interval` seconds.
+        self.report_batch = self.config.getint('job_executor', 'report_batch',
+                                               fallback=50)
+        self.report_interval = self.config.getfloat(
+            'job_executor', 'report_interval', fallback=1)
+        # Seconds between lease extensions of claimed jobs, 0 disables
+        # them. Should be well below lease duration of server.
+        self.heartbeat = self.config.getfloat('job_executor', 'heartbeat',
+                                              fallback=60)
+        # Host identity and comma separated labels advertised when
+        # claiming, jobs pinned to them or to client address go first.
+        self.worker_host = self.config.get('job_executor', 'host',
+                                           fallback='')
+        self.labels = self.config.get('job_executor', 'labels', fallback='')
+        # File with not reported results.
+        self.report_spool = self.config.get(
+            'job_executor', 'report_spool',
+            fallback='/tmp/task_manager_results.spool')
         # Length of generated random file names.
         self.rand_len = eval(self.config.get('shared_dir', 'random_file_length'))
         # Directory to save shell commands output.
         self.dump_dir = self.config.get('shared_dir', 'dump_dir')
+        # Limits of execute jobs run time and output size.
+        self.execute_timeout = self.config.getfloat('execute', 'timeout',
+                                                    fallback=None)
+        self.execute_max_output = self.config.getint('execute', 'max_output',
+                                                     fallback=None)
+        # Amount of launcher processes of execute jobs.
+        self.launchers = self.config.getint('execute', 'launchers',
+                                            fallback=2)
+        # HyperLogLog precision of count_approx jobs.
+        self.precision = self.config.getint('count_approx', 'precision',
+                                            fallback=14)
+        # Cached count results in memory and optional dbm file with them.
+        self.cache_size = self.config.getint('count_cache', 'size',
+                                             fallback=1024)
+        self.cache_path = self.config.get('count_cache', 'path',
+                                          fallback=None)
+
+    def connection(self):
+        """Get persistent connection of current thread.
+
+        `HTTPConnection` opens socket again on next request after server
+        closed it, so connection is created once per thread.
+
+        :Returns:
+            Connection instance.
+        """
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            conn = Connection(f'{self.__host}:{self.__port}')
+            self.__local.conn = conn
+            with self.__connections_lock:
+                self.__connections.append(conn)
+        return conn
+
+    def close_connections(self):
+        """Close persistent connections of all threads."""
+        with self.__connections_lock:
+            for conn in self.__connections:
+                conn.close()
 
     def with_connection(func):
-        """Connection decorator."""
+        """Connection decorator.
+
+        Passes persistent connection of current thread. If server closed
+        idle connection, request is repeated once on new one when it is
+        idempotent or was not sent, so no job is submitted twice.
+        Connection is closed after other errors, as response may be left
+        unread.
+        """
+        @functools.wraps(func)
         def execute_func(self, *args, **kwargs):
-            with Connection(self.__host, self.__port) as conn:
-                func(self, conn, *args, **kwargs)
+            conn = self.connection()
+            reused = conn.sock is not None
+            try:
+                return func(self, conn, *args, **kwargs)
+            except ConnectionError as error:
+                conn.close()
+                if not reused:
+                    self.logger.error('Cannot connect to the server: %s',
+                                      error)
+                    raise
+                if not conn.repeatable:
+                    self.logger.error('Connection closed after %s request '
+                                      'was sent, not repeating it: %s',
+                                      conn.method, error)
+                    raise
+                self.logger.debug('Reconnecting to the server: %s', error)
+            except Exception:
+                conn.close()
+                raise
+            return func(self, conn, *args, **kwargs)
         return execute_func
 
     def get_response(self, conn, expected_status=200):
@@ -134,6 +301,7 @@ class TaskManager:
                                 by default 200.
         """
         rsp = conn.getresponse()
+        rsp.read()
         print(rsp.status, rsp.reason)
         if rsp.status == expected_status:
             self.logger.info(rsp.reason)
@@ -141,87 +309,412 @@ class TaskManager:
             self.logger.error(rsp.reason)
 
     @with_connection
-    def send_task(self, conn, job_type, job_arg):
+    def send_task(self, conn, job_type, job_arg, priority=None,
+                  affinity=None):
         """Send created job to server.
 
          :Parameters:
             - `conn`: connection object to server. It comes from decorator.
             - `job_type`: a string with type of job.
             - `job_arg`: a string with job argument(file path or shell command).
+            - `priority`: job priority. by default priority of server.
+            - `affinity`: host or label of workers preferred for job.
+                          by default affinity of server.
         """
         cmd = 'task'
         data = {'job_type' : job_type, 'job_arg' : job_arg}
+        if priority is not None:
+            data['priority'] = priority
+        if affinity is not None:
+            data['affinity'] = affinity
         data = json.dumps(data)
         conn.request('POST', cmd, body=data)
-        self.logger.debug(f'POST: {data}')
+        self.logger.debug('POST: %s', data)
         self.get_response(conn, 201)
 
-    def get_job(self, conn):
-        """Get job.
+    def send_batch(self, jobs_file):
+        """Stream jobs from JSONL file to server in one request.
+
+        Streamed body can not be sent again, so request always goes over
+        new connection instead of possibly stale persistent one.
 
         :Parameters:
-            - `conn`: connection object to server.
+            - `jobs_file`: file object with one json job per line.
+        """
+        conn = self.connection()
+        conn.close()
+        def chunks():
+            # Group lines to avoid chunk per line overhead.
+            chunk = []
+            size = 0
+            for line in jobs_file:
+                chunk.append(line.encode())
+                size += len(chunk[-1])
+                if size >= BATCH_CHUNK:
+                    yield b''.join(chunk)
+                    chunk = []
+                    size = 0
+            if chunk:
+                yield b''.join(chunk)
+
+        conn.request('POST', 'task', body=chunks(),
+                     headers={'Content-Type': 'application/x-ndjson'},
+                     encode_chunked=True)
+        rsp = conn.getresponse()
+        print(rsp.status, rsp.reason)
+        try:
+            summary = json.loads(rsp.read())
+        except json.decoder.JSONDecodeError:
+            self.logger.error("Error: Can't submit jobs: %s", rsp.reason)
+            return
+        self.logger.info('Created %d jobs', summary['created'])
+        for error in summary['errors']:
+            self.logger.error('Job %s: %s', error['index'], error['error'])
 
-        :Exceptions:
-            - `json.decoder.JSONDecodeError`: is raised when
-                                              failed to get a job.
+    @with_connection
+    def get_jobs(self, conn, max_jobs):
+        """Claim jobs, waiting up to `long_poll` seconds for them.
+
+        :Parameters:
+            - `conn`: connection object to server. It comes from decorator.
+            - `max_jobs`: max amount of jobs to claim.
 
         :Returns:
-            1) dictionary with job info. for e.g.:
-               {'id': 1, 'client_host': 'localhost',
-                'job_type': 'command', 'job_arg': 'ls -la'}
-            2) empty dictionary if no jobs to do.
+            (jobs, retry) tuple, where jobs are
+            1) list with dictionaries of job info. for e.g.:
+               [{'id': 1, 'client_host': 'localhost',
+                 'job_type': 'command', 'job_arg': 'ls -la'}]
+            2) empty list if no jobs to do.
             3) None if error occurred
+            and retry is seconds of Retry-After header of server that
+            could not wait for jobs, otherwise None.
         """
-        conn.request('GET', 'get_job')
+        params = {'max': max_jobs}
+        if self.long_poll:
+            params['wait'] = self.long_poll
+        if self.worker_host:
+            params['host'] = self.worker_host
+        if self.labels:
+            params['labels'] = self.labels
+        cmd = f'get_job?{urlencode(params)}'
+        conn.request('GET', cmd)
         rsp = conn.getresponse()
-        print(rsp.status, rsp.reason)
+        self._poll_log.log(logging.DEBUG, 'GET %s: %s %s', cmd, rsp.status,
+                           rsp.reason)
         data_received = rsp.read()
         try:
-            job_info = json.loads(data_received)
+            jobs = json.loads(data_received)
         except json.decoder.JSONDecodeError:
             self.logger.error("Error: Can't receive a job")
-            job_info = None
-        return job_info
+            jobs = None
+        try:
+            retry = float(rsp.getheader('Retry-After'))
+        except (TypeError, ValueError):
+            retry = None
+        return jobs, retry
 
-    def update_result(self, conn, job_info, result_info):
-        """Send a request with job result update.
+    @with_connection
+    def update_results(self, conn, results):
+        """Send a request with results of many jobs.
 
         :Parameters:
-            - `conn`: connection object to server.
-            - `job_info`: a dictionary with job information.
-            - `result_info`: a dictionary with job result information. for e.g.:
-                             {'result_info': 'File test.txt created',
-                              'result': 'PASS'}
+            - `conn`: connection object to server. It comes from decorator.
+            - `results`: list of (job_info, result_info) pairs. for e.g.:
+                         [({'id': 1, 'stime': 1553207811},
+                           {'result_info': 'File test.txt created',
+                            'result': 'PASS'})]
+
+        :Exceptions:
+            - `RejectedResults`: is raised if server rejected results
+                                 with 4xx status.
+            - `http.client.HTTPException`: is raised if server
+                                           failed to update jobs.
         """
-        to_update = (job_info, result_info)
-        conn.request('PUT', 'job_result', body=json.dumps(to_update))
-        self.get_response(conn)
+        conn.request('PUT', 'job_result', body=json.dumps(results))
+        rsp = conn.getresponse()
+        data_received = rsp.read()
+        if 400 <= rsp.status < 500:
+            raise RejectedResults(f'{rsp.status} {rsp.reason}')
+        if rsp.status != 200:
+            raise client.HTTPException(f'{rsp.status} {rsp.reason}')
+        self.logger.debug('Reported %d results', len(results))
+        try:
+            dropped = json.loads(data_received).get('dropped')
+        except (ValueError, AttributeError):
+            # Server without summary in response.
+            dropped = None
+        if dropped:
+            self.logger.warning('Server dropped results of jobs not held '
+                                'by this worker: %s', dropped)
 
     @with_connection
-    def check_job(self, conn):
-        """Checking for jobs to do.
+    def extend_leases(self, conn, ids):
+        """Send heartbeat of claimed jobs, so server keeps them.
 
         :Parameters:
-            - `conn`: connection object to server.
+            - `conn`: connection object to server. It comes from decorator.
+            - `ids`: list of job ids.
+
+        :Exceptions:
+            - `http.client.HTTPException`: is raised if server
+                                           failed to extend leases.
+
+        :Returns:
+            list of ids of jobs that server does not hold anymore.
+        """
+        conn.request('PUT', 'heartbeat', body=json.dumps(ids))
+        rsp = conn.getresponse()
+        data_received = rsp.read()
+        if rsp.status != 200:
+            raise client.HTTPException(f'{rsp.status} {rsp.reason}')
+        return json.loads(data_received)['lost']
+
+    def send_heartbeats(self):
+        """Extend leases of jobs claimed and not reported yet."""
+        while not self._heartbeat_stop.wait(self.heartbeat):
+            with self._claimed_lock:
+                ids = list(self._claimed)
+            if not ids:
+                continue
+            try:
+                lost = self.extend_leases(ids)
+            except (OSError, ValueError, client.HTTPException) as error:
+                self.logger.error('Error when sending heartbeat: %s', error)
+                continue
+            self.logger.debug('Extended leases of %d jobs', len(ids))
+            if lost:
+                self.logger.warning('Jobs %s were requeued by server', lost)
+
+    def check_job(self):
+        """Checking for jobs to do.
+
+        Fetcher thread claims jobs while there are free places among
+        `prefetch` in-flight jobs and passes them to pools, main thread
+        buffers results of finished jobs to report them by batches.
 
         :Exceptions:
             - `KeyboardInterrupt`: is raised when press Ctrl+C
                                    to stop checking jobs.
         """
+        self._threads = ThreadPoolExecutor(max_workers=self.threads,
+                                           thread_name_prefix='job')
+        self._processes = self.create_processes()
+        self._launchers = self.create_launchers()
+        self._slots = threading.Semaphore(self.prefetch)
+        self._finished = queue.Queue()
+        self._stop = threading.Event()
+        # Ids of claimed jobs that are not reported yet.
+        self._claimed = set()
+        self._claimed_lock = threading.Lock()
+        self._heartbeat_stop = threading.Event()
+        if self.heartbeat:
+            threading.Thread(target=self.send_heartbeats, name='heartbeat',
+                             daemon=True).start()
+        self._count_cache = CountCache(self.cache_size, self.logger,
+                                       self.cache_path)
+        self._results = ResultBuffer(self.update_results, self.report_spool,
+                                     self.report_batch, self.report_interval,
+                                     self.logger)
+        fetcher = threading.Thread(target=self.fetch_jobs, name='fetcher')
+        fetcher.start()
         try:
             while True:
-                job_info = self.get_job(conn)
-                if not job_info:
-                    self.logger.info('No avalaible job')
-                    time.sleep(self.timeout)
-                    continue
-                self.logger.info(f'Received job: {job_info}')
-                result_info = self.execute_job(job_info)
-                self.update_result(conn, job_info, result_info)
-
+                self.report_job(*self._finished.get())
         except KeyboardInterrupt:
-            print('\nStop checking jobs')
+            print('\nStop checking jobs, waiting for in-flight jobs')
+            self._stop.set()
+            # Jobs claimed by last request are executed as well.
+            fetcher.join()
+            self._threads.shutdown(wait=True)
+            self._processes.shutdown(wait=True)
+            self._launchers.shutdown(wait=True)
+            while not self._finished.empty():
+                self.report_job(*self._finished.get_nowait())
+            self._heartbeat_stop.set()
+            if not self._results.close():
+                print(f'Not reported results are saved to '
+                      f'{self.report_spool}')
+            self.logger.info('Count cache hits %d, misses %d',
+                             self._count_cache.hits, self._count_cache.misses)
+            self._count_cache.close()
+            self.close_connections()
+
+    def create_processes(self):
+        """Create process pool of CPU heavy jobs.
+
+        Chunks of big files are counted by cpu_count // processes
+        processes of every job process.
+
+        :Returns:
+            ProcessPoolExecutor instance.
+        """
+        return ProcessPoolExecutor(
+            max_workers=self.processes, initializer=init_worker,
+            initargs=(os.cpu_count() // self.processes, ))
+
+    def create_launchers(self):
+        """Create pool of launchers of execute jobs.
+
+        Launchers are forked from small fork server instead of this
+        process, so commands are spawned without copying its memory.
+
+        :Returns:
+            ProcessPoolExecutor instance.
+        """
+        launcher_context = multiprocessing.get_context('forkserver')
+        launcher_context.set_forkserver_preload(['executor'])
+        return ProcessPoolExecutor(max_workers=self.launchers,
+                                   mp_context=launcher_context,
+                                   initializer=ignore_sigint)
+
+    def fetch_jobs(self):
+        """Claim jobs for free places in pools until stop is requested."""
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=1):
+                continue
+            free = 1
+            while free < min(self.prefetch, MAX_CLAIM) and \
+                    self._slots.acquire(False):
+                free += 1
+            start = time.monotonic()
+            retry = None
+            try:
+                jobs, retry = self.get_jobs(free)
+            except (OSError, client.HTTPException) as error:
+                self.logger.error('Error when getting jobs: %s', error)
+                jobs = None
+            for _ in range(free - len(jobs or ())):
+                self._slots.release()
+            if not jobs:
+                self._poll_log.log(logging.INFO, 'No avalaible job')
+                # Server without free waiters tells when to claim
+                # again, older server answers before long poll deadline.
+                elapsed = time.monotonic() - start
+                if retry is not None:
+                    self._stop.wait(min(retry, self.timeout))
+                elif not self.long_poll or elapsed < self.long_poll / 2:
+                    self._stop.wait(self.timeout)
+                continue
+            for job_info in jobs:
+                self.start_job(job_info)
+
+    def start_job(self, job_info):
+        """Pass job to process pool for CPU heavy jobs, to launchers
+        for shell commands or to thread pool for others.
+
+        Results of count jobs for unchanged files are taken from cache.
+
+        :Parameters:
+            - `job_info`: a dictionary with job information.
+        """
+        self.logger.debug('Received job: %s', job_info)
+        with self._claimed_lock:
+            self._claimed.add(job_info['id'])
+        job_type = job_info['job_type']
+        cache_key = None
+        if job_type == 'count':
+            cache_key = self._count_cache.key(job_info['job_arg'])
+            cached = cache_key and self._count_cache.get(cache_key)
+            if cached:
+                self.logger.debug('Count cache hit for %s (hits %d, misses %d)',
+                                  job_info['job_arg'], self._count_cache.hits,
+                                  self._count_cache.misses)
+                future = Future()
+                future.set_result({'result_info': f'{cached} (cached)',
+                                   'result': 'PASS'})
+                self._finished.put((job_info, future))
+                return
+        try:
+            if job_type in PROCESS_JOBS:
+                future = self._processes.submit(run_job, job_type,
+                                                *self.job_args(job_info))
+            elif job_type in LAUNCHER_JOBS:
+                future = self._launchers.submit(run_job, job_type,
+                                                *self.job_args(job_info))
+            else:
+                future = self._threads.submit(self.execute_job, job_info)
+        except Exception as error:
+            # Killed pool process, for e.g. by OOM killer, breaks whole
+            # pool. Job is reported failed, so server stops holding it,
+            # and next jobs go to new pool.
+            if isinstance(error, BrokenProcessPool):
+                self.restart_pool(job_type)
+            future = Future()
+            future.set_exception(error)
+            self._finished.put((job_info, future))
+            return
+        if cache_key:
+            future.add_done_callback(
+                lambda future: self.cache_count(cache_key, future))
+        future.add_done_callback(
+            lambda future: self._finished.put((job_info, future)))
+
+    def restart_pool(self, job_type):
+        """Replace broken process pool of job type with new one.
+
+        Jobs left in broken pool fail with `BrokenProcessPool` and are
+        reported by their done callbacks.
+
+        :Parameters:
+            - `job_type`: a string with type of job.
+        """
+        if job_type in LAUNCHER_JOBS:
+            self.logger.error('Launcher pool is broken, restarting it')
+            self._launchers.shutdown(wait=False)
+            self._launchers = self.create_launchers()
+        else:
+            self.logger.error('Process pool is broken, restarting it')
+            self._processes.shutdown(wait=False)
+            self._processes = self.create_processes()
+
+    def cache_count(self, cache_key, future):
+        """Save successful count result to cache.
+
+        :Parameters:
+            - `cache_key`: a string with file identity.
+            - `future`: finished future of count job.
+        """
+        if future.exception() is None:
+            result_info = future.result()
+            if result_info['result'] == 'PASS':
+                self._count_cache.put(cache_key, result_info['result_info'])
+
+    def report_job(self, job_info, future):
+        """Buffer result of finished job and free its place.
+
+        :Parameters:
+            - `job_info`: a dictionary with job information.
+            - `future`: finished future of job.
+        """
+        try:
+            result_info = future.result()
+        except Exception as error:
+            self.logger.error('Job %s failed: %s', job_info, error)
+            result_info = {'result_info': str(error), 'result': 'ERROR'}
+        self._results.add(job_info, result_info)
+        with self._claimed_lock:
+            self._claimed.discard(job_info['id'])
+        self._slots.release()
+
+    def job_args(self, job_info):
+        """Get `Executor.execute` arguments of job.
+
+        :Parameters:
+            - `job_info`: a dictionary with job information.
+
+        :Returns:
+            tuple of arguments following job type.
+        """
+        job_type = job_info['job_type']
+        job_arg = job_info['job_arg']
+        if job_type == 'execute':
+            return (job_arg, self.dump_dir, job_info['id'],
+                    self.execute_timeout, self.execute_max_output)
+        if job_type == 'random':
+            return job_arg, self.rand_len, self.dump_dir
+        if job_type == 'count_approx':
+            return job_arg, self.precision, self.dump_dir, job_info['id']
+        return job_arg,
 
     def execute_job(self, job_info):
         """Execute job.
@@ -238,21 +731,14 @@ class TaskManager:
         """
         job_type = job_info['job_type']
         job_arg = job_info['job_arg']
-        self.logger.info(f'Executing task: {job_type} {job_arg}')
+        self.logger.debug('Executing task: %s %s', job_type, job_arg)
         try:
-            if job_type == 'execute':
-                result_info = self._executor.execute(job_type,
-                                                     job_arg,
-                                                     self.dump_dir,
-                                                     job_info['id'])
-            elif job_type == 'random':
-                jobs = self._executor.execute(job_type, job_arg,
-                                              self.rand_len, self.dump_dir)
-                for j_type, j_arg in jobs:
+            result_info = self._executor.execute(job_type,
+                                                 *self.job_args(job_info))
+            if job_type == 'random':
+                for j_type, j_arg in result_info:
                     self.send_task(j_type, j_arg)
                 result_info = f'Generated {job_arg} jobs.'
-            else:
-                result_info = self._executor.execute(job_type, job_arg)
             result = 'PASS'
         except ExecutionError as error:
             result_info = str(error)
@@ -266,6 +752,13 @@ if __name__ == "__main__":
     if args.get('job_executor'):
         task_manager.logger.info('Starting checking jobs for execution')
         task_manager.check_job()
+    elif args.get('file'):
+        task_manager.logger.info('Creating tasks from file')
+        if args['file'] == '-':
+            task_manager.send_batch(sys.stdin)
+        else:
+            with open(args['file']) as jobs_file:
+                task_manager.send_batch(jobs_file)
     # elif args.get('task_amount'):
     #     task_manager.logger.info('Start generate random tasks')
     #     task_manager.generate_random(args.get('task_amount'))
@@ -273,4 +766,5 @@ if __name__ == "__main__":
         task_manager.logger.info('Creating new task')
         job_type = args.get('job_type')
         job_arg = args.get('job_arg')
-        task_manager.send_task(job_type, job_arg)
+        task_manager.send_task(job_type, job_arg, args.get('priority'),
+                               args.get('affinity'))
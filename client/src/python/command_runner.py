@@ -0,0 +1,91 @@
+#!/usr/bin/env python3.7
+
+"""Running of shell commands with bounded time and output."""
+
+import os
+import selectors
+import signal
+import subprocess
+import time
+
+# Bytes read from command pipes at once.
+READ_SIZE = 65536
+
+
+def run_command(args, out, err, timeout=None, max_output=None):
+    """Run command streaming its stdout and stderr to files.
+
+    Output is never held in memory, command runs in its own session, so
+    it is not interrupted by Ctrl+C of worker, and whole session is
+    killed when time or output limit is exceeded.
+
+    :Parameters:
+        - `args`: list with command and its arguments.
+        - `out`: binary file object for stdout.
+        - `err`: binary file object for stderr.
+        - `timeout`: max seconds of command run. by default unlimited.
+        - `max_output`: max bytes of stdout and stderr together.
+                        by default unlimited.
+
+    :Exceptions:
+        - `OSError`: is raised if command can not be started.
+
+    :Returns:
+        a dictionary with command status. for e.g.:
+        {'returncode': 0, 'stdout_bytes': 120, 'stderr_bytes': 0,
+         'error': None}
+        `error` is 'timeout' or 'output limit' if command was killed.
+    """
+    proc = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            start_new_session=True)
+    deadline = time.monotonic() + timeout if timeout else None
+    files = {proc.stdout: out, proc.stderr: err}
+    sizes = {proc.stdout: 0, proc.stderr: 0}
+    error = None
+    try:
+        with selectors.DefaultSelector() as selector:
+            for pipe in files:
+                selector.register(pipe, selectors.EVENT_READ)
+            while selector.get_map() and not error:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        error = 'timeout'
+                        break
+                for key, _ in selector.select(remaining):
+                    data = os.read(key.fd, READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    if max_output is not None:
+                        allowed = max_output - sum(sizes.values())
+                        if len(data) > allowed:
+                            data = data[:allowed]
+                            error = 'output limit'
+                    files[key.fileobj].write(data)
+                    sizes[key.fileobj] += len(data)
+                    if error:
+                        break
+        if not error:
+            try:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(deadline - time.monotonic(), 0)
+                proc.wait(remaining)
+            except subprocess.TimeoutExpired:
+                error = 'timeout'
+    finally:
+        if error or proc.poll() is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+    return {'returncode': proc.returncode,
+            'stdout_bytes': sizes[proc.stdout],
+            'stderr_bytes': sizes[proc.stderr],
+            'error': error}
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3.7
+
+"""Cache of count job results keyed by file identity."""
+
+import collections
+import dbm
+import os
+import stat
+import threading
+import time
+
+
+class CountCache:
+
+    """LRU cache of count results with optional persistent tier.
+
+    Results are keyed by (device, inode, size, mtime_ns) of file, so any
+    modification of file makes its entry unreachable. Files without size,
+    like procfs files and pipes, are not cached. Memory tier keeps
+    `max_size` most recently used results, persistent tier is dbm file
+    that survives worker restarts and is pruned to `max_disk_size`.
+    """
+
+    def __init__(self, max_size, logger, path=None, max_disk_size=None):
+        """Initialize cache.
+
+        :Parameters:
+            - `max_size`: max amount of results in memory.
+            - `logger`: logging.logger instance.
+            - `path`: a string with path to dbm file of persistent tier.
+                      by default persistent tier is disabled.
+            - `max_disk_size`: max amount of results in persistent tier.
+                               by default 10 * `max_size`.
+        """
+        self.logger = logger
+        self.__max_size = max_size
+        self.__max_disk_size = max_disk_size or 10 * max_size
+        self.__memory = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__disk = None
+        if path:
+            try:
+                self.__disk = dbm.open(path, 'c')
+            except Exception as error:
+                self.logger.warning('Persistent count cache %s is '
+                                    'disabled: %s', path, error)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(file_path):
+        """Get cache key of file.
+
+        :Parameters:
+            - `file_path`: a string with path to file.
+
+        :Returns:
+            1) a string with file identity.
+            2) None if file can not be accessed or has no size.
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        # Identity of such files does not change with their data.
+        if not stat.S_ISREG(st.st_mode) or not st.st_size:
+            return None
+        return f'{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}'
+
+    def get(self, key):
+        """Get cached result.
+
+        :Parameters:
+            - `key`: a string from `key` method.
+
+        :Returns:
+            1) a string with cached result.
+            2) None if result is not cached.
+        """
+        with self.__lock:
+            result = self.__memory.get(key)
+            if result is not None:
+                self.__memory.move_to_end(key)
+            elif self.__disk is not None and key in self.__disk:
+                result = self.__disk[key].decode().split('\t', 1)[1]
+                self.__remember(key, result)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put(self, key, result):
+        """Cache result.
+
+        :Parameters:
+            - `key`: a string from `key` method.
+            - `result`: a string with job result.
+        """
+        with self.__lock:
+            self.__remember(key, result)
+            if self.__disk is not None:
+                self.__disk[key] = f'{time.time()}\t{result}'
+                if len(self.__disk) > self.__max_disk_size:
+                    self.__prune_disk()
+
+    def __remember(self, key, result):
+        """Put result to memory tier evicting least recently used."""
+        self.__memory[key] = result
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.__max_size:
+            self.__memory.popitem(last=False)
+
+    def __prune_disk(self):
+        """Remove quarter of least recently stored results from disk."""
+        stored = sorted((float(self.__disk[key].split(b'\t', 1)[0]), key)
+                        for key in self.__disk.keys())
+        for _, key in stored[:len(stored) // 4 or 1]:
+            del self.__disk[key]
+
+    def close(self):
+        """Close persistent tier."""
+        with self.__lock:
+            if self.__disk is not None:
+                self.__disk.close()
+                self.__disk = None
@@ -1,8 +1,37 @@
 #!/usr/bin/env python3.7
 
+import functools
+import logging
+import mmap
 import os
 import random
-import subprocess
+import re
+import signal
+import stat
+
+from command_runner import run_command
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from hyperloglog import HyperLogLog
+
+# Files from this size are counted in pool of processes.
+PARALLEL_COUNT_SIZE = 64 * 1024 * 1024
+# Min size of chunk counted by one process.
+COUNT_CHUNK_SIZE = 16 * 1024 * 1024
+# Size of data split to words at once.
+SPLIT_WINDOW = 1024 * 1024
+# Bytes at which chunks are split, same as bytes.split() separators.
+WHITESPACE = re.compile(rb'\s')
+# ASCII separators of str.split() missing in bytes.split() ones.
+SEPARATORS = bytes.maketrans(b'\x1c\x1d\x1e\x1f', b'    ')
+# Extension of saved HyperLogLog sketches.
+SKETCH_SUFFIX = '.hll'
+
+# Processes counting chunks of one file, set by `init_worker` in job
+# pool workers, so chunk pools of parallel jobs together fit CPU count.
+_chunk_workers = os.cpu_count()
+# Pool of chunk processes reused by all jobs of this process.
+_chunk_pool = None
 
 
 class ExecutionError(Exception):
@@ -10,6 +39,161 @@ class ExecutionError(Exception):
     pass
 
 
+def split_words(data):
+    """Split bytes to words.
+
+    ASCII data is split as bytes on same separators as str.split(), other
+    data is decoded as UTF-8 to split on unicode whitespace too and words
+    are encoded back, so words of both kinds of data can be merged.
+
+    :Parameters:
+        - `data`: bytes to split.
+
+    :Exceptions:
+        - `UnicodeDecodeError`: is raised if data is not valid UTF-8.
+
+    :Return:
+        list of words as bytes.
+    """
+    if data.isascii():
+        return data.translate(SEPARATORS).split()
+    return [word.encode() for word in data.decode().split()]
+
+
+def split_range(buffer, start, end):
+    """Split part of buffer to words by small windows.
+
+    Windows end on whitespace, so lists of split words stay small enough
+    for CPU cache.
+
+    :Parameters:
+        - `buffer`: bytes or mmap object.
+        - `start`: offset of range start.
+        - `end`: offset of range end.
+
+    :Return:
+        generator of word lists.
+    """
+    while start < end:
+        match = WHITESPACE.search(buffer, min(start + SPLIT_WINDOW, end), end)
+        stop = match.end() if match else end
+        yield split_words(buffer[start:stop])
+        start = stop
+
+
+def file_words(file_path, start, end):
+    """Split part of file to words.
+
+    Range of file is memory-mapped. Files without size, like procfs files
+    and pipes, are read line by line, when `end` is None.
+
+    :Parameters:
+        - `file_path`: a string with path to file.
+        - `start`: offset of range start.
+        - `end`: offset of range end, None to read whole file as stream.
+
+    :Return:
+        generator of word lists.
+    """
+    if end is None:
+        with open(file_path, 'rb') as f:
+            for line in f:
+                yield split_words(line)
+        return
+    if start == end:
+        return
+    with open(file_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield from split_range(mm, start, end)
+
+
+def count_chunk(file_path, start, end):
+    """Get unique words from part of file in pool worker process.
+
+    :Parameters:
+        - `file_path`: a string with path to file.
+        - `start`: offset of chunk start.
+        - `end`: offset of chunk end like in `file_words`.
+
+    :Return:
+        set of words as bytes.
+    """
+    unique_words = set()
+    for words in file_words(file_path, start, end):
+        unique_words.update(words)
+    return unique_words
+
+
+def sketch_chunk(precision, file_path, start, end):
+    """Get HyperLogLog sketch of part of file in pool worker process.
+
+    :Parameters:
+        - `precision`: sketch precision.
+        - `file_path`: a string with path to file.
+        - `start`: offset of chunk start.
+        - `end`: offset of chunk end like in `file_words`.
+
+    :Return:
+        HyperLogLog instance.
+    """
+    sketch = HyperLogLog(precision)
+    for words in file_words(file_path, start, end):
+        # Window duplicates are hashed once.
+        sketch.update(set(words))
+    return sketch
+
+
+def ignore_sigint():
+    """Pool worker initializer, Ctrl+C is handled by main process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def init_worker(chunk_workers):
+    """Job pool worker initializer.
+
+    :Parameters:
+        - `chunk_workers`: amount of processes counting chunks of one
+                           file, for e.g. cpu_count // pool size.
+    """
+    global _chunk_workers
+    ignore_sigint()
+    _chunk_workers = max(chunk_workers, 1)
+
+
+def chunk_pool():
+    """Get pool of chunk processes, created by first big file.
+
+    :Returns:
+        ProcessPoolExecutor instance.
+    """
+    global _chunk_pool
+    if _chunk_pool is None:
+        _chunk_pool = ProcessPoolExecutor(max_workers=_chunk_workers,
+                                          initializer=ignore_sigint)
+    return _chunk_pool
+
+
+def run_job(job_type, *args):
+    """Execute job in pool worker process.
+
+    :Parameters:
+        - `job_type`: a string with type of job.
+        - `args`: `Executor.execute` arguments.
+
+    :Returns:
+        a dictionary with result and result_info. for e.g.:
+        {'result': 'PASS", 'result_info': 'File deleted'}
+    """
+    executor = Executor(logging.getLogger('task_manager'))
+    try:
+        result_info = executor.execute(job_type, *args)
+        result = 'PASS'
+    except ExecutionError as error:
+        result_info = str(error)
+        result = 'ERROR'
+    return {'result_info': result_info, 'result': result}
+
+
 class Executor:
 
     """Jobs execution class."""
@@ -22,6 +206,58 @@ class Executor:
         """
         self.logger = logger
 
+    def __map_chunks(self, func, file_path):
+        """Apply function to chunks of file.
+
+        Files smaller than `PARALLEL_COUNT_SIZE` are one chunk, bigger
+        ones are memory-mapped, split to chunks on whitespace and
+        processed in shared pool of `init_worker` processes. Files that
+        are not regular or report size 0 are one chunk read as stream.
+
+        :Parameters:
+            - `func`: picklable function of (file_path, start, end).
+            - `file_path`: a string with path to file.
+
+        :Return:
+            generator of function results.
+        """
+        info = os.stat(file_path)
+        size = info.st_size
+        if not stat.S_ISREG(info.st_mode) or not size:
+            # Size of procfs files and pipes does not match their data.
+            yield func(file_path, 0, None)
+            return
+        if size < PARALLEL_COUNT_SIZE:
+            yield func(file_path, 0, size)
+            return
+        global _chunk_pool
+        workers = _chunk_workers
+        chunk_size = max(COUNT_CHUNK_SIZE, size // (workers * 4))
+        bounds = []
+        with open(file_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                # Chunk ends on whitespace, so no word is split.
+                match = WHITESPACE.search(mm, min(start + chunk_size, size))
+                end = match.end() if match else size
+                bounds.append((start, end))
+                start = end
+        if workers == 1:
+            # Nothing to parallelize, skip results transfer.
+            for start, end in bounds:
+                yield func(file_path, start, end)
+            return
+        self.logger.debug('Processing %s in %d chunks', file_path, len(bounds))
+        starts, ends = zip(*bounds)
+        try:
+            yield from chunk_pool().map(func, [file_path] * len(bounds),
+                                        starts, ends)
+        except BrokenProcessPool:
+            # Killed chunk process breaks pool, next job creates new one.
+            _chunk_pool = None
+            raise
+
     def __unique_words(self, file_path):
         """Count unique words in file.
 
@@ -34,21 +270,63 @@ class Executor:
         :Return:
             Int amount of unique words in file.
         """
-        self.logger.info(f'Count unique words in file {file_path}')
+        self.logger.debug('Count unique words in file %s', file_path)
         unique_words = set()
         try:
-            with open(file_path, 'r') as f:
-                for line in f:
-                    line_words = set(line.split())
-                    unique_words.update(line_words)
+            for words in self.__map_chunks(count_chunk, file_path):
+                unique_words.update(words)
         except Exception as error:
-            self.logger.warning(f'Error occurred {error} when '
-                                f'counting unique words in {file_path}')
+            self.logger.warning('Error occurred %s when counting unique '
+                                'words in %s', error, file_path)
             raise ExecutionError(error)
         result = f'Unique words: {len(unique_words)}'
         self.logger.info(result)
         return result
 
+    def __approx_unique_words(self, paths, precision, dump_dir, job_id):
+        """Estimate unique words in files with HyperLogLog sketch.
+
+        Memory does not depend on amount of words. Saved sketches
+        (`.hll` files) are merged as they are, so earlier counts are
+        combined without reading files again.
+
+        :Parameters:
+            - `paths`: a string with whitespace separated paths to files
+                       or sketches.
+            - `precision`: sketch precision.
+            - `dump_dir`: a string with dump directory path.
+            - `job_id`: id of current job.
+
+        :Exceptions:
+            - `ExecutionError`: is raised if error occurred.
+
+        :Return:
+            a string with estimate, its error and path to saved sketch.
+        """
+        self.logger.debug('Estimate unique words in %s', paths)
+        try:
+            sketch = HyperLogLog(precision)
+            for path in paths.split():
+                if path.endswith(SKETCH_SUFFIX):
+                    with open(path, 'rb') as f:
+                        sketch.merge(HyperLogLog.from_bytes(f.read()))
+                    continue
+                func = functools.partial(sketch_chunk, precision)
+                for chunk_sketch in self.__map_chunks(func, path):
+                    sketch.merge(chunk_sketch)
+            file_name = f'count_approx_{job_id}{SKETCH_SUFFIX}'
+            dump_file = os.path.join(dump_dir, file_name)
+            with open(dump_file, 'wb') as f:
+                f.write(sketch.to_bytes())
+        except Exception as error:
+            self.logger.warning('Error occurred %s when estimating unique '
+                                'words in %s', error, paths)
+            raise ExecutionError(error)
+        result = (f'Approx unique words: {sketch.count()} '
+                  f'(+-{sketch.error:.2%}), sketch {dump_file}')
+        self.logger.info(result)
+        return result
+
     def __create_file(self, file_path):
         """Create file if it not exist.
 
@@ -62,15 +340,16 @@ class Executor:
             1) a string f'File {file_path} created' if no errors occurred.
             2) a string with error.
         """
-        self.logger.info(f'Creating file {file_path}')
+        self.logger.debug('Creating file %s', file_path)
         try:
             fd = os.open(file_path, os.O_CREAT|os.O_EXCL)
             os.close(fd)
         except FileExistsError:
-            self.logger.warning(f'File {file_path} already exists')
+            self.logger.warning('File %s already exists', file_path)
             raise ExecutionError(f'File {file_path} already exists')
         except Exception as error:
-            self.logger.warning(f'Error {error} when creating file {file_path}')
+            self.logger.warning('Error %s when creating file %s', error,
+                                file_path)
             raise ExecutionError(error)
         result = f'File {file_path} created'
         self.logger.info(result)
@@ -89,11 +368,12 @@ class Executor:
             1) a string f'Directory {dir_path} created' if no errors occurred.
             2) a string with error.
         """
-        self.logger.info(f'Creating dir {dir_path}')
+        self.logger.debug('Creating dir %s', dir_path)
         try:
             os.mkdir(dir_path)
         except Exception as error:
-            self.logger.warning(f'Error {error} when creating file {dir_path}')
+            self.logger.warning('Error %s when creating file %s', error,
+                                dir_path)
             raise ExecutionError(error)
         result = f'File {dir_path} created'
         self.logger.info(result)
@@ -115,7 +395,8 @@ class Executor:
         try:
             os.remove(file_path)
         except Exception as error:
-            self.logger.warning(f"Error {error} when deleting file: {file_path}")
+            self.logger.warning('Error %s when deleting file: %s', error,
+                                file_path)
             raise ExecutionError(error)
         result = f'File {file_path} deleted'
         self.logger.info(result)
@@ -137,41 +418,63 @@ class Executor:
         try:
             os.rmdir(dir_path)
         except Exception as error:
-            self.logger.warning(f"Error {error} when deleting dir: {dir_path}")
+            self.logger.warning('Error %s when deleting dir: %s', error,
+                                dir_path)
             raise ExecutionError(error)
         result = f'Directory {dir_path} deleted'
         self.logger.info(result)
         return result
 
-    def __execute_command(self, cmd, dump_dir, job_id):
+    def __execute_command(self, cmd, dump_dir, job_id, timeout=None,
+                          max_output=None):
         """Execute shell command.
 
+        Stdout is streamed to dump file after line with command, stderr
+        to dump file with `.err` suffix, which is removed if empty.
+
         :Parameters:
             - `cmd`: a string with command.
             - `dump_dir`: a string with dump directory path.
             - `job_id`: id of current job.
+            - `timeout`: max seconds of command run. by default unlimited.
+            - `max_output`: max bytes of command output.
+                            by default unlimited.
 
         :Exceptions:
-            - `ExecutionError`: is raised if error occurred.
+            - `ExecutionError`: is raised if error occurred, command failed
+                                or exceeded its limits.
 
         :Returns:
-            1) a string f'Cmd result saved to {dump_file}' if no errors occurred.
+            1) a string f'Cmd result saved to {dump_file} ({stats})'
+               if no errors occurred.
             2) a string with error.
         """
+        file_name = 'command_result_' + str(job_id)
+        dump_file = os.path.join(dump_dir, file_name)
+        err_file = dump_file + '.err'
         try:
-            cmd_result = subprocess.run(cmd.split(), encoding='utf-8',
-                                        stdout=subprocess.PIPE)
-            assert cmd_result.returncode == 0, f'{cmd_result.stderr}'
-            file_name = 'command_result_' + str(job_id)
-            dump_file = os.path.join(dump_dir, file_name)
-            with open(dump_file, 'w') as f:
-                output = '\n'.join((cmd, str(cmd_result.stdout)))
-                f.write(output)
+            with open(dump_file, 'wb') as out, open(err_file, 'wb') as err:
+                out.write(cmd.encode() + b'\n')
+                status = run_command(cmd.split(), out, err, timeout,
+                                     max_output)
+            if not status['stderr_bytes']:
+                os.remove(err_file)
         except Exception as error:
-            self.logger.warning(f'Error <{error}> when executing command: {cmd}')
+            self.logger.warning('Error <%s> when executing command: %s',
+                                error, cmd)
+            raise ExecutionError(error)
+        stats = (f"exit {status['returncode']}, "
+                 f"stdout {status['stdout_bytes']} B, "
+                 f"stderr {status['stderr_bytes']} B")
+        if status['error'] or status['returncode'] != 0:
+            error = f"{status['error'] or 'Cmd failed'} ({stats})"
+            if status['stderr_bytes']:
+                error += f', stderr saved to {err_file}'
+            self.logger.warning('Error <%s> when executing command: %s',
+                                error, cmd)
             raise ExecutionError(error)
-        self.logger.info(f'{cmd} result saved to {dump_file}')
-        result = f'Cmd result saved to {dump_file}'
+        self.logger.info('%s result saved to %s', cmd, dump_file)
+        result = f'Cmd result saved to {dump_file} ({stats})'
         return result
 
     def __generate_random(self, task_amount, rand_len, dump_dir):
@@ -193,7 +496,7 @@ class Executor:
         try:
             task_amount = int(task_amount)
         except ValueError as error:
-            self.logger.warning(f'Task amount: {task_amount} must be int')
+            self.logger.warning('Task amount: %s must be int', task_amount)
             raise ExecutionError(error)
         jobs = []
         job_set = ('count', 'create_f', 'delete_f', 'execute', 'random')
@@ -214,12 +517,13 @@ class Executor:
                                     for _ in range(rand_len))
                 file_path = os.path.join(dump_dir, file_name)
                 jobs.append((job, file_path))
-        self.logger.info(f'Created {task_amount} tasks')
+        self.logger.info('Created %d tasks', task_amount)
         return jobs
 
     def execute(self, job_type, *args, **kwargs):
         """Executor interface"""
         jobs = {'count': self.__unique_words,
+                'count_approx': self.__approx_unique_words,
                 'create_f': self.__create_file,
                 'create_d': self.__create_dir,
                 'delete_f': self.__delete_file,
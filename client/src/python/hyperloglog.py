@@ -0,0 +1,120 @@
+#!/usr/bin/env python3.7
+
+"""HyperLogLog sketch for approximate distinct counting."""
+
+import hashlib
+import math
+
+# Sketch file header.
+MAGIC = b'HLL1'
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+
+class HyperLogLog:
+
+    """Distinct values counter in fixed memory of 2**precision bytes.
+
+    Relative standard error of estimate is 1.04 / sqrt(2**precision),
+    for e.g. 0.81% for default precision 14 (16 KB). Sketches of same
+    precision are merged without loss, so counts of file chunks or of
+    several files are combined without reading them again.
+    """
+
+    def __init__(self, precision=14, registers=None):
+        """Initialize registers.
+
+        :Parameters:
+            - `precision`: amount of hash bits selecting register.
+            - `registers`: bytearray with registers of saved sketch.
+
+        :Exceptions:
+            - `ValueError`: is raised if precision is out of range.
+        """
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f'Precision must be in '
+                             f'{MIN_PRECISION}..{MAX_PRECISION}')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers or bytearray(self.size)
+        self.__rank_bits = 64 - precision
+        self.__rank_mask = (1 << self.__rank_bits) - 1
+
+    @property
+    def error(self):
+        """Relative standard error of estimate."""
+        return 1.04 / math.sqrt(self.size)
+
+    def update(self, values):
+        """Add values to sketch.
+
+        :Parameters:
+            - `values`: iterable of bytes.
+        """
+        registers = self.registers
+        rank_bits = self.__rank_bits
+        rank_mask = self.__rank_mask
+        for value in values:
+            x = int.from_bytes(
+                hashlib.blake2b(value, digest_size=8).digest(), 'big')
+            index = x >> rank_bits
+            rank = rank_bits - (x & rank_mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other):
+        """Merge other sketch into this one.
+
+        :Parameters:
+            - `other`: HyperLogLog instance.
+
+        :Exceptions:
+            - `ValueError`: is raised if precisions differ.
+        """
+        if other.precision != self.precision:
+            raise ValueError(f'Can not merge sketches of precision '
+                             f'{other.precision} and {self.precision}')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Estimate amount of distinct values.
+
+        :Returns:
+            Int estimate.
+        """
+        m = self.size
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """Serialize sketch."""
+        return MAGIC + bytes((self.precision, )) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load serialized sketch.
+
+        :Parameters:
+            - `data`: bytes from `to_bytes`.
+
+        :Exceptions:
+            - `ValueError`: is raised if data is not a sketch.
+
+        :Returns:
+            HyperLogLog instance.
+        """
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a HyperLogLog sketch')
+        precision = data[len(MAGIC)]
+        registers = bytearray(data[len(MAGIC) + 1:])
+        if len(registers) != 1 << precision:
+            raise ValueError('Broken HyperLogLog sketch')
+        return cls(precision, registers)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3.7
+
+"""Logging through background threads.
+
+Handlers configured by `logging.config.fileConfig` are moved behind
+`QueueHandler`, so request threads only put records to queue, while
+formatting and file or console output are done by listener thread.
+
+Client and server are deployed separately, so each has a copy of this
+module. Keep it identical to `server/src/python/log_queue.py`.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+
+def start_queue_logging(*names):
+    """Move handlers of loggers to background listener threads.
+
+    Message is merged with its arguments by `QueueHandler` in calling
+    thread, so later changes of arguments do not change logged text.
+    Forked children log with original handlers, as listener threads do
+    not exist in them.
+
+    :Parameters:
+        - `names`: logger names, empty string for root logger.
+
+    :Returns:
+        list of started QueueListener instances.
+    """
+    listeners = []
+    moved = []
+    for name in names:
+        log = logging.getLogger(name or None)
+        handlers = [handler for handler in log.handlers
+                    if not isinstance(handler, logging.handlers.QueueHandler)]
+        if not handlers:
+            continue
+        records = queue.Queue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        for handler in handlers:
+            log.removeHandler(handler)
+        log.addHandler(queue_handler)
+        listener = logging.handlers.QueueListener(
+            records, *handlers, respect_handler_level=True)
+        listener.start()
+        listeners.append(listener)
+        moved.append((log, queue_handler, handlers))
+
+    def restore():
+        # Runs in forked child, where listener threads are gone.
+        for log, queue_handler, handlers in moved:
+            log.removeHandler(queue_handler)
+            for handler in handlers:
+                log.addHandler(handler)
+        listeners.clear()
+
+    def stop():
+        # Listener writes all queued records before it stops.
+        for listener in listeners:
+            listener.stop()
+
+    os.register_at_fork(after_in_child=restore)
+    atexit.register(stop)
+    return listeners
+
+
+class RateLimitedLog:
+
+    """Logger wrapper that writes message at most once per interval.
+
+    Used on polling paths, suppressed messages are counted and their
+    amount is added to next written one.
+    """
+
+    def __init__(self, logger, interval):
+        """Initialize limiter.
+
+        :Parameters:
+            - `logger`: logging.logger instance.
+            - `interval`: min seconds between written messages.
+        """
+        self.logger = logger
+        self.__interval = interval
+        self.__next = 0
+        self.__suppressed = 0
+        self.__lock = threading.Lock()
+
+    def log(self, level, msg, *args):
+        """Log message if interval passed since previous one.
+
+        :Parameters:
+            - `level`: logging level.
+            - `msg`: a string with %-style message.
+            - `args`: message arguments.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        with self.__lock:
+            now = time.monotonic()
+            if now < self.__next:
+                self.__suppressed += 1
+                return
+            self.__next = now + self.__interval
+            suppressed = self.__suppressed
+            self.__suppressed = 0
+        if suppressed:
+            msg += ' (%d similar messages suppressed)'
+            args = (*args, suppressed)
+        self.logger.log(level, msg, *args)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3.7
+
+"""Buffer of job results waiting to be reported to server."""
+
+import json
+import os
+import threading
+
+
+class RejectedResults(Exception):
+    """Server rejected results as invalid, so resending can not help."""
+    pass
+
+
+class ResultBuffer:
+
+    """Collects job results and sends them by batches.
+
+    Buffer is flushed when it holds `max_size` results and every
+    `interval` seconds. Every result is appended to spool file before it
+    is buffered and spool is rewritten after successful flush, so results
+    not reported before worker restart are sent by next worker. Batch
+    rejected by server is split to find invalid results, they are moved
+    to `<spool>.rejected` file instead of blocking later results.
+    """
+
+    def __init__(self, send, spool_path, max_size, interval, logger):
+        """Initialize buffer and load not reported results from spool.
+
+        :Parameters:
+            - `send`: function that sends list of (job_info, result_info)
+                      pairs to server. It raises `RejectedResults` if
+                      server rejected them and other exception on
+                      failure.
+            - `spool_path`: a string with path to spool file.
+            - `max_size`: amount of results that triggers flush.
+            - `interval`: seconds between periodic flushes.
+            - `logger`: logging.logger instance.
+        """
+        self.__send = send
+        self.__spool_path = spool_path
+        self.__max_size = max_size
+        self.__interval = interval
+        self.logger = logger
+        self.__lock = threading.Lock()
+        # Only one flush sends results at a time.
+        self.__flush_lock = threading.Lock()
+        self.__pending = self.__load_spool()
+        if self.__pending:
+            self.logger.info('Loaded %d not reported results from %s',
+                             len(self.__pending), spool_path)
+        self.__spool = open(spool_path, 'a')
+        self.__stop = threading.Event()
+        self.__flusher = threading.Thread(target=self.__flush_periodically,
+                                          name='result_flusher', daemon=True)
+        self.__flusher.start()
+
+    def __load_spool(self):
+        """Read results saved by previous run."""
+        pending = []
+        if not os.path.exists(self.__spool_path):
+            return pending
+        with open(self.__spool_path) as f:
+            for line in f:
+                try:
+                    pending.append(json.loads(line))
+                except json.decoder.JSONDecodeError:
+                    # Last line is cut if worker was killed while writing.
+                    self.logger.warning('Skip broken spool line: %s', line)
+        return pending
+
+    def __flush_periodically(self):
+        """Flush buffer every `interval` seconds until closed."""
+        while not self.__stop.wait(self.__interval):
+            self.flush()
+
+    def add(self, job_info, result_info):
+        """Add job result to buffer.
+
+        :Parameters:
+            - `job_info`: a dictionary with job information.
+            - `result_info`: a dictionary with job result information.
+        """
+        pair = (job_info, result_info)
+        with self.__lock:
+            self.__spool.write(json.dumps(pair) + '\n')
+            self.__spool.flush()
+            self.__pending.append(pair)
+            full = len(self.__pending) >= self.__max_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Send buffered results.
+
+        :Returns:
+            True if buffer is empty after flush.
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                batch = list(self.__pending)
+            if not batch:
+                return True
+            try:
+                rejected = self.__send_valid(batch)
+            except Exception as error:
+                self.logger.error('Failed to report %d results, will '
+                                  'retry: %s', len(batch), error)
+                return False
+            if rejected:
+                self.__quarantine(rejected)
+            with self.__lock:
+                del self.__pending[:len(batch)]
+                self.__rewrite_spool()
+                return not self.__pending
+
+    def __send_valid(self, batch):
+        """Send batch, halving rejected parts to find invalid results.
+
+        If send fails while halves are sent, halves sent already stay in
+        buffer too, server drops results of finished jobs on resend.
+
+        :Parameters:
+            - `batch`: list of (job_info, result_info) pairs.
+
+        :Exceptions:
+            - `Exception`: is raised if failed to send results.
+
+        :Returns:
+            list of rejected pairs.
+        """
+        try:
+            self.__send(batch)
+            return []
+        except RejectedResults:
+            if len(batch) == 1:
+                return batch
+        middle = len(batch) // 2
+        return self.__send_valid(batch[:middle]) + \
+            self.__send_valid(batch[middle:])
+
+    def __quarantine(self, rejected):
+        """Save rejected results aside of spool."""
+        rejected_path = self.__spool_path + '.rejected'
+        with open(rejected_path, 'a') as f:
+            for pair in rejected:
+                f.write(json.dumps(pair) + '\n')
+        self.logger.error('Server rejected %d results, moved them to %s',
+                          len(rejected), rejected_path)
+
+    def __rewrite_spool(self):
+        """Keep only not reported results in spool."""
+        tmp_path = self.__spool_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for pair in self.__pending:
+                f.write(json.dumps(pair) + '\n')
+        self.__spool.close()
+        os.replace(tmp_path, self.__spool_path)
+        self.__spool = open(self.__spool_path, 'a')
+
+    def close(self):
+        """Stop periodic flushes and send rest of results.
+
+        :Returns:
+            True if all results were reported.
+        """
+        self.__stop.set()
+        self.__flusher.join()
+        reported = self.flush()
+        with self.__lock:
+            self.__spool.close()
+        return reported
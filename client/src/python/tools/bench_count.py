@@ -0,0 +1,111 @@
+#!/usr/bin/env python3.7
+
+"""Benchmark of unique words counting.
+
+Generates files of random words and compares line by line counting with
+`count` job of Executor. Usage from `src/python` directory:
+
+    python3 -m tools.bench_count --sizes 1M 64M 1G 5G --dir /var/tmp
+"""
+
+import logging
+import os
+import random
+import string
+import tempfile
+import time
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+from executor import Executor
+
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+# Word separators of str.split(), mostly spaces.
+SEPARATORS = ' ' * 20 + '\t\x0b\x0c\r\x1c\x1d\x1e\x1f'
+# File without size, counted as stream.
+PROC_FILE = '/proc/cpuinfo'
+
+
+def size_arg(value):
+    """Parse size like `64M` to bytes."""
+    unit = value[-1].upper()
+    if unit in UNITS:
+        return int(float(value[:-1]) * UNITS[unit])
+    return int(value)
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='unique words counting benchmark',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-s', '--sizes',
+                        type=size_arg,
+                        nargs='+',
+                        default=[size_arg(size) for size in ('1M', '64M', '1G')],
+                        help='Sizes of generated files, for e.g. 1M 5G.')
+    parser.add_argument('-v', '--vocabulary',
+                        type=int,
+                        default=100000,
+                        help='Amount of distinct words in files.')
+    parser.add_argument('-d', '--dir',
+                        default=tempfile.gettempdir(),
+                        help='Directory for generated files.')
+    return parser.parse_args()
+
+
+def generate(file_path, size, vocabulary):
+    """Write file of random words from vocabulary."""
+    rnd = random.Random(size)
+    words = [''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 10)))
+             for _ in range(vocabulary)]
+    block = ''.join(word + rnd.choice(SEPARATORS)
+                    for word in rnd.choices(words, k=100000)) + '\n'
+    block = block.encode()
+    with open(file_path, 'wb') as f:
+        written = 0
+        while written < size:
+            part = block[:size - written]
+            f.write(part)
+            written += len(part)
+
+
+def count_lines(file_path):
+    """Old line by line counting."""
+    unique_words = set()
+    with open(file_path, 'r') as f:
+        for line in f:
+            unique_words.update(line.split())
+    return f'Unique words: {len(unique_words)}'
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    args = args_parser()
+    logger = logging.getLogger('bench_count')
+    executor = Executor(logger)
+    if os.path.exists(PROC_FILE):
+        old_result = count_lines(PROC_FILE)
+        new_result = executor.execute('count', PROC_FILE)
+        assert old_result == new_result, f'{old_result} != {new_result}'
+    print(f'{"size MB":>10} {"lines s":>10} {"count s":>10} {"speedup":>8}')
+    for size in args.sizes:
+        file_path = os.path.join(args.dir, f'bench_count_{size}')
+        generate(file_path, size, args.vocabulary)
+        try:
+            old_result, old_time = measure(count_lines, file_path)
+            new_result, new_time = measure(executor.execute, 'count',
+                                           file_path)
+            assert old_result == new_result, f'{old_result} != {new_result}'
+        finally:
+            os.remove(file_path)
+        print(f'{size / UNITS["M"]:>10.0f} {old_time:>10.3f} '
+              f'{new_time:>10.3f} {old_time / new_time:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3.7
+
+"""Benchmark of short execute jobs throughput.
+
+Compares old `subprocess.run` execution and current execute job in fork
+pool of a worker with big heap, and execute job in pool of launchers
+forked from small fork server. Usage from `src/python` directory:
+
+    python3 -m tools.bench_execute --jobs 500 --heap 512
+"""
+
+import multiprocessing
+import subprocess
+import tempfile
+import time
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from executor import run_job
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='execute jobs benchmark',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=500,
+                        help='Amount of jobs per command.')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=2,
+                        help='Amount of pool processes.')
+    parser.add_argument('--heap',
+                        type=int,
+                        default=512,
+                        help='MB of memory held by worker, like in '
+                             'long running job executor.')
+    parser.add_argument('-c', '--commands',
+                        nargs='+',
+                        default=['true', 'df -ah', 'ps -aux'],
+                        help='Commands to run.')
+    return parser.parse_args()
+
+
+def old_execute(cmd, dump_dir, job_id):
+    """Old execute job: output held in memory."""
+    cmd_result = subprocess.run(cmd.split(), encoding='utf-8',
+                                stdout=subprocess.PIPE)
+    with open(f'{dump_dir}/command_result_{job_id}', 'w') as f:
+        f.write('\n'.join((cmd, str(cmd_result.stdout))))
+
+
+def measure(pool, func, cmd, jobs, dump_dir):
+    """Run jobs in pool and get jobs per second."""
+    # Warm up pool processes.
+    wait([pool.submit(func, 'true', dump_dir, -i) for i in range(1, 5)])
+    start = time.perf_counter()
+    wait([pool.submit(func, cmd, dump_dir, i) for i in range(jobs)])
+    return jobs / (time.perf_counter() - start)
+
+
+def launcher_execute(cmd, dump_dir, job_id):
+    """Current execute job."""
+    return run_job('execute', cmd, dump_dir, job_id)
+
+
+def main():
+    args = args_parser()
+    # Ballast to make pool workers forked from big process.
+    heap = [bytearray(1024 * 1024) for _ in range(args.heap)]
+    fork_pool = ProcessPoolExecutor(
+        args.workers, mp_context=multiprocessing.get_context('fork'))
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['executor'])
+    launchers = ProcessPoolExecutor(args.workers, mp_context=context)
+    print(f'{"command":<16} {"fork pool old":>14} {"fork pool":>14} '
+          f'{"launchers":>14}  (jobs/s)')
+    with tempfile.TemporaryDirectory() as dump_dir:
+        for cmd in args.commands:
+            old = measure(fork_pool, old_execute, cmd, args.jobs, dump_dir)
+            forked = measure(fork_pool, launcher_execute, cmd, args.jobs,
+                             dump_dir)
+            new = measure(launchers, launcher_execute, cmd, args.jobs,
+                          dump_dir)
+            print(f'{cmd:<16} {old:>14.1f} {forked:>14.1f} {new:>14.1f}')
+    fork_pool.shutdown()
+    launchers.shutdown()
+    del heap
+
+
+if __name__ == '__main__':
+    main()
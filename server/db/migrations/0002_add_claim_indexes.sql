@@ -0,0 +1,5 @@
+-- Claim path: WHERE status = 'new' ORDER BY ctime LIMIT n FOR UPDATE SKIP LOCKED.
+ALTER TABLE job_queue ADD INDEX idx_status_ctime (status, ctime);
+
+-- Result lookups by job, replaces implicit foreign key index.
+ALTER TABLE job_result ADD INDEX idx_job_id (job_id);
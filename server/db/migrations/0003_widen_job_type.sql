@@ -0,0 +1,2 @@
+-- Room for longer job types like count_approx.
+ALTER TABLE job_queue MODIFY job_type VARCHAR(20) NOT NULL COMMENT 'Defines type of job';
@@ -0,0 +1,27 @@
+-- Archival: WHERE status = 'finished' AND mtime < cutoff ORDER BY mtime.
+ALTER TABLE job_queue ADD INDEX idx_status_mtime (status, mtime);
+
+-- Templates of monthly history tables job_queue_history_YYYYMM and
+-- job_result_history_YYYYMM, which are created by archival with
+-- CREATE TABLE ... LIKE and dropped by purge. Month is of job ctime.
+CREATE TABLE IF NOT EXISTS job_queue_history(
+    id              INT(11) NOT NULL COMMENT 'Job id from job_queue table',
+    client_host     VARCHAR(100) NOT NULL COMMENT 'Client hostname',
+    job_type        VARCHAR(20) NOT NULL COMMENT 'Defines type of job',
+    job_arg         VARCHAR(255) NOT NULL COMMENT 'Job argument',
+    status          VARCHAR(20) NOT NULL COMMENT 'Task status',
+    ctime           INT(11) NOT NULL COMMENT 'Creation time',
+    stime           INT(11) COMMENT 'Start time',
+    mtime           INT(11) NOT NULL COMMENT 'Modification time',
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8;
+
+CREATE TABLE IF NOT EXISTS job_result_history(
+    id              INT(11) NOT NULL COMMENT 'Result id from job_result table',
+    job_id          INT(11) NOT NULL COMMENT 'Job id from job_queue table',
+    result          VARCHAR(5) NOT NULL COMMENT 'Job  genetral result PASS or ERROR',
+    result_info     VARCHAR(255) NOT NULL COMMENT 'Execution result of jub',
+    run_time        INT(11) NOT NULL COMMENT 'Job run time',
+    PRIMARY KEY (id),
+    INDEX idx_job_id (job_id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8;
@@ -0,0 +1,12 @@
+-- Claims hold job for lease, expired jobs are requeued by reaper until
+-- max attempts, then moved to 'dead' status.
+ALTER TABLE job_queue
+    ADD COLUMN lease_expiry INT(11) COMMENT 'Time when claim of job expires',
+    ADD COLUMN attempts INT(11) NOT NULL DEFAULT 0 COMMENT 'Amount of claims';
+
+-- Reaper: WHERE status = 'in_progress' AND lease_expiry < now.
+ALTER TABLE job_queue ADD INDEX idx_status_lease (status, lease_expiry);
+
+-- Jobs claimed before leases get one hour to be reported.
+UPDATE job_queue SET lease_expiry = UNIX_TIMESTAMP() + 3600
+    WHERE status = 'in_progress';
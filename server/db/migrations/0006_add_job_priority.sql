@@ -0,0 +1,10 @@
+-- Jobs of higher priority are claimed first, hosts share each priority
+-- band by weighted round-robin.
+ALTER TABLE job_queue
+    ADD COLUMN priority TINYINT NOT NULL DEFAULT 0 COMMENT 'Job priority, higher is claimed first';
+
+-- Fair claim path:
+--   MAX(priority) WHERE status = 'new' AND priority < n;
+--   DISTINCT client_host WHERE status = 'new' AND priority = n, loose index scan;
+--   WHERE status = 'new' AND priority = n AND client_host = h ORDER BY ctime LIMIT m.
+ALTER TABLE job_queue ADD INDEX idx_status_priority_host (status, priority, client_host, ctime);
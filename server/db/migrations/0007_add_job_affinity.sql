@@ -0,0 +1,13 @@
+-- Jobs pinned to host or label are claimed first by workers advertising
+-- it, by any worker after fallback timeout. Empty affinity means any.
+ALTER TABLE job_queue
+    ADD COLUMN affinity VARCHAR(255) NOT NULL DEFAULT '' COMMENT 'Host or label of workers preferred for job';
+
+-- Claim path runs once per advertised affinity, then for '':
+--   fair: the same seeks as before with affinity = a prefix;
+--   fifo: WHERE status = 'new' AND affinity = a ORDER BY ctime LIMIT m.
+-- Pinned jobs older than fallback go through idx_status_ctime.
+ALTER TABLE job_queue
+    DROP INDEX idx_status_priority_host,
+    ADD INDEX idx_status_affinity_priority_host (status, affinity, priority, client_host, ctime),
+    ADD INDEX idx_status_affinity_ctime (status, affinity, ctime);
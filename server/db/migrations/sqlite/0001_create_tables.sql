@@ -0,0 +1,24 @@
+-- Schema of SQLite storage backend, same as MySql schema after 0003.
+CREATE TABLE IF NOT EXISTS job_queue(
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_host     VARCHAR(100) NOT NULL,
+    job_type        VARCHAR(20) NOT NULL,
+    job_arg         VARCHAR(255) NOT NULL,
+    status          VARCHAR(20) NOT NULL DEFAULT 'new',
+    ctime           INTEGER NOT NULL,
+    stime           INTEGER,
+    mtime           INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_result(
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id          INTEGER NOT NULL REFERENCES job_queue(id),
+    result          VARCHAR(5) NOT NULL,
+    result_info     VARCHAR(255) NOT NULL,
+    run_time        INTEGER NOT NULL
+);
+
+-- Claim path: WHERE status = 'new' ORDER BY ctime LIMIT n.
+CREATE INDEX IF NOT EXISTS idx_status_ctime ON job_queue (status, ctime);
+
+CREATE INDEX IF NOT EXISTS idx_job_id ON job_result (job_id);
@@ -0,0 +1,23 @@
+-- Archival: WHERE status = 'finished' AND mtime < cutoff ORDER BY mtime.
+CREATE INDEX IF NOT EXISTS idx_status_mtime ON job_queue (status, mtime);
+
+-- Templates of monthly history tables job_queue_history_YYYYMM and
+-- job_result_history_YYYYMM, archival copies their schema.
+CREATE TABLE IF NOT EXISTS job_queue_history(
+    id              INTEGER PRIMARY KEY,
+    client_host     VARCHAR(100) NOT NULL,
+    job_type        VARCHAR(20) NOT NULL,
+    job_arg         VARCHAR(255) NOT NULL,
+    status          VARCHAR(20) NOT NULL,
+    ctime           INTEGER NOT NULL,
+    stime           INTEGER,
+    mtime           INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_result_history(
+    id              INTEGER PRIMARY KEY,
+    job_id          INTEGER NOT NULL,
+    result          VARCHAR(5) NOT NULL,
+    result_info     VARCHAR(255) NOT NULL,
+    run_time        INTEGER NOT NULL
+);
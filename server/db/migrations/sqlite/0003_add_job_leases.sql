@@ -0,0 +1,11 @@
+-- Claims hold job for lease, expired jobs are requeued by reaper until
+-- max attempts, then moved to 'dead' status.
+ALTER TABLE job_queue ADD COLUMN lease_expiry INTEGER;
+ALTER TABLE job_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+
+-- Reaper: WHERE status = 'in_progress' AND lease_expiry < now.
+CREATE INDEX IF NOT EXISTS idx_status_lease ON job_queue (status, lease_expiry);
+
+-- Jobs claimed before leases get one hour to be reported.
+UPDATE job_queue SET lease_expiry = CAST(strftime('%s', 'now') AS INTEGER) + 3600
+    WHERE status = 'in_progress';
@@ -0,0 +1,7 @@
+-- Jobs of higher priority are claimed first, hosts share each priority
+-- band by weighted round-robin.
+ALTER TABLE job_queue ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;
+
+-- Fair claim path, hosts of band are walked by MIN(client_host) seeks.
+CREATE INDEX IF NOT EXISTS idx_status_priority_host
+    ON job_queue (status, priority, client_host, ctime);
@@ -0,0 +1,11 @@
+-- Jobs pinned to host or label are claimed first by workers advertising
+-- it, by any worker after fallback timeout. Empty affinity means any.
+ALTER TABLE job_queue ADD COLUMN affinity VARCHAR(255) NOT NULL DEFAULT '';
+
+-- Claim path runs once per advertised affinity, then for '', pinned jobs
+-- older than fallback go through idx_status_ctime.
+DROP INDEX IF EXISTS idx_status_priority_host;
+CREATE INDEX IF NOT EXISTS idx_status_affinity_priority_host
+    ON job_queue (status, affinity, priority, client_host, ctime);
+CREATE INDEX IF NOT EXISTS idx_status_affinity_ctime
+    ON job_queue (status, affinity, ctime);
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3.7
+
+"""Archival of finished and dead jobs to monthly history tables."""
+
+import threading
+import time
+
+from constants import ARCHIVE_BATCH, ARCHIVE_KEEP_MONTHS, ARCHIVE_PAUSE, \
+    ARCHIVE_RETENTION_DAYS
+from metrics import REGISTRY
+from storage import ARCHIVED_STATUSES, StorageException, history_month
+
+ARCHIVED = REGISTRY.counter('task_manager_archived_jobs_total',
+                            'Finished and dead jobs moved to history '
+                            'tables.', ('status', ))
+PURGED = REGISTRY.counter('task_manager_purged_history_months_total',
+                          'Months of history tables dropped by purge.')
+
+
+def months_before(month, amount):
+    """Get month that is `amount` months before `month`.
+
+    :Parameters:
+        - `month`: YYYYMM integer.
+        - `amount`: amount of months.
+
+    :Returns:
+        YYYYMM integer. for e.g.: months_before(201903, 3) == 201812
+    """
+    index = (month // 100) * 12 + month % 100 - 1 - amount
+    return (index // 12) * 100 + index % 12 + 1
+
+
+class Archiver:
+
+    """Moves finished jobs out of hot tables and purges old history.
+
+    Jobs finished or dead more than `retention_days` ago are moved in
+    transactions of `batch_size` jobs with `pause` seconds between them,
+    so claims are not blocked by long transactions. History tables of
+    months older than `keep_months` before current month are dropped,
+    0 keeps them forever.
+    """
+
+    def __init__(self, storage, logger, retention_days=ARCHIVE_RETENTION_DAYS,
+                 batch_size=ARCHIVE_BATCH, pause=ARCHIVE_PAUSE / 1000,
+                 keep_months=ARCHIVE_KEEP_MONTHS, on_archive=None):
+        """Initialize archiver.
+
+        :Parameters:
+            - `storage`: Storage instance.
+            - `logger`: logging.logger instance.
+            - `retention_days`: days finished and dead jobs stay in hot
+                                tables.
+            - `batch_size`: max amount of jobs moved by one transaction.
+            - `pause`: seconds between transactions.
+            - `keep_months`: months history tables are kept.
+            - `on_archive`: function called with status and amount of
+                            moved jobs.
+        """
+        self.logger = logger
+        self.__storage = storage
+        self.__retention = retention_days * 86400
+        self.__batch_size = batch_size
+        self.__pause = pause
+        self.__keep_months = keep_months
+        self.__on_archive = on_archive
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def archive(self):
+        """Move jobs finished or dead before retention window.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to move jobs.
+
+        :Returns:
+            amount of moved jobs.
+        """
+        before = int(time.time()) - self.__retention
+        total = 0
+        for status in ARCHIVED_STATUSES:
+            while not self.__stop.is_set():
+                moved = self.__storage.archive_jobs(before, self.__batch_size,
+                                                    status)
+                if moved:
+                    total += moved
+                    ARCHIVED.inc(status, amount=moved)
+                    if self.__on_archive:
+                        self.__on_archive(status, moved)
+                if moved < self.__batch_size:
+                    break
+                self.__stop.wait(self.__pause)
+        self.logger.info('Archived %d jobs finished or dead before %s', total,
+                         time.strftime('%Y-%m-%d %H:%M:%S',
+                                       time.gmtime(before)))
+        return total
+
+    def purge(self):
+        """Drop history tables older than `keep_months`.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to drop tables.
+
+        :Returns:
+            list of dropped months.
+        """
+        if not self.__keep_months:
+            return []
+        oldest = months_before(history_month(time.time()),
+                               self.__keep_months)
+        dropped = [month for month in self.__storage.history_months()
+                   if month < oldest]
+        for month in dropped:
+            self.__storage.drop_history(month)
+            PURGED.inc()
+        return dropped
+
+    def run(self):
+        """Archive jobs, then purge history.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to archive or purge.
+
+        :Returns:
+            (amount of moved jobs, list of dropped months) tuple.
+        """
+        return self.archive(), self.purge()
+
+    def start(self, interval):
+        """Run archival in background thread.
+
+        :Parameters:
+            - `interval`: seconds between runs.
+        """
+        def run_forever():
+            while True:
+                try:
+                    self.run()
+                except StorageException as error:
+                    self.logger.error('Failed to archive jobs: %s', error)
+                if self.__stop.wait(interval):
+                    return
+
+        self.__thread = threading.Thread(target=run_forever, name='archiver',
+                                         daemon=True)
+        self.__thread.start()
+
+    def close(self):
+        """Stop background archival after current transaction."""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3.7
+
+"""This module keeps pool of reusable database connections."""
+
+import threading
+import time
+
+import pymysql
+
+from constants import POOL_SIZE, POOL_MAX_IDLE, POOL_TIMEOUT, \
+    POOL_PING_INTERVAL
+from metrics import REGISTRY
+
+POOL_CONNECTIONS = REGISTRY.gauge('task_manager_db_pool_connections',
+                                  'Connections of MySql pool by state.',
+                                  ('state', ))
+POOL_ACQUIRES = REGISTRY.counter('task_manager_db_pool_acquires_total',
+                                 'Borrows of pooled MySql connections by '
+                                 'result.', ('result', ))
+POOL_WAIT_SECONDS = REGISTRY.counter(
+    'task_manager_db_pool_wait_seconds_total',
+    'Time spent waiting for pooled MySql connections.')
+POOL_CLOSED = REGISTRY.counter('task_manager_db_pool_closed_total',
+                               'Pooled MySql connections closed by reason.',
+                               ('reason', ))
+
+
+class PoolTimeout(Exception):
+    """Raised when no free connection appeared in pool in time."""
+    pass
+
+
+class ConnectionPool:
+
+    """Bounded thread-safe pool of MySql connections.
+
+    Counters of `stats` are exported by `POOL_*` metrics too.
+    """
+
+    def __init__(self, config, logger):
+        """Initialize pool params.
+
+        :Parameters:
+            - `config`: configparser instance.
+            - `logger': logging.logger instance.
+        """
+        self.config = config
+        self.logger = logger
+        self.__host = self.config.get('db', 'host')
+        self.__name = self.config.get('db', 'name')
+        self.__user = self.config.get('db', 'user')
+        self.__passwd = self.config.get('db', 'passwd')
+        self.__size = self.config.getint('db', 'pool_size',
+                                         fallback=POOL_SIZE)
+        self.__max_idle = self.config.getint('db', 'pool_max_idle',
+                                             fallback=POOL_MAX_IDLE)
+        self.__timeout = self.config.getfloat('db', 'pool_timeout',
+                                              fallback=POOL_TIMEOUT)
+        self.__ping_interval = self.config.getint(
+            'db', 'pool_ping_interval', fallback=POOL_PING_INTERVAL)
+        # Idle connections as (connection, last used time) pairs.
+        self.__idle = []
+        # Amount of opened connections, idle and borrowed.
+        self.__opened = 0
+        self.__cond = threading.Condition()
+        # Counters.
+        self.hits = 0
+        self.misses = 0
+        self.wait_time = 0.0
+        self.evictions = 0
+        self.reconnects = 0
+        self.timeouts = 0
+
+    def __connect(self):
+        """Open new database connection."""
+        return pymysql.connect(host=self.__host,
+                               db=self.__name,
+                               user=self.__user,
+                               passwd=self.__passwd)
+
+    def __close(self, cnx):
+        """Close connection ignoring errors of already broken ones."""
+        try:
+            cnx.close()
+        except Exception as error:
+            self.logger.debug('Error when closing connection: %s', error)
+
+    def acquire(self):
+        """Borrow connection from pool.
+
+        Most recently used idle connection is preferred, connections idle
+        for longer than `pool_max_idle` are evicted, see `__evict`, and
+        the ones idle for longer than `pool_ping_interval` are pinged
+        before reuse. New connection is opened only while pool is not
+        full.
+
+        :Exceptions:
+            - `PoolTimeout`: is raised if no connection became free
+                             in `pool_timeout` seconds.
+            - `pymysql.err.Error`: is raised if failed to connect.
+
+        :Returns:
+            pymysql connection object.
+        """
+        start = time.monotonic()
+        cnx = None
+        with self.__cond:
+            while True:
+                now = time.monotonic()
+                self.__evict(now)
+                if self.__idle:
+                    cnx, last_used = self.__idle.pop()
+                    self.hits += 1
+                    POOL_ACQUIRES.inc('hit')
+                    break
+                if self.__opened < self.__size:
+                    # Reserve place for new connection.
+                    self.__opened += 1
+                    self.misses += 1
+                    POOL_ACQUIRES.inc('miss')
+                    break
+                remaining = self.__timeout - (now - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    POOL_ACQUIRES.inc('timeout')
+                    self.__waited(now - start)
+                    raise PoolTimeout(f'No free connection in pool after '
+                                      f'{self.__timeout} seconds')
+                self.__cond.wait(remaining)
+            self.__waited(time.monotonic() - start)
+            self.__publish()
+
+        if cnx is None:
+            try:
+                return self.__connect()
+            except Exception:
+                self.__forget()
+                raise
+        if now - last_used > self.__ping_interval:
+            try:
+                cnx.ping(reconnect=False)
+            except Exception as error:
+                self.logger.warning('Pooled connection is broken, '
+                                    'reconnecting: %s', error)
+                self.__close(cnx)
+                self.reconnects += 1
+                POOL_CLOSED.inc('reconnect')
+                try:
+                    return self.__connect()
+                except Exception:
+                    self.__forget()
+                    raise
+        return cnx
+
+    def release(self, cnx, discard=False):
+        """Return borrowed connection to pool.
+
+        :Parameters:
+            - `cnx`: connection received from `acquire`.
+            - `discard`: close connection instead of reusing it,
+                         e.g. when it is broken. by default False.
+        """
+        if discard:
+            self.__close(cnx)
+            self.__forget()
+            return
+        with self.__cond:
+            now = time.monotonic()
+            self.__idle.append((cnx, now))
+            self.__evict(now)
+            self.__publish()
+            self.__cond.notify()
+
+    def __evict(self, now):
+        """Close connections idle for longer than `pool_max_idle`.
+
+        Idle connections are ordered by last use, so stale ones are at
+        bottom of stack, which reuse of most recent ones never reaches
+        under steady load. Called with lock held.
+
+        :Parameters:
+            - `now`: current monotonic time.
+        """
+        while self.__idle and now - self.__idle[0][1] > self.__max_idle:
+            cnx, _ = self.__idle.pop(0)
+            self.__close(cnx)
+            self.__opened -= 1
+            self.evictions += 1
+            POOL_CLOSED.inc('evict')
+
+    def __forget(self):
+        """Free place of closed connection."""
+        with self.__cond:
+            self.__opened -= 1
+            self.__publish()
+            self.__cond.notify()
+
+    def __waited(self, seconds):
+        """Count time spent waiting for connection."""
+        self.wait_time += seconds
+        POOL_WAIT_SECONDS.inc(amount=seconds)
+
+    def __publish(self):
+        """Export amounts of connections, called with lock held."""
+        POOL_CONNECTIONS.set(self.__opened, 'opened')
+        POOL_CONNECTIONS.set(len(self.__idle), 'idle')
+
+    def close(self):
+        """Close all idle connections."""
+        with self.__cond:
+            while self.__idle:
+                cnx, _ = self.__idle.pop()
+                self.__close(cnx)
+                self.__opened -= 1
+            self.__publish()
+
+    def stats(self):
+        """Get pool counters.
+
+        :Returns:
+            a dictionary with pool state and counters.
+        """
+        with self.__cond:
+            return {'size': self.__size,
+                    'opened': self.__opened,
+                    'idle': len(self.__idle),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'wait_time': round(self.wait_time, 6),
+                    'evictions': self.evictions,
+                    'reconnects': self.reconnects,
+                    'timeouts': self.timeouts}
@@ -6,3 +6,73 @@
 RETRY = 5
 # Delay in retry.
 DELAY = 3
+# Maximum amount of opened connections in pool.
+POOL_SIZE = 10
+# Seconds after which idle pooled connection is closed.
+POOL_MAX_IDLE = 300
+# Seconds to wait for free connection in pool.
+POOL_TIMEOUT = 10
+# Seconds of idleness after which connection is pinged before reuse.
+POOL_PING_INTERVAL = 30
+# Max amount of jobs claimed by one get_job request.
+MAX_CLAIM = 100
+# Amount of threads handling requests.
+WORKERS = 10
+# Max seconds get_job request waits for new jobs.
+MAX_WAIT = 60
+# Seconds between queue checks of waiting get_job request.
+LONG_POLL_RECHECK = 5
+# Seconds client waits before next claim when all long poll waiters
+# are busy, sent in Retry-After header.
+LONG_POLL_RETRY = 1
+# Max amount of jobs created by one POST task request.
+MAX_SUBMIT = 100000
+# Seconds idle keep-alive connection stays open.
+KEEPALIVE_TIMEOUT = 5
+# Max amount of buffered submitted jobs inserted by one transaction.
+SUBMIT_MAX_JOBS = 1000
+# Max milliseconds buffered submitted job waits for its transaction.
+SUBMIT_INTERVAL = 5
+# Seconds empty queue of shared storage is trusted without query.
+QUEUE_STATE_TTL = 1
+# Seconds between counts of new jobs in storage.
+QUEUE_STATE_INTERVAL = 30
+# Days finished jobs stay in job_queue before archival.
+ARCHIVE_RETENTION_DAYS = 7
+# Max amount of jobs archived by one transaction.
+ARCHIVE_BATCH = 500
+# Milliseconds between archival transactions.
+ARCHIVE_PAUSE = 100
+# Seconds between archival runs of server.
+ARCHIVE_INTERVAL = 3600
+# Months of history tables kept by purge, 0 keeps all.
+ARCHIVE_KEEP_MONTHS = 12
+# Seconds claimed job is held for worker without heartbeat.
+LEASE = 300
+# Claims of job, after which expired job is moved to `dead` status.
+MAX_ATTEMPTS = 3
+# Seconds between checks of expired leases.
+REAPER_INTERVAL = 10
+# Max amount of expired jobs requeued by one transaction.
+REAPER_BATCH = 500
+# Priority of jobs submitted without it and max priority, higher
+# priority jobs are claimed first.
+DEFAULT_PRIORITY = 0
+MAX_PRIORITY = 9
+# Seconds after which job pinned to host or label goes to any worker,
+# 0 keeps it for matching workers only.
+AFFINITY_FALLBACK = 300
+# Job types pinned to submitting host unless job sets affinity, their
+# arguments are paths on that host.
+PINNED_TYPES = ('count', 'count_approx', 'create_f', 'create_d', 'delete_f',
+                'delete_d')
+# Max amount of labels advertised by worker.
+MAX_LABELS = 16
+# Bytes read from request body at once.
+READ_CHUNK = 65536
+# SQLite database file.
+SQLITE_PATH = '/var/tmp/task_manager.db'
+# Max amount of SQLite transactions committed together.
+SQLITE_BATCH = 100
+# Seconds to wait for SQLite lock held by other process.
+SQLITE_BUSY_TIMEOUT = 10
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3.7
+
+"""Concurrent HTTP servers for request handlers of `http.server`."""
+
+import asyncio
+import collections
+import io
+import selectors
+import socket
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.client import parse_headers
+from http.server import HTTPServer
+
+# Max size of request line with headers.
+MAX_HEADERS_SIZE = 65536
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+
+    """HTTP server that handles requests in bounded pool of threads.
+
+    Thread serves one request of connection at a time. Between requests
+    keep-alive connection waits in selector of `keepalive` thread, so
+    idle connections hold no threads. They are closed after `timeout`
+    seconds of handler class like in asyncio server.
+    """
+
+    def __init__(self, server_address, handler_class, workers):
+        """Initialize server, thread pool and keep-alive thread.
+
+        :Parameters:
+            - `server_address`: (host, port) tuple.
+            - `handler_class`: request handler class.
+            - `workers`: amount of handler threads.
+        """
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='handler')
+        # Requests are passed to pool while less than `workers` of them
+        # wait for thread, rest stay in socket buffers.
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._idle_timeout = getattr(handler_class, 'timeout', None)
+        self._selector = selectors.DefaultSelector()
+        # Handlers of served connections waiting for registration in
+        # selector, and parking time of registered ones in this order.
+        self._parked = collections.deque()
+        self._idle_since = {}
+        self._wakeup, self._waker = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._waker.setblocking(False)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._closing = threading.Event()
+        self._keepalive = threading.Thread(target=self._watch_idle,
+                                           name='keepalive', daemon=True)
+        self._keepalive.start()
+
+    def process_request(self, request, client_address):
+        """Pass accepted connection to thread pool."""
+        self._slots.acquire()
+        self._executor.submit(self._open_connection, request, client_address)
+
+    def _open_connection(self, request, client_address):
+        """Create handler of connection and serve its first request."""
+        try:
+            handler = self.RequestHandlerClass.__new__(
+                self.RequestHandlerClass)
+            handler.request = request
+            handler.client_address = client_address
+            handler.server = self
+            handler.setup()
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            self._slots.release()
+            return
+        self._serve_request(handler)
+
+    def _serve_request(self, handler):
+        """Serve requests of connection, then park or close it.
+
+        Pipelined requests already read to handler buffer are served
+        at once, as selector does not see them.
+        """
+        keep_alive = False
+        try:
+            while True:
+                handler.close_connection = True
+                handler.handle_one_request()
+                if handler.close_connection:
+                    break
+                if not self._buffered(handler):
+                    keep_alive = True
+                    break
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            self._slots.release()
+        if keep_alive and not self._closing.is_set():
+            self._parked.append(handler)
+            self._wake()
+        else:
+            self._close(handler)
+
+    def _buffered(self, handler):
+        """Check without blocking if next request is read already.
+
+        :Returns:
+            True if handler buffer has bytes of next request.
+        """
+        handler.connection.setblocking(False)
+        try:
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            handler.connection.settimeout(handler.timeout)
+
+    def _close(self, handler):
+        """Finish handler and close its connection."""
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def _wake(self):
+        """Interrupt selector wait of keep-alive thread."""
+        try:
+            self._waker.send(b'\0')
+        except BlockingIOError:
+            # Wakeup is pending already.
+            pass
+
+    def _watch_idle(self):
+        """Pass readable keep-alive connections to pool, close idle ones."""
+        while not self._closing.is_set():
+            timeout = None
+            if self._idle_since and self._idle_timeout is not None:
+                oldest = next(iter(self._idle_since.values()))
+                timeout = max(oldest + self._idle_timeout - time.monotonic(),
+                              0)
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wakeup:
+                    while True:
+                        try:
+                            self._wakeup.recv(4096)
+                        except BlockingIOError:
+                            break
+                    continue
+                self._selector.unregister(key.fileobj)
+                del self._idle_since[key.data]
+                self._slots.acquire()
+                self._executor.submit(self._serve_request, key.data)
+            while self._parked:
+                handler = self._parked.popleft()
+                self._selector.register(handler.connection,
+                                        selectors.EVENT_READ, handler)
+                self._idle_since[handler] = time.monotonic()
+            if self._idle_timeout is not None:
+                expired = time.monotonic() - self._idle_timeout
+                for handler, since in list(self._idle_since.items()):
+                    if since > expired:
+                        break
+                    self._selector.unregister(handler.connection)
+                    del self._idle_since[handler]
+                    self._close(handler)
+
+    def server_close(self):
+        """Close socket and wait for in-flight requests."""
+        super().server_close()
+        self._closing.set()
+        self._wake()
+        self._keepalive.join()
+        self._executor.shutdown(wait=True)
+        for handler in [*self._idle_since, *self._parked]:
+            self._close(handler)
+        self._selector.close()
+        self._wakeup.close()
+        self._waker.close()
+
+
+class _BufferedRequest:
+
+    """Socket-like object that serves request from memory."""
+
+    def __init__(self, data):
+        """Initialize buffers.
+
+        :Parameters:
+            - `data`: bytes of whole request.
+        """
+        self.rfile = io.BytesIO(data)
+        self.wfile = io.BytesIO()
+
+    def makefile(self, mode, *args, **kwargs):
+        """Get request or response buffer."""
+        return self.rfile if 'r' in mode else self.wfile
+
+    def sendall(self, data):
+        """Write response data."""
+        self.wfile.write(data)
+
+    def settimeout(self, timeout):
+        """Timeouts are applied by event loop."""
+        pass
+
+    def setsockopt(self, *args):
+        """Socket options are applied to real socket."""
+        pass
+
+
+class AsyncHTTPServer:
+
+    """HTTP server on asyncio event loop.
+
+    Connections are accepted and requests are read by event loop, while
+    request handler runs in thread pool executor, so blocking database
+    calls never stall other connections. Idle keep-alive connections
+    cost no threads, they are closed after `timeout` seconds of handler
+    class like in threaded servers.
+    """
+
+    def __init__(self, server_address, handler_class, workers):
+        """Initialize server.
+
+        :Parameters:
+            - `server_address`: (host, port) tuple.
+            - `handler_class`: request handler class.
+            - `workers`: amount of handler threads.
+        """
+        self.server_address = server_address
+        self.RequestHandlerClass = handler_class
+        self._idle_timeout = getattr(handler_class, 'timeout', None)
+        self._workers = workers
+        self._loop = None
+        self._stop = None
+        self._connections = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    def serve_forever(self):
+        """Serve until `shutdown` is called."""
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        """Stop serving, may be called from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def server_close(self):
+        """Nothing to close, sockets are closed by `serve_forever`."""
+        pass
+
+    async def _serve(self):
+        """Accept connections and wait in-flight ones on shutdown."""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                            thread_name_prefix='handler')
+        host, port = self.server_address
+        server = await asyncio.start_server(self._handle_connection,
+                                            host, port,
+                                            limit=MAX_HEADERS_SIZE)
+        try:
+            await self._stop.wait()
+        finally:
+            server.close()
+            if self._connections:
+                await asyncio.wait(self._connections)
+            self._executor.shutdown(wait=True)
+
+    async def _handle_connection(self, reader, writer):
+        """Read requests from connection and run handler for each."""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        client_address = writer.get_extra_info('peername')
+        try:
+            close_connection = False
+            while not close_connection:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                response, close_connection = await self._loop.run_in_executor(
+                    self._executor, self._run_handler, request,
+                    client_address)
+                writer.write(response)
+                await writer.drain()
+        except (ConnectionError, EOFError, ValueError,
+                asyncio.LimitOverrunError):
+            # Client disconnected or sent malformed request.
+            pass
+        finally:
+            writer.close()
+            self._connections.discard(task)
+
+    async def _read_request(self, reader):
+        """Read request line, headers and body.
+
+        :Returns:
+            1) bytes of whole request.
+            2) None if connection is closed.
+        """
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                          self._idle_timeout)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+            return None
+        headers = parse_headers(io.BytesIO(head.split(b'\r\n', 1)[1]))
+        if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            return head + await self._read_chunked(reader)
+        body = b''
+        content_len = int(headers.get('Content-Length') or 0)
+        if content_len:
+            body = await reader.readexactly(content_len)
+        return head + body
+
+    async def _read_chunked(self, reader):
+        """Read chunked body as is, handler decodes it itself."""
+        parts = []
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            parts.append(line)
+            size = int(line.split(b';')[0], 16)
+            if not size:
+                break
+            parts.append(await reader.readexactly(size + 2))
+        # Trailers end with empty line.
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            parts.append(line)
+            if line == b'\r\n':
+                return b''.join(parts)
+
+    def _run_handler(self, request, client_address):
+        """Run request handler over buffered request.
+
+        Handler serves only one request, instead of reading the next one
+        from exhausted buffer, so its `close_connection` flag tells if
+        client asked to keep connection.
+
+        :Returns:
+            (response bytes, close connection flag) tuple.
+        """
+        buffered = _BufferedRequest(request)
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request = buffered
+        handler.client_address = client_address
+        handler.server = self
+        handler.setup()
+        try:
+            handler.close_connection = True
+            handler.handle_one_request()
+        finally:
+            handler.finish()
+        return buffered.wfile.getvalue(), handler.close_connection
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3.7
+
+"""This module wakes up requests waiting for new jobs."""
+
+import threading
+
+
+class JobNotifier:
+
+    """In-process notification about submitted jobs."""
+
+    def __init__(self, max_waiters):
+        """Initialize condition.
+
+        :Parameters:
+            - `max_waiters`: max amount of simultaneously waiting requests.
+        """
+        self.__cond = threading.Condition()
+        # Incremented on every submission.
+        self.__version = 0
+        self.__waiters = 0
+        self.__max_waiters = max_waiters
+
+    @property
+    def version(self):
+        """Current submission counter."""
+        with self.__cond:
+            return self.__version
+
+    def notify(self):
+        """Wake up all waiting requests."""
+        with self.__cond:
+            self.__version += 1
+            self.__cond.notify_all()
+
+    def wait(self, version, timeout):
+        """Wait for submission after `version`.
+
+        :Parameters:
+            - `version`: submission counter seen by caller.
+            - `timeout`: seconds to wait.
+
+        :Returns:
+            1) True if jobs were submitted after `version`.
+            2) False if timeout expired.
+            3) None if too many requests are already waiting.
+        """
+        with self.__cond:
+            if self.__waiters >= self.__max_waiters:
+                return None
+            self.__waiters += 1
+            try:
+                return self.__cond.wait_for(
+                    lambda: self.__version != version, timeout)
+            finally:
+                self.__waiters -= 1
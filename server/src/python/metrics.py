@@ -0,0 +1,198 @@
+#!/usr/bin/env python3.7
+
+"""In-process metrics exposed in Prometheus text format.
+
+Metrics are updated by request handlers and storage in memory, so
+rendering them never touches database.
+"""
+
+import bisect
+import threading
+
+# Default buckets of latency histograms in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1, 2.5, 5, 10)
+# Max amount of label sets of one metric, rest are counted as `other`.
+MAX_SERIES = 100
+
+
+def escape(value):
+    """Escape label value."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def format_labels(names, values, extra=''):
+    """Format labels like `{path="task",status="201"}`."""
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric:
+
+    """Base class of metric with labels."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        """Initialize metric.
+
+        :Parameters:
+            - `name`: a string with metric name.
+            - `help_text`: a string with metric description.
+            - `labels`: tuple of label names.
+        """
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        # Values by tuple of label values.
+        self._series = {}
+
+    def _key(self, values):
+        """Get series key, new series over `MAX_SERIES` go to `other`."""
+        if len(values) != len(self.labels):
+            raise ValueError(f'{self.name} expects labels {self.labels}')
+        key = tuple(str(value) for value in values)
+        if key not in self._series and len(self._series) >= MAX_SERIES:
+            key = ('other', ) * len(self.labels)
+        return key
+
+    def render(self):
+        """Render metric in Prometheus text format.
+
+        :Returns:
+            list of lines.
+        """
+        lines = [f'# HELP {self.name} {self.help}',
+                 f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, value in series:
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f'{self.name}{format_labels(self.labels, key)} {value}']
+
+
+class Counter(Metric):
+
+    """Monotonically growing value."""
+
+    kind = 'counter'
+
+    def inc(self, *values, amount=1):
+        """Increase counter of label values by amount."""
+        with self._lock:
+            key = self._key(values)
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+
+    """Value that goes up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value, *values):
+        """Set value of label values."""
+        with self._lock:
+            self._series[self._key(values)] = value
+
+    def inc(self, *values, amount=1):
+        """Increase value of label values by amount, may be negative."""
+        with self._lock:
+            key = self._key(values)
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Histogram(Metric):
+
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        """Initialize histogram.
+
+        :Parameters:
+            - `name`: a string with metric name.
+            - `help_text`: a string with metric description.
+            - `labels`: tuple of label names.
+            - `buckets`: sorted tuple of bucket upper bounds.
+        """
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, *values):
+        """Add observed value to histogram of label values."""
+        with self._lock:
+            key = self._key(values)
+            series = self._series.get(key)
+            if series is None:
+                # Per bucket counts with +Inf bucket, and sum.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1),
+                                              0.0]
+            series[0][bisect.bisect_left(self.buckets, amount)] += 1
+            series[1] += amount
+
+    def _render_series(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf', ), counts):
+            cumulative += count
+            labels = format_labels(self.labels, key, f'le="{bound}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = format_labels(self.labels, key)
+        lines.append(f'{self.name}_sum{labels} {round(total, 6)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def __register(self, metric):
+        with self.__lock:
+            if metric.name in self.__metrics:
+                raise ValueError(f'Metric {metric.name} already registered')
+            self.__metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        """Register new Counter."""
+        return self.__register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        """Register new Gauge."""
+        return self.__register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        """Register new Histogram."""
+        return self.__register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """Render all metrics in Prometheus text format.
+
+        :Returns:
+            a string with metrics.
+        """
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registry of server process.
+REGISTRY = Registry()
@@ -2,79 +2,157 @@
 
 """This module works with database."""
 
+import functools
+import logging
 import pymysql
 import time
 
-from constants import RETRY, DELAY
+from pymysql.constants import CR, ER
+from connection_pool import ConnectionPool, PoolTimeout
+from constants import DEFAULT_PRIORITY, DELAY, LEASE, RETRY
+from scheduler import create_scheduler
+from statements import in_list, insert_statement, update_statement
+from storage import CLAIM_COLUMNS, DB_RETRIES, HISTORY_JOB_COLUMNS, \
+    HISTORY_RESULT_COLUMNS, HISTORY_TABLE, Storage, StorageException, \
+    held_results, history_month, history_tables, measured
 
 
-class MySqlException(Exception):
+# Errors of lost connection, transaction is retried on new connection.
+CONNECTION_LOST = (CR.CR_CONNECTION_ERROR, CR.CR_CONN_HOST_ERROR,
+                   CR.CR_SERVER_GONE_ERROR, CR.CR_SERVER_LOST,
+                   CR.CR_SERVER_LOST_EXTENDED, ER.SERVER_SHUTDOWN)
+# Errors of transaction aborted by server, it is retried on the same
+# connection after rollback.
+TRANSACTION_ABORTED = (ER.LOCK_DEADLOCK, ER.LOCK_WAIT_TIMEOUT)
+
+
+class MySqlException(StorageException):
     """Base MySqlClient Exception Error class."""
     pass
 
 
-class MySqlClient:
+def error_code(error):
+    """Get MySql error code of exception.
+
+    :Parameters:
+        - `error`: exception instance.
+
+    :Returns:
+        1) int error code for pymysql errors.
+        2) None for other exceptions.
+    """
+    if isinstance(error, pymysql.err.Error) and error.args and \
+            isinstance(error.args[0], int):
+        return error.args[0]
+    return None
+
+
+def connection_lost(error):
+    """Check if error means connection to database is lost.
+
+    :Parameters:
+        - `error`: exception instance.
+
+    :Returns:
+        True if error has one of `CONNECTION_LOST` codes or connection
+        was already closed.
+    """
+    return isinstance(error, pymysql.err.InterfaceError) or \
+        error_code(error) in CONNECTION_LOST
+
+
+class MySqlClient(Storage):
 
     """Class that works with MySql database."""
 
-    def __init__(self, config, logger):
+    def __init__(self, config, logger, pool=None):
         """Initialize db params, config and logger.
 
         :Parameters:
             - `config`: configparser instance.
             - `logger': logging.logger instance.
+            - `pool`: ConnectionPool instance shared between clients.
+                      by default new pool is created.
         """
         self.config = config
         self.logger = logger
-        self.__host = self.config.get('db', 'host')
-        self.__name = self.config.get('db', 'name')
-        self.__user = self.config.get('db', 'user')
-        self.__passwd = self.config.get('db', 'passwd')
+        self.__pool = pool or ConnectionPool(config, logger)
+        # Order of claims, None claims oldest jobs first.
+        self.scheduler = create_scheduler(config)
         # Retries connect to db.
         self.__retries = RETRY
         # Delay connect after retry.
         self.__delay = DELAY
 
+    @property
+    def pool(self):
+        """Connection pool used by client."""
+        return self.__pool
+
+    def close(self):
+        """Close idle connections of pool."""
+        self.logger.info('Connection pool stats: %s', self.__pool.stats())
+        self.__pool.close()
+
     def with_connection(func):
-        """Database connection decorator."""
+        """Database connection decorator.
+
+        Borrows connection from pool and runs decorated method in one
+        transaction. Lost connections, see `CONNECTION_LOST`, and aborted
+        transactions, see `TRANSACTION_ABORTED`, are retried `RETRY`
+        times with `DELAY` seconds pause, broken connections are not
+        returned to pool. Other errors, for e.g. of schema, are raised
+        at once.
+        """
+        @functools.wraps(func)
+        @measured('mysql', func.__name__)
         def wrapper(self, *args, **kwargs):
-            self.logger.info('Connecting to database')
             retries = self.__retries
-            result = 'no connection to db'
-            while retries >=1:
+            while retries >= 1:
                 try:
-                    cnx = pymysql.connect(host=self.__host,
-                                        db=self.__name,
-                                        user=self.__user,
-                                        passwd=self.__passwd)
-                    self.logger.info('Connected')
-                    self.logger.debug("Calling func %s " % (func.__name__, ))
-                    try:
-                        cursor = cnx.cursor()
-                        result = func(self, cursor, *args, **kwargs)
-                        self.logger.info("Commiting changes")
-                        cnx.commit()
-                    except Exception as error:
-                        self.logger.error(error)
-                        self.logger.info("Rollbacking changes")
-                        cnx.rollback()
+                    cnx = self.__pool.acquire()
+                except (pymysql.err.Error, PoolTimeout) as error:
+                    self.logger.error('Error occured when connecting '
+                                      'to database:%s', error)
+                    if isinstance(error, pymysql.err.Error) and \
+                            not connection_lost(error):
+                        # For e.g. access denied, retry can not help.
                         raise MySqlException(error)
-                    finally:
-                        self.logger.debug("Closing connection %s" % (cnx, ))
-                        cnx.close()
-                        break
-
-                except Exception as error:
-                    self.logger.error(f'Error occured when connecting '
-                                      f'to database:{error}')
+                    retries -= 1
+                    DB_RETRIES.inc('mysql', func.__name__)
                     time.sleep(self.__delay)
+                    continue
+                self.logger.debug('Calling func %s', func.__name__)
+                try:
+                    cursor = cnx.cursor()
+                    result = func(self, cursor, *args, **kwargs)
+                    cnx.commit()
+                except Exception as error:
+                    self.logger.error(error)
+                    if connection_lost(error):
+                        self.__pool.release(cnx, discard=True)
+                    else:
+                        self.logger.info("Rollbacking changes")
+                        try:
+                            cnx.rollback()
+                        except pymysql.err.Error:
+                            self.__pool.release(cnx, discard=True)
+                        else:
+                            self.__pool.release(cnx)
+                    if not connection_lost(error) and \
+                            error_code(error) not in TRANSACTION_ABORTED:
+                        raise MySqlException(error)
+                    # Whole transaction is retried.
                     retries -= 1
-            if result == 'no connection to db':
-                msg = f'Connection to database failed after ' \
-                      f'{self.__retries} retries'
-                self.logger.error(msg)
-                raise MySqlException(msg)
-            return result
+                    DB_RETRIES.inc('mysql', func.__name__)
+                    time.sleep(self.__delay)
+                    continue
+                self.__pool.release(cnx)
+                return result
+            msg = f'Connection to database failed after ' \
+                  f'{self.__retries} retries'
+            self.logger.error(msg)
+            raise MySqlException(msg)
         return wrapper
 
     def insert_dict(self, cursor, table, data):
@@ -85,14 +163,23 @@ class MySqlClient:
             - `table`: a string with mysql table name.
             - `data`: dictionary with data to insert.
         """
-        data_set = [(column, f'"{value}"') for column, value in data.items()]
-        columns, values = list(zip(*data_set))
-        columns_expression = ','.join(columns)
-        values_expression = ','.join(values)
-        sql_query = (f"INSERT INTO {table} ({columns_expression}) "
-                     f"VALUES({values_expression})")
-        self.logger.debug(f'Executing query: {sql_query}')
-        cursor.execute(sql_query)
+        sql_query = insert_statement(table, tuple(data))
+        self.logger.debug('Executing query: %s', sql_query)
+        cursor.execute(sql_query, tuple(data.values()))
+
+    def insert_rows(self, cursor, table, columns, rows):
+        """Insert many rows with one multi-row statement.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `table`: a string with mysql table name.
+            - `columns`: tuple of column names.
+            - `rows`: list of tuples with values of `columns`.
+        """
+        sql_query = insert_statement(table, columns)
+        self.logger.debug('Executing query for %d rows: %s', len(rows),
+                          sql_query)
+        cursor.executemany(sql_query, rows)
 
     @with_connection
     def create_job(self, cursor, job_info):
@@ -108,6 +195,29 @@ class MySqlClient:
         job_info['mtime'] = now
         self.insert_dict(cursor, 'job_queue', job_info)
 
+    @with_connection
+    def create_jobs(self, cursor, jobs):
+        """Create many jobs in one transaction.
+
+        pymysql rewrites `executemany` of INSERT into multi-row statements.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `jobs`: list of dictionaries with client host, job type and
+                      job argument. for e.g.:
+                      [{'client_host': 'localhost', 'job_type': 'create',
+                        'job_arg': '/tmp/text.txt'}]
+        """
+        now = int(time.time())
+        columns = ('client_host', 'job_type', 'job_arg', 'priority',
+                   'affinity', 'ctime', 'mtime')
+        rows = [(job['client_host'], job['job_type'], job['job_arg'],
+                 job.get('priority', DEFAULT_PRIORITY),
+                 job.get('affinity', ''), now, now)
+                for job in jobs]
+        self.logger.debug('Create %d jobs', len(rows))
+        self.insert_rows(cursor, 'job_queue', columns, rows)
+
     @with_connection
     def update_job(self, cursor, job_info, result_info=None):
         """Update job.
@@ -125,44 +235,431 @@ class MySqlClient:
         not_update = ('id',)
         job_id = job_info['id']
         job_info['mtime'] = int(time.time())
-        data_set = [f'{column} = "{value}"' for column, value in job_info.items()
-                    if column not in not_update]
-        set_expression = ','.join(data_set)
-        sql_query = (f"UPDATE job_queue SET {set_expression} "
-                     f"WHERE id = '{job_id}'")
-        self.logger.info(f'Update job with id {job_id} status to {job_info}')
-        cursor.execute(sql_query)
+        columns = tuple(column for column in job_info
+                        if column not in not_update)
+        sql_query = update_statement('job_queue', columns)
+        self.logger.debug('Update job with id %s status to %s', job_id,
+                          job_info)
+        cursor.execute(sql_query,
+                       (*(job_info[column] for column in columns), job_id))
         if result_info:
             result_info['job_id'] = job_info['id']
             result_info['run_time'] = int(time.time()) - job_info['stime']
             self.insert_dict(cursor, 'job_result', result_info)
 
     @with_connection
-    def get_job(self, cursor):
-        """Get new job to process it.
+    def update_jobs(self, cursor, results):
+        """Finish many jobs and save their results in one transaction.
 
         :Parameters:
             - `cursor`: connection cursor object. It comes from decorator.
+            - `results`: list of (job_info, result_info) pairs. for e.g.:
+                         [({'id': 1, 'status': 'finished',
+                            'stime': 1553207811},
+                           {'result': 'PASS',
+                            'result_info: 'File test.txt created'})]
 
         :Returns:
-            1) Empty dict if no jobs in queue with status 'new'.
-            2) Dictionary with job information that contains all values
-               from `required_columns` variable. for e.g.:
-               {'id': 1, 'client_host: 'localhost',
-                'job_type': 'create', 'job_arg': 'test.txt'}
-        """
-        status = 'new'
-        required_columns = ('id', 'client_host', 'job_type', 'job_arg')
-        select_expression = ','.join(required_columns)
+            list of ids of finished jobs, see `Storage.update_jobs`.
+        """
+        if not results:
+            return []
+        ids = list(dict.fromkeys(job_info['id'] for job_info, _ in results))
+        cursor.execute(f"SELECT id, stime, attempts FROM job_queue "
+                       f"WHERE id IN {in_list(len(ids))} "
+                       f"AND status = 'in_progress' FOR UPDATE", ids)
+        claims = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        results, dropped = held_results(results, claims)
+        if dropped:
+            self.logger.warning('Dropped results of jobs not held by '
+                                'reporting claim: %s', dropped)
+        if not results:
+            return []
+        now = int(time.time())
+        ids = [job_info['id'] for job_info, _ in results]
+        sql_query = (f"UPDATE job_queue SET status = 'finished', mtime = %s "
+                     f"WHERE id IN {in_list(len(ids))}")
+        self.logger.debug('Finish %d jobs', len(ids))
+        cursor.execute(sql_query, (now, *ids))
+        rows = [(job_info['id'], result_info['result'],
+                 str(result_info['result_info'])[:255],
+                 now - job_info['stime'])
+                for job_info, result_info in results]
+        columns = ('job_id', 'result', 'result_info', 'run_time')
+        self.insert_rows(cursor, 'job_result', columns, rows)
+        return ids
+
+    @with_connection
+    def get_jobs(self, cursor, limit=1, lease=LEASE, affinities=(),
+                 stale_before=None):
+        """Claim new jobs to process them.
+
+        Jobs with status 'new' are locked and switched to 'in_progress'
+        in one transaction: pinned to worker affinities first, then
+        without affinity, then stale pinned ones oldest first. Rows
+        locked by concurrent claims are skipped, so parallel workers
+        never get the same job.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `limit`: max amount of jobs to claim. by default 1.
+            - `lease`: seconds jobs are held. by default `LEASE`.
+            - `affinities`: hosts and labels of worker. by default none.
+            - `stale_before`: timestamp, pinned jobs created before it
+                              go to any worker. by default never.
+
+        :Returns:
+            List of dictionaries with job information that contain all
+            values from `CLAIM_COLUMNS` variable, status, start time
+            and lease expiry. for e.g.:
+            [{'id': 1, 'client_host: 'localhost',
+              'job_type': 'create', 'job_arg': 'test.txt', 'priority': 0,
+              'affinity': 'localhost', 'attempts': 1,
+              'status': 'in_progress', 'stime': 1553207811,
+              'lease_expiry': 1553208111}]
+        """
+        jobs = []
+        for affinity in dict.fromkeys((*affinities, '')):
+            jobs.extend(self.claim_affinity(cursor, limit - len(jobs), lease,
+                                            affinity))
+            if len(jobs) >= limit:
+                break
+        if len(jobs) < limit and stale_before is not None:
+            # Stale jobs bypass scheduler and go oldest first: their
+            # bands would need a scan of all pinned jobs. Jobs without
+            # affinity are claimed already, so scan of `idx_status_ctime`
+            # from oldest job meets stale ones only.
+            jobs.extend(self.claim_jobs(
+                cursor, limit - len(jobs), lease,
+                "AND affinity <> '' AND ctime < %s", (stale_before, )))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('Get new tasks: %s', jobs)
+        return jobs
+
+    def claim_affinity(self, cursor, limit, lease, affinity):
+        """Claim new jobs of one affinity.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `limit`: max amount of jobs to claim.
+            - `lease`: seconds jobs are held.
+            - `affinity`: host or label of jobs, empty for any worker.
+
+        :Returns:
+            list of claimed jobs like in `get_jobs`.
+        """
+        if self.scheduler is None:
+            # Range scan of `idx_status_affinity_ctime` index.
+            return self.claim_jobs(cursor, limit, lease,
+                                   'AND affinity = %s', (affinity, ))
+        return self.scheduler.claim(
+            limit,
+            lambda band: self.top_band(cursor, affinity, band),
+            lambda band: self.band_hosts(cursor, affinity, band),
+            lambda band, host, amount: self.claim_jobs(
+                cursor, amount, lease,
+                'AND affinity = %s AND priority = %s AND client_host = %s',
+                (affinity, band, host)),
+            affinity)
+
+    def top_band(self, cursor, affinity, below=None):
+        """Get highest priority of new jobs.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `affinity`: host or label of jobs.
+            - `below`: only priorities lower than it are checked.
+                       by default all.
+
+        :Returns:
+            priority or None if there are no new jobs.
+        """
+        # Backward seek of `idx_status_affinity_priority_host` index.
+        if below is None:
+            cursor.execute("SELECT priority FROM job_queue "
+                           "WHERE status = 'new' AND affinity = %s "
+                           "ORDER BY priority DESC LIMIT 1", (affinity, ))
+        else:
+            cursor.execute("SELECT priority FROM job_queue "
+                           "WHERE status = 'new' AND affinity = %s "
+                           "AND priority < %s "
+                           "ORDER BY priority DESC LIMIT 1",
+                           (affinity, below))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def band_hosts(self, cursor, affinity, band):
+        """Get hosts with new jobs of priority.
+
+        Runs as loose index scan of `idx_status_affinity_priority_host`,
+        so it reads one index entry per host.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `affinity`: host or label of jobs.
+            - `band`: priority of jobs.
+
+        :Returns:
+            list of hosts.
+        """
+        cursor.execute("SELECT DISTINCT client_host FROM job_queue "
+                       "WHERE status = 'new' AND affinity = %s "
+                       "AND priority = %s", (affinity, band))
+        return [row[0] for row in cursor.fetchall()]
+
+    def claim_jobs(self, cursor, limit, lease, condition='', params=()):
+        """Claim oldest new jobs matching condition.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `limit`: max amount of jobs to claim.
+            - `lease`: seconds jobs are held.
+            - `condition`: a string with SQL condition added to
+                           `status = 'new'`. by default any job.
+            - `params`: tuple with values of condition placeholders.
+
+        :Returns:
+            list of claimed jobs like in `get_jobs`.
+        """
+        select_expression = ','.join(CLAIM_COLUMNS)
         sql_query = (f"SELECT {select_expression} FROM job_queue "
-                     f"WHERE status = '{status}' ORDER BY ctime LIMIT 1")
-        cursor.execute(sql_query)
-        result = cursor.fetchall()
-        new_job = {}
-        if result:
-            new_job = dict(zip(required_columns, result[0]))
-            new_job['status'] = 'in_progress'
-            new_job['stime'] = int(time.time())
-            self.update_job(new_job)
-        self.logger.info(f'Get new task: {new_job}')
-        return new_job
+                     f"WHERE status = 'new' {condition} "
+                     f"ORDER BY ctime LIMIT %s FOR UPDATE SKIP LOCKED")
+        cursor.execute(sql_query, (*params, limit))
+        jobs = [dict(zip(CLAIM_COLUMNS, row)) for row in cursor.fetchall()]
+        if not jobs:
+            return jobs
+        now = int(time.time())
+        ids = [job['id'] for job in jobs]
+        sql_query = (f"UPDATE job_queue "
+                     f"SET status = 'in_progress', stime = %s, mtime = %s, "
+                     f"lease_expiry = %s, attempts = attempts + 1 "
+                     f"WHERE id IN {in_list(len(ids))}")
+        cursor.execute(sql_query, (now, now, now + lease, *ids))
+        for job in jobs:
+            job['status'] = 'in_progress'
+            job['stime'] = now
+            job['lease_expiry'] = now + lease
+            job['attempts'] += 1
+        return jobs
+
+    @with_connection
+    def has_new_jobs(self, cursor):
+        """Check if queue has new jobs of any affinity.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+
+        :Returns:
+            True if there are jobs with status 'new'.
+        """
+        cursor.execute("SELECT 1 FROM job_queue WHERE status = 'new' LIMIT 1")
+        return cursor.fetchone() is not None
+
+    def archive_jobs(self, before, limit, status='finished'):
+        """Move jobs of terminal status with results to history tables.
+
+        History tables are created in separate call, as DDL commits
+        transaction implicitly in MySql.
+
+        :Parameters:
+            - `before`: timestamp, jobs modified before it are moved.
+            - `limit`: max amount of jobs moved in one transaction.
+            - `status`: one of `ARCHIVED_STATUSES`. by default 'finished'.
+
+        :Returns:
+            amount of moved jobs.
+        """
+        months = self.archived_jobs(before, limit, status)
+        if not months:
+            return 0
+        self.create_history(tuple(months))
+        return self.move_jobs(months, status)
+
+    @with_connection
+    def archived_jobs(self, cursor, before, limit, status):
+        """Select jobs of terminal status to archive.
+
+        Runs over `idx_status_mtime` index.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `before`: timestamp, jobs modified before it are selected.
+            - `limit`: max amount of jobs.
+            - `status`: one of `ARCHIVED_STATUSES`.
+
+        :Returns:
+            dictionary with lists of job ids by history month.
+        """
+        cursor.execute("SELECT id, ctime FROM job_queue "
+                       "WHERE status = %s AND mtime < %s "
+                       "ORDER BY mtime LIMIT %s", (status, before, limit))
+        months = {}
+        for job_id, ctime in cursor.fetchall():
+            months.setdefault(history_month(ctime), []).append(job_id)
+        return months
+
+    @with_connection
+    def create_history(self, cursor, months):
+        """Create history tables of months from templates.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `months`: tuple of YYYYMM integers.
+        """
+        for month in months:
+            jobs_table, results_table = history_tables(month)
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {jobs_table} '
+                           f'LIKE job_queue_history')
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {results_table} '
+                           f'LIKE job_result_history')
+
+    @with_connection
+    def move_jobs(self, cursor, months, status):
+        """Copy jobs with results to history tables and delete them.
+
+        Jobs are locked first, so jobs moved by concurrent archival
+        are skipped.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `months`: dictionary with lists of job ids by history month.
+            - `status`: status of selected jobs.
+
+        :Returns:
+            amount of moved jobs.
+        """
+        jobs_columns = ','.join(HISTORY_JOB_COLUMNS)
+        results_columns = ','.join(HISTORY_RESULT_COLUMNS)
+        moved = 0
+        for month, ids in months.items():
+            cursor.execute(f"SELECT id FROM job_queue "
+                           f"WHERE id IN {in_list(len(ids))} "
+                           f"AND status = %s FOR UPDATE", (*ids, status))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                continue
+            jobs_table, results_table = history_tables(month)
+            id_list = in_list(len(ids))
+            cursor.execute(f'INSERT INTO {jobs_table} ({jobs_columns}) '
+                           f'SELECT {jobs_columns} FROM job_queue '
+                           f'WHERE id IN {id_list}', ids)
+            cursor.execute(f'INSERT INTO {results_table} ({results_columns}) '
+                           f'SELECT {results_columns} FROM job_result '
+                           f'WHERE job_id IN {id_list}', ids)
+            cursor.execute(f'DELETE FROM job_result WHERE job_id IN {id_list}',
+                           ids)
+            cursor.execute(f'DELETE FROM job_queue WHERE id IN {id_list}', ids)
+            moved += len(ids)
+        self.logger.debug('Archived %d jobs', moved)
+        return moved
+
+    @with_connection
+    def history_months(self, cursor):
+        """Get months of existing history tables.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+
+        :Returns:
+            sorted list of months as YYYYMM integers.
+        """
+        cursor.execute("SELECT table_name FROM information_schema.tables "
+                       "WHERE table_schema = DATABASE() "
+                       "AND table_name LIKE 'job\\_queue\\_history\\_%'")
+        return sorted(int(match.group(1)) for match in
+                      (HISTORY_TABLE.match(row[0])
+                       for row in cursor.fetchall()) if match)
+
+    @with_connection
+    def drop_history(self, cursor, month):
+        """Drop history tables of month.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `month`: YYYYMM integer.
+        """
+        jobs_table, results_table = history_tables(month)
+        self.logger.info('Dropping history tables %s and %s', jobs_table,
+                         results_table)
+        cursor.execute(f'DROP TABLE IF EXISTS {results_table}, {jobs_table}')
+
+    @with_connection
+    def extend_leases(self, cursor, ids, lease=LEASE):
+        """Extend leases of jobs still in progress.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `ids`: list of job ids.
+            - `lease`: seconds jobs are held from now. by default `LEASE`.
+
+        :Returns:
+            list of ids of extended jobs.
+        """
+        if not ids:
+            return []
+        # Affected rows do not count leases extended to the same time.
+        cursor.execute(f"SELECT id FROM job_queue "
+                       f"WHERE id IN {in_list(len(ids))} "
+                       f"AND status = 'in_progress' FOR UPDATE", ids)
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids:
+            sql_query = (f"UPDATE job_queue SET lease_expiry = %s "
+                         f"WHERE id IN {in_list(len(ids))}")
+            cursor.execute(sql_query, (int(time.time()) + lease, *ids))
+        return ids
+
+    @with_connection
+    def requeue_expired(self, cursor, now, limit, max_attempts):
+        """Return jobs with expired leases to queue.
+
+        Runs over `idx_status_lease` index. Jobs locked by concurrent
+        reaper or report are skipped.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `now`: current timestamp.
+            - `limit`: max amount of jobs handled in one transaction.
+            - `max_attempts`: max amount of claims of job.
+
+        :Returns:
+            (amount of requeued jobs, amount of dead jobs) tuple.
+        """
+        cursor.execute("SELECT id, attempts FROM job_queue "
+                       "WHERE status = 'in_progress' AND lease_expiry < %s "
+                       "ORDER BY lease_expiry LIMIT %s "
+                       "FOR UPDATE SKIP LOCKED", (now, limit))
+        expired = cursor.fetchall()
+        requeued = [job_id for job_id, attempts in expired
+                    if attempts < max_attempts]
+        dead = [job_id for job_id, attempts in expired
+                if attempts >= max_attempts]
+        for status, ids in (('new', requeued), ('dead', dead)):
+            if ids:
+                cursor.execute(f"UPDATE job_queue "
+                               f"SET status = %s, lease_expiry = NULL, "
+                               f"mtime = %s "
+                               f"WHERE id IN {in_list(len(ids))}",
+                               (status, now, *ids))
+        if expired:
+            self.logger.debug('Requeued jobs %s, dead jobs %s', requeued,
+                              dead)
+        return len(requeued), len(dead)
+
+    @with_connection
+    def count_jobs(self, cursor):
+        """Count jobs by status.
+
+        Runs over `idx_status_ctime` index, so it is cheap enough to seed
+        in-process counters on start, but not for every request.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+
+        :Returns:
+            dictionary with amount of jobs by status. for e.g.:
+            {'new': 10, 'in_progress': 2, 'finished': 100}
+        """
+        cursor.execute('SELECT status, COUNT(*) FROM job_queue '
+                       'GROUP BY status')
+        return dict(cursor.fetchall())
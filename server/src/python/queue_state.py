@@ -0,0 +1,181 @@
+#!/usr/bin/env python3.7
+
+"""In-process view of amount of new jobs in queue."""
+
+import threading
+import time
+
+from metrics import REGISTRY
+from storage import StorageException
+
+RECONCILES = REGISTRY.counter('task_manager_queue_state_reconciles_total',
+                              'Reconciles of cached amount of new jobs '
+                              'with storage.', ('result', ))
+
+
+class QueueState:
+
+    """Cached amount of new jobs, so empty claims skip storage.
+
+    Amount is increased by jobs created through this server, decreased
+    by claimed ones, reset to zero when claim drained queue and
+    reconciled with storage periodically. Overestimate only costs
+    storage query, so when unknown the amount is rounded up.
+
+    When storage is `shared` with other servers, jobs submitted through
+    them are not seen here, so empty queue is trusted for `ttl` seconds
+    after storage was last seen empty. Jobs left by partial claims, for
+    e.g. pinned to other workers, are trusted for `ttl` seconds too.
+    """
+
+    def __init__(self, storage, logger, shared=True, ttl=1, interval=30):
+        """Initialize state from storage and start reconciling thread.
+
+        :Parameters:
+            - `storage`: Storage instance.
+            - `logger`: logging.logger instance.
+            - `shared`: True if other servers use the same storage.
+            - `ttl`: seconds empty shared queue is trusted.
+            - `interval`: seconds between reconciles with storage.
+        """
+        self.logger = logger
+        self.__storage = storage
+        self.__shared = shared
+        self.__ttl = ttl
+        self.__interval = interval
+        self.__lock = threading.Lock()
+        self.__new = 0
+        # Jobs created through this server since start.
+        self.__created = 0
+        # Monotonic time when storage was last seen empty.
+        self.__checked = 0
+        # Monotonic time when partial claim last left new jobs.
+        self.__left = None
+        self.__stop = threading.Event()
+        self.reconcile()
+        self.__reconciler = threading.Thread(target=self.__run,
+                                             name='queue-state', daemon=True)
+        self.__reconciler.start()
+
+    @property
+    def new(self):
+        """Cached amount of new jobs."""
+        with self.__lock:
+            return self.__new
+
+    def mark(self):
+        """Get mark of created jobs taken before storage query.
+
+        :Returns:
+            value passed to `claimed` or `counted`.
+        """
+        with self.__lock:
+            return self.__created
+
+    def empty(self):
+        """Check if claim may be answered without storage query.
+
+        :Returns:
+            True if queue is known to have no new jobs.
+        """
+        with self.__lock:
+            if self.__new > 0:
+                return False
+            return not self.__shared or \
+                time.monotonic() - self.__checked < self.__ttl
+
+    def created(self, amount):
+        """Count jobs created or requeued through this server.
+
+        :Parameters:
+            - `amount`: amount of new jobs.
+        """
+        with self.__lock:
+            self.__new += amount
+            self.__created += amount
+
+    def drained(self, has_new_jobs):
+        """Check if claim that got less jobs than requested drained queue.
+
+        Storage is asked at most once per `ttl` seconds while it has new
+        jobs left, so idle claims of workers not matching pinned jobs do
+        not cost second query each.
+
+        :Parameters:
+            - `has_new_jobs`: function that checks storage for new jobs.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to check storage.
+
+        :Returns:
+            True if storage has no new jobs.
+        """
+        with self.__lock:
+            if self.__left is not None and \
+                    time.monotonic() - self.__left < self.__ttl:
+                return False
+        if not has_new_jobs():
+            return True
+        with self.__lock:
+            self.__left = time.monotonic()
+        return False
+
+    def claimed(self, amount, drained, mark):
+        """Count claimed jobs.
+
+        :Parameters:
+            - `amount`: amount of claimed jobs.
+            - `drained`: True if storage had less jobs than requested.
+            - `mark`: value of `mark` taken before claim.
+        """
+        with self.__lock:
+            self.__new = max(self.__new - amount, 0)
+            if drained:
+                # Only jobs created after query may be left.
+                self.__new = min(self.__new, self.__created - mark)
+                self.__checked = time.monotonic()
+
+    def counted(self, amount, mark):
+        """Set amount of new jobs counted in storage.
+
+        :Parameters:
+            - `amount`: amount of new jobs in storage.
+            - `mark`: value of `mark` taken before count.
+        """
+        with self.__lock:
+            # Jobs created during count may be missed by it.
+            new = amount + self.__created - mark
+            if new != self.__new:
+                self.logger.debug('Reconciled new jobs from %d to %d',
+                                  self.__new, new)
+            RECONCILES.inc('changed' if new != self.__new else 'same')
+            self.__new = new
+            if not amount:
+                self.__checked = time.monotonic()
+
+    def reconcile(self):
+        """Count new jobs in storage.
+
+        On failure amount is unknown, so claims go to storage until it
+        is counted again.
+        """
+        mark = self.mark()
+        try:
+            amount = self.__storage.count_jobs().get('new', 0)
+        except StorageException as error:
+            RECONCILES.inc('failed')
+            self.logger.error('Failed to reconcile queue state: %s', error)
+            with self.__lock:
+                self.__new = max(self.__new, 1)
+            return
+        self.counted(amount, mark)
+
+    def __run(self):
+        """Reconcile with storage until closed."""
+        while not self.__stop.wait(self.__interval):
+            self.reconcile()
+
+    def close(self):
+        """Stop reconciling thread."""
+        self.__stop.set()
+        self.__reconciler.join()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3.7
+
+"""Requeue of jobs whose claim lease expired."""
+
+import threading
+import time
+
+from constants import MAX_ATTEMPTS, REAPER_BATCH, REAPER_INTERVAL
+from metrics import REGISTRY
+from storage import StorageException
+
+REAPED = REGISTRY.counter('task_manager_reaped_jobs_total',
+                          'Jobs with expired lease by new status.',
+                          ('status', ))
+
+
+class Reaper:
+
+    """Background thread returning jobs of lost workers to queue.
+
+    Every `interval` seconds jobs in progress with expired lease are
+    switched back to 'new' in transactions of `batch_size` jobs, or to
+    'dead' when they were claimed `max_attempts` times already.
+    """
+
+    def __init__(self, storage, logger, max_attempts=MAX_ATTEMPTS,
+                 batch_size=REAPER_BATCH, interval=REAPER_INTERVAL,
+                 on_reap=None):
+        """Initialize reaper and start its thread.
+
+        :Parameters:
+            - `storage`: Storage instance.
+            - `logger`: logging.logger instance.
+            - `max_attempts`: max amount of claims of job.
+            - `batch_size`: max amount of jobs handled by one transaction.
+            - `interval`: seconds between checks.
+            - `on_reap`: function called with amounts of requeued and
+                         dead jobs.
+        """
+        self.logger = logger
+        self.__storage = storage
+        self.__max_attempts = max_attempts
+        self.__batch_size = batch_size
+        self.__interval = interval
+        self.__on_reap = on_reap
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name='reaper',
+                                         daemon=True)
+        self.__thread.start()
+
+    def reap(self):
+        """Requeue all jobs with expired leases.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to requeue jobs.
+
+        :Returns:
+            (amount of requeued jobs, amount of dead jobs) tuple.
+        """
+        now = int(time.time())
+        total_requeued = total_dead = 0
+        while not self.__stop.is_set():
+            requeued, dead = self.__storage.requeue_expired(
+                now, self.__batch_size, self.__max_attempts)
+            if requeued or dead:
+                REAPED.inc('new', amount=requeued)
+                REAPED.inc('dead', amount=dead)
+                if self.__on_reap:
+                    self.__on_reap(requeued, dead)
+            total_requeued += requeued
+            total_dead += dead
+            if requeued + dead < self.__batch_size:
+                break
+        if total_requeued or total_dead:
+            self.logger.warning('Requeued %d jobs with expired lease, '
+                                '%d jobs are dead after %d attempts',
+                                total_requeued, total_dead,
+                                self.__max_attempts)
+        return total_requeued, total_dead
+
+    def __run(self):
+        """Reap expired jobs until closed."""
+        while not self.__stop.wait(self.__interval):
+            try:
+                self.reap()
+            except StorageException as error:
+                self.logger.error('Failed to requeue expired jobs: %s',
+                                  error)
+
+    def close(self):
+        """Stop reaper thread after current transaction."""
+        self.__stop.set()
+        self.__thread.join()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3.7
+
+"""Order of claimed jobs by priority and submitting host."""
+
+import threading
+
+# Claim policies: `fair` serves priority bands strictly and hosts within
+# band by weighted round-robin, `fifo` claims oldest jobs.
+POLICIES = ('fair', 'fifo')
+# Max amount of bands with round-robin state, least recently used go
+# first. Queues are affinities named by clients, so they are unbounded.
+MAX_STATES = 1000
+
+
+def parse_weights(value):
+    """Parse host weights like `10.0.0.1:3, 10.0.0.2:2`.
+
+    :Parameters:
+        - `value`: a string with comma separated host:weight items.
+
+    :Exceptions:
+        - `ValueError`: is raised if item is not valid.
+
+    :Returns:
+        dictionary with weights by host.
+    """
+    weights = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        host, _, weight = item.strip().rpartition(':')
+        if not host or int(weight) < 1:
+            raise ValueError(f'Invalid host weight: {item.strip()!r}')
+        weights[host] = int(weight)
+    return weights
+
+
+class Scheduler:
+
+    """Strict priority bands with weighted round-robin across hosts.
+
+    Jobs of highest priority band with new jobs are claimed first. Within
+    band every host gets share of claimed jobs proportional to its
+    weight, so host that submitted many jobs does not delay others.
+    Round-robin state is kept per queue and band in this process and is
+    dropped once band runs out of new jobs.
+    """
+
+    def __init__(self, weights=None, default_weight=1):
+        """Initialize scheduler.
+
+        :Parameters:
+            - `weights`: dictionary with weights by host.
+            - `default_weight`: weight of hosts missing in `weights`.
+        """
+        self.__weights = weights or {}
+        self.__default_weight = default_weight
+        # Current values of smooth weighted round-robin by band and host.
+        self.__current = {}
+        self.__lock = threading.Lock()
+
+    def quotas(self, band, hosts, amount):
+        """Split claimed jobs among hosts by smooth weighted round-robin.
+
+        :Parameters:
+            - `band`: key of round-robin state, for e.g. priority band.
+            - `hosts`: list of hosts with new jobs in band.
+            - `amount`: amount of jobs to claim.
+
+        :Returns:
+            dictionary with amount of jobs by host, in order of picks.
+        """
+        weights = {host: self.__weights.get(host, self.__default_weight)
+                   for host in hosts}
+        total = sum(weights.values())
+        quotas = {}
+        with self.__lock:
+            current = self.__current.pop(band, {})
+            if len(self.__current) >= MAX_STATES:
+                del self.__current[next(iter(self.__current))]
+            self.__current[band] = current
+            # Hosts without jobs lose their turn.
+            for host in list(current):
+                if host not in weights:
+                    del current[host]
+            for _ in range(amount):
+                for host, weight in weights.items():
+                    current[host] = current.get(host, 0) + weight
+                picked = max(hosts, key=current.get)
+                current[picked] -= total
+                quotas[picked] = quotas.get(picked, 0) + 1
+        return quotas
+
+    def forget(self, band):
+        """Drop round-robin state of band without new jobs.
+
+        :Parameters:
+            - `band`: key of round-robin state like in `quotas`.
+        """
+        with self.__lock:
+            self.__current.pop(band, None)
+
+    def claim(self, limit, top_band, band_hosts, host_jobs, queue=''):
+        """Claim jobs in scheduled order.
+
+        Callables run storage queries in claim transaction, so jobs
+        claimed by `host_jobs` are not seen by next queries.
+
+        :Parameters:
+            - `limit`: max amount of jobs to claim.
+            - `top_band`: function of band, returns highest band below it
+                          with new jobs or None. None band means any.
+            - `band_hosts`: function of band, returns list of hosts with
+                            new jobs in band.
+            - `host_jobs`: function of band, host and amount, claims and
+                           returns oldest jobs of host in band.
+            - `queue`: name of scheduled jobs, for e.g. their affinity.
+                       Bands of every queue have own round-robin state.
+
+        :Returns:
+            list of claimed jobs. It is shorter than `limit` only if
+            queue has no more new jobs.
+        """
+        jobs = []
+        band = None
+        while len(jobs) < limit:
+            band = top_band(band)
+            if band is None:
+                break
+            hosts = band_hosts(band)
+            while hosts and len(jobs) < limit:
+                quotas = self.quotas((queue, band), hosts,
+                                     limit - len(jobs))
+                for host, quota in quotas.items():
+                    claimed = host_jobs(band, host, quota)
+                    jobs.extend(claimed)
+                    if len(claimed) < quota:
+                        hosts.remove(host)
+            if not hosts:
+                self.forget((queue, band))
+        return jobs
+
+
+def create_scheduler(config):
+    """Create scheduler of configured claim policy.
+
+    :Parameters:
+        - `config`: configparser instance.
+
+    :Exceptions:
+        - `ValueError`: is raised if policy or weights are not valid.
+
+    :Returns:
+        1) Scheduler instance for `fair` policy.
+        2) None for `fifo` policy.
+    """
+    policy = config.get('scheduler', 'policy', fallback='fair')
+    if policy == 'fifo':
+        return None
+    if policy == 'fair':
+        return Scheduler(parse_weights(config.get('scheduler', 'weights',
+                                                  fallback='')))
+    raise ValueError(f'Unknown claim policy: {policy}, '
+                     f'expected one of {POLICIES}')
@@ -3,98 +3,746 @@
 """Server module."""
 
 import json
+import logging
+import signal
+import threading
+import time
 
+from archiver import Archiver
+from constants import AFFINITY_FALLBACK, ARCHIVE_BATCH, ARCHIVE_INTERVAL, \
+    ARCHIVE_KEEP_MONTHS, ARCHIVE_PAUSE, ARCHIVE_RETENTION_DAYS, \
+    DEFAULT_PRIORITY, KEEPALIVE_TIMEOUT, LEASE, LONG_POLL_RECHECK, \
+    LONG_POLL_RETRY, MAX_ATTEMPTS, MAX_CLAIM, MAX_LABELS, MAX_PRIORITY, \
+    MAX_SUBMIT, MAX_WAIT, PINNED_TYPES, QUEUE_STATE_INTERVAL, \
+    QUEUE_STATE_TTL, READ_CHUNK, REAPER_BATCH, REAPER_INTERVAL, \
+    SUBMIT_INTERVAL, SUBMIT_MAX_JOBS, WORKERS
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from mysql_client import MySqlClient, MySqlException
+from http_servers import AsyncHTTPServer, ThreadPoolHTTPServer
+from job_notifier import JobNotifier
+from metrics import REGISTRY
+from queue_state import QueueState
+from reaper import Reaper
+from storage import StorageException, create_storage
+from submit_buffer import SubmitBuffer
 from tools.config_init import logger, config
+from urllib.parse import parse_qs, urlsplit
+
+# Content type of newline-delimited json job stream.
+NDJSON = 'application/x-ndjson'
 
 HOST = config.get('server', 'host')
 PORT = eval(config.get('server', 'port'))
+# Concurrency model: `single`, `threaded` or `asyncio`.
+MODE = config.get('server', 'mode', fallback='threaded')
+WORKERS = config.getint('server', 'workers', fallback=WORKERS)
+# Requests allowed to wait for jobs, rest of workers stay free.
+LONG_POLL_WAITERS = config.getint('server', 'long_poll_waiters',
+                                  fallback=WORKERS // 2)
+# Seconds claims over waiters limit are asked to wait before retrying.
+LONG_POLL_RETRY = config.getfloat('server', 'long_poll_retry',
+                                  fallback=LONG_POLL_RETRY)
+# Seconds idle keep-alive connection stays open.
+KEEPALIVE_TIMEOUT = config.getfloat('server', 'keepalive_timeout',
+                                    fallback=KEEPALIVE_TIMEOUT)
+# Submitted jobs are inserted by each request in `direct` mode, or by
+# group commits of buffer acknowledged after `flush` or on `enqueue`.
+SUBMIT_MODE = config.get('submit', 'mode', fallback='direct')
+SUBMIT_MAX_JOBS = config.getint('submit', 'max_jobs',
+                                fallback=SUBMIT_MAX_JOBS)
+SUBMIT_INTERVAL = config.getfloat('submit', 'interval_ms',
+                                  fallback=SUBMIT_INTERVAL) / 1000
+# Empty claims are answered from in-process amount of new jobs unless
+# disabled. Shared storage is checked again when queue was seen empty
+# more than `ttl` seconds ago.
+QUEUE_STATE = config.getboolean('queue_state', 'enabled', fallback=True)
+QUEUE_STATE_SHARED = config.getboolean('queue_state', 'shared',
+                                       fallback=True)
+QUEUE_STATE_TTL = config.getfloat('queue_state', 'ttl',
+                                  fallback=QUEUE_STATE_TTL)
+QUEUE_STATE_INTERVAL = config.getfloat('queue_state', 'reconcile_interval',
+                                       fallback=QUEUE_STATE_INTERVAL)
+# Finished jobs are archived by server thread if enabled, otherwise
+# by `tools.archive` run from cron.
+ARCHIVE = config.getboolean('archive', 'enabled', fallback=False)
+ARCHIVE_INTERVAL = config.getfloat('archive', 'interval',
+                                   fallback=ARCHIVE_INTERVAL)
+ARCHIVE_RETENTION_DAYS = config.getfloat('archive', 'retention_days',
+                                         fallback=ARCHIVE_RETENTION_DAYS)
+ARCHIVE_BATCH = config.getint('archive', 'batch_size', fallback=ARCHIVE_BATCH)
+ARCHIVE_PAUSE = config.getfloat('archive', 'pause_ms',
+                                fallback=ARCHIVE_PAUSE) / 1000
+ARCHIVE_KEEP_MONTHS = config.getint('archive', 'keep_months',
+                                    fallback=ARCHIVE_KEEP_MONTHS)
+# Claimed jobs not reported or extended by heartbeat within lease are
+# requeued, after `max_attempts` claims they get `dead` status.
+LEASE = config.getint('lease', 'duration', fallback=LEASE)
+MAX_ATTEMPTS = config.getint('lease', 'max_attempts', fallback=MAX_ATTEMPTS)
+REAPER_INTERVAL = config.getfloat('lease', 'reaper_interval',
+                                  fallback=REAPER_INTERVAL)
+REAPER_BATCH = config.getint('lease', 'reaper_batch', fallback=REAPER_BATCH)
+# Jobs of pinned types get submitting host as affinity. Pinned jobs go
+# to workers of other affinity after `fallback` seconds, 0 never.
+PINNED_TYPES = tuple(
+    job_type.strip() for job_type in
+    config.get('affinity', 'pinned_types',
+               fallback=','.join(PINNED_TYPES)).split(',')
+    if job_type.strip())
+AFFINITY_FALLBACK = config.getint('affinity', 'fallback',
+                                  fallback=AFFINITY_FALLBACK)
+# Paths used as metric labels, others are counted as `other`.
+ROUTES = ('get_job', 'task', 'job_result', 'heartbeat', 'metrics')
+# Content type of Prometheus text format.
+METRICS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REQUEST_SECONDS = REGISTRY.histogram('task_manager_request_seconds',
+                                     'Latency of HTTP requests.',
+                                     ('method', 'path', 'status'))
+JOBS = REGISTRY.gauge('task_manager_jobs',
+                      'Jobs by status, seeded from storage on start and '
+                      'updated by this server.', ('status', ))
+JOB_TRANSITIONS = REGISTRY.counter('task_manager_job_transitions_total',
+                                   'Jobs created, claimed and finished by '
+                                   'this server.', ('status', ))
+CACHED_CLAIMS = REGISTRY.counter('task_manager_cached_empty_claims_total',
+                                 'Claims answered as empty without '
+                                 'storage query.')
+JOB_RUN_SECONDS = REGISTRY.histogram('task_manager_job_run_seconds',
+                                     'Run time of finished jobs.',
+                                     ('job_type', ),
+                                     (1, 5, 10, 30, 60, 300, 900, 3600))
+
+
+def parse_job(item, host):
+    """Validate submitted job.
+
+    :Parameters:
+        - `item`: decoded json item.
+        - `host`: a string with client host.
+
+    :Exceptions:
+        - `ValueError`: is raised if job is not valid.
+
+    :Returns:
+        dictionary with job info to insert. for e.g.:
+        {'client_host': 'localhost', 'job_type': 'count',
+         'job_arg': '/tmp/test.txt', 'priority': 0, 'affinity': 'localhost'}
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Job must be an object')
+    job_type = item.get('job_type')
+    job_arg = item.get('job_arg')
+    if not isinstance(job_type, str) or not 0 < len(job_type) <= 20:
+        raise ValueError('job_type must be a string up to 20 characters')
+    if isinstance(job_arg, int):
+        job_arg = str(job_arg)
+    if not isinstance(job_arg, str) or len(job_arg) > 255:
+        raise ValueError('job_arg must be a string up to 255 characters')
+    priority = item.get('priority', DEFAULT_PRIORITY)
+    if not isinstance(priority, int) or isinstance(priority, bool) or \
+            not 0 <= priority <= MAX_PRIORITY:
+        raise ValueError(f'priority must be an integer in 0..{MAX_PRIORITY}')
+    affinity = item.get('affinity',
+                        host if job_type in PINNED_TYPES else '')
+    if not isinstance(affinity, str) or len(affinity) > 255:
+        raise ValueError('affinity must be a string up to 255 characters')
+    return {'client_host': host, 'job_type': job_type, 'job_arg': job_arg,
+            'priority': priority, 'affinity': affinity}
+
+
+def parse_results(results):
+    """Validate reported job results before they reach storage.
+
+    :Parameters:
+        - `results`: decoded json, one (job_info, result_info) pair or
+                     list of them.
+
+    :Exceptions:
+        - `ValueError`: is raised if any result is not valid.
+
+    :Returns:
+        list of (job_info, result_info) pairs with finished status.
+    """
+    if not isinstance(results, list):
+        raise ValueError('Results must be a list')
+    if results and isinstance(results[0], dict):
+        # Single (job_info, result_info) pair.
+        results = [results]
+    for pair in results:
+        if not isinstance(pair, list) or len(pair) != 2:
+            raise ValueError('Result must be a [job_info, result_info] pair')
+        job_info, result_info = pair
+        if not isinstance(job_info, dict) or \
+                not isinstance(result_info, dict):
+            raise ValueError('job_info and result_info must be objects')
+        for key in ('id', 'stime', 'attempts'):
+            value = job_info.get(key, 0)
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f'{key} must be an integer')
+        if 'id' not in job_info or 'stime' not in job_info:
+            raise ValueError('job_info must have id and stime')
+        if not isinstance(result_info.get('result'), str) or \
+                'result_info' not in result_info:
+            raise ValueError('result_info must have result and result_info')
+        job_info['status'] = 'finished'
+    return results
+
+
+def parse_affinities(query, address):
+    """Get hosts and labels advertised by worker.
+
+    :Parameters:
+        - `query`: dictionary of get_job query parameters from `parse_qs`.
+        - `address`: a string with client address, worker always
+                     matches jobs pinned to it.
+
+    :Exceptions:
+        - `ValueError`: is raised if host or labels are not valid.
+
+    :Returns:
+        list of affinities. for e.g.: ['10.0.0.5', 'build1', 'gpu']
+    """
+    affinities = [address, *query.get('host', [])[:1]]
+    labels = [label.strip() for value in query.get('labels', [])
+              for label in value.split(',') if label.strip()]
+    if len(labels) > MAX_LABELS:
+        raise ValueError(f'More than {MAX_LABELS} labels')
+    affinities.extend(labels)
+    if any(len(affinity) > 255 for affinity in affinities):
+        raise ValueError('host and labels must be up to 255 characters')
+    return affinities
+
+
+def count_transition(status, amount, previous=None):
+    """Update job metrics when jobs got new status.
+
+    :Parameters:
+        - `status`: a string with new status of jobs.
+        - `amount`: amount of jobs.
+        - `previous`: a string with previous status of jobs.
+    """
+    if not amount:
+        return
+    JOB_TRANSITIONS.inc(status, amount=amount)
+    JOBS.inc(status, amount=amount)
+    if previous:
+        JOBS.inc(previous, amount=-amount)
+
+
+def jobs_created(httpd, amount):
+    """Count created jobs and wake up waiting claims.
+
+    :Parameters:
+        - `httpd`: HTTP server instance.
+        - `amount`: amount of created jobs.
+    """
+    count_transition('new', amount)
+    if httpd.queue_state is not None:
+        httpd.queue_state.created(amount)
+    httpd.job_notifier.notify()
+
+
+def jobs_reaped(httpd, requeued, dead):
+    """Count jobs with expired lease and wake up waiting claims.
+
+    :Parameters:
+        - `httpd`: HTTP server instance.
+        - `requeued`: amount of jobs returned to queue.
+        - `dead`: amount of jobs moved to `dead` status.
+    """
+    count_transition('new', requeued, 'in_progress')
+    count_transition('dead', dead, 'in_progress')
+    if requeued:
+        if httpd.queue_state is not None:
+            httpd.queue_state.created(requeued)
+        httpd.job_notifier.notify()
 
 
 class TaskHandler(BaseHTTPRequestHandler):
 
     """Class handler of client requests."""
 
-    def __init__(self, *args, **kwargs):
-        """Initialize MySql client."""
-        self._mysql_client = MySqlClient(config, logger)
-        super().__init__(*args, **kwargs)
+    # Persistent connections, every response has Content-Length.
+    protocol_version = 'HTTP/1.1'
+    # Idle connection is closed after timeout, it holds no thread while
+    # idle in threaded and asyncio modes.
+    timeout = KEEPALIVE_TIMEOUT
+    # Headers and body are written separately, so small responses must
+    # not wait for delayed ACK of client.
+    disable_nagle_algorithm = True
+    # Max seconds claim waits for new jobs.
+    max_wait = MAX_WAIT
+
+    def log_message(self, format, *args):
+        """Write access log to server log instead of stderr."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s - ' + format, self.address_string(), *args)
+
+    def parse_request(self):
+        """Parse request headers and start request timer."""
+        self._start = time.perf_counter()
+        self._status = None
+        return super().parse_request()
+
+    def send_response(self, code, message=None):
+        """Send response status remembering it for metrics."""
+        self._status = code
+        super().send_response(code, message)
+
+    def handle_one_request(self):
+        """Handle one request and record its latency."""
+        self._start = None
+        super().handle_one_request()
+        if self._start is not None and self._status is not None:
+            path = urlsplit(self.path).path
+            REQUEST_SECONDS.observe(time.perf_counter() - self._start,
+                                    self.command,
+                                    path if path in ROUTES else 'other',
+                                    self._status)
 
-    def response(self, status, message):
-        """Send response with headers.
+    @property
+    def _storage(self):
+        """Job queue storage shared by server."""
+        return self.server.storage
+
+    def response(self, status, message, body=b'',
+                 content_type='application/json', headers=()):
+        """Send response with headers and body.
 
         :Parameters:
             - `status`: http status code.
             - `message`: a string with custom message.
+            - `body`: bytes of response body. by default empty.
+            - `content_type`: a string with body content type.
+                              by default 'application/json'.
+            - `headers`: extra (name, value) header pairs. by default none.
         """
         self.send_response(status, message)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
         self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def get_jobs(self, max_jobs, affinities):
+        """Claim jobs from storage and count them.
+
+        Claim that got less jobs than requested may have skipped jobs
+        pinned to other workers, so queue state is reset only if storage
+        has no new jobs at all.
+
+        :Parameters:
+            - `max_jobs`: max amount of jobs to claim or None
+                          to claim single job.
+            - `affinities`: list of hosts and labels of worker.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to get jobs.
+
+        :Returns:
+            1) list of jobs if `max_jobs` is set.
+            2) job dictionary otherwise, empty if no jobs.
+        """
+        state = self.server.queue_state
+        mark = state.mark() if state is not None else None
+        stale_before = int(time.time()) - AFFINITY_FALLBACK \
+            if AFFINITY_FALLBACK else None
+        if max_jobs is None:
+            new_job = self._storage.get_job(LEASE, affinities, stale_before)
+            amount = int(bool(new_job))
+        else:
+            new_job = self._storage.get_jobs(max_jobs, LEASE, affinities,
+                                             stale_before)
+            amount = len(new_job)
+        count_transition('in_progress', amount, 'new')
+        if state is not None:
+            drained = amount < (max_jobs or 1) and \
+                state.drained(self._storage.has_new_jobs)
+            state.claimed(amount, drained, mark)
+        return new_job
+
+    def claim_jobs(self, max_jobs, wait, affinities):
+        """Claim jobs, waiting for submissions if queue is empty.
+
+        Queue is checked again when job is submitted to this server and
+        every `LONG_POLL_RECHECK` seconds for jobs submitted through
+        other servers.
+
+        :Parameters:
+            - `max_jobs`: max amount of jobs to claim or None
+                          to claim single job.
+            - `wait`: seconds to wait for new jobs.
+            - `affinities`: list of hosts and labels of worker.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to get jobs.
+
+        :Returns:
+            (jobs, retry) tuple, where jobs are
+            1) list of jobs if `max_jobs` is set.
+            2) job dictionary otherwise, empty if no jobs.
+            and retry is seconds client should wait before next claim if
+            it could not wait for jobs, otherwise None.
+        """
+        notifier = self.server.job_notifier
+        state = self.server.queue_state
+        deadline = time.monotonic() + wait
+        while True:
+            version = notifier.version
+            if state is not None and state.empty():
+                CACHED_CLAIMS.inc()
+                new_job = {} if max_jobs is None else []
+            else:
+                new_job = self.get_jobs(max_jobs, affinities)
+            remaining = deadline - time.monotonic()
+            if new_job or remaining <= 0:
+                return new_job, None
+            if notifier.wait(version,
+                             min(remaining, LONG_POLL_RECHECK)) is None:
+                # Too many waiting requests, client claims again soon
+                # instead of waiting for its polling timeout.
+                return new_job, LONG_POLL_RETRY
 
     def do_GET(self):
         """Handle GET command."""
-        if self.path == 'get_job':
+        url = urlsplit(self.path)
+        if url.path == 'get_job':
             # Get job for client.
+            query = parse_qs(url.query)
+            try:
+                max_jobs = int(query['max'][0]) if 'max' in query else None
+                wait = float(query['wait'][0]) if 'wait' in query else 0
+            except ValueError:
+                self.send_error(400, 'Bad request')
+                return
             try:
-                new_job = self._mysql_client.get_job()
-                if new_job:
-                    self.response(200, 'Get job')
-                else:
-                    self.response(200, 'No Available jobs')
+                affinities = parse_affinities(query, self.client_address[0])
+            except ValueError as error:
+                self.send_error(400, str(error))
+                return
+            if max_jobs is not None and not 1 <= max_jobs <= MAX_CLAIM:
+                self.send_error(400, f'max must be in 1..{MAX_CLAIM}')
+                return
+            wait = min(max(wait, 0), self.max_wait)
+            try:
+                new_job, retry = self.claim_jobs(max_jobs, wait, affinities)
                 # Send job info to client.
-                self.wfile.write(json.dumps(new_job).encode())
-            except MySqlException:
+                self.response(200, 'Get job' if new_job
+                              else 'No Available jobs',
+                              json.dumps(new_job).encode(),
+                              headers=() if retry is None
+                              else (('Retry-After', f'{retry:g}'), ))
+            except StorageException:
                 self.send_error(404, "Failed to GET job")
+        elif url.path == 'metrics':
+            self.response(200, 'Metrics', REGISTRY.render().encode(),
+                          METRICS_TYPE)
         else:
             self.send_error(404, 'Not found')
 
+    def read_chunks(self):
+        """Read request body by chunks.
+
+        Supports both `Content-Length` and chunked transfer encoding.
+
+        :Returns:
+            generator of body chunks.
+        """
+        encoding = self.headers.get('Transfer-Encoding', '')
+        if encoding.lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if not size:
+                    # Skip trailers.
+                    while self.rfile.readline().strip():
+                        pass
+                    return
+                yield self.rfile.read(size)
+                self.rfile.readline()
+        else:
+            content_len = int(self.headers.get('Content-Length') or 0)
+            while content_len > 0:
+                chunk = self.rfile.read(min(content_len, READ_CHUNK))
+                if not chunk:
+                    return
+                content_len -= len(chunk)
+                yield chunk
+
+    def read_lines(self):
+        """Read request body by not empty lines.
+
+        :Returns:
+            generator of lines.
+        """
+        tail = b''
+        for chunk in self.read_chunks():
+            lines = (tail + chunk).split(b'\n')
+            tail = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield line
+        if tail.strip():
+            yield tail
+
+    def create_jobs(self, jobs):
+        """Create jobs directly or through submit buffer.
+
+        :Parameters:
+            - `jobs`: list of job dictionaries from `parse_job`.
+
+        :Exceptions:
+            - `StorageException`: is raised if failed to create jobs.
+        """
+        if self.server.submit_buffer is not None:
+            self.server.submit_buffer.submit(jobs)
+            return
+        if len(jobs) == 1:
+            self._storage.create_job(jobs[0])
+        else:
+            self._storage.create_jobs(jobs)
+        jobs_created(self.server, len(jobs))
+
+    def post_tasks(self, items):
+        """Create many tasks in one transaction.
+
+        Invalid items are skipped and reported in response body. for e.g.:
+        {'created': 2, 'errors': [{'index': 1, 'error': 'Bad job'}]}
+
+        :Parameters:
+            - `items`: iterable of job dictionaries or json lines.
+        """
+        host = self.client_address[0]
+        jobs = []
+        errors = []
+        for index, item in enumerate(items):
+            if index >= MAX_SUBMIT:
+                self.send_error(413, f'More than {MAX_SUBMIT} jobs')
+                return
+            try:
+                if isinstance(item, bytes):
+                    item = json.loads(item)
+                jobs.append(parse_job(item, host))
+            except ValueError as error:
+                errors.append({'index': index, 'error': str(error)})
+        try:
+            if jobs:
+                self.create_jobs(jobs)
+        except StorageException:
+            self.send_error(404, 'Failed to POST jobs')
+            return
+        if errors:
+            logger.error('Rejected %d of submitted jobs', len(errors))
+        self.response(201 if jobs else 400, 'POST tasks',
+                      json.dumps({'created': len(jobs),
+                                  'errors': errors}).encode())
+
     def do_POST(self):
         """Handle POST command."""
         if self.path == 'task':
-            # Create new task.
-            content_len = int(self.headers.get('Content-Length'))
-            post_body = self.rfile.read(content_len)
+            # Create new task or list of tasks.
+            content_type = self.headers.get('Content-Type', '')
+            if content_type.startswith(NDJSON):
+                self.post_tasks(self.read_lines())
+                return
+            post_body = b''.join(self.read_chunks())
             try:
                 job_info = json.loads(post_body)
-                host = self.client_address[0]
-                job_info['client_host'] = host
-                self._mysql_client.create_job(job_info)
-                self.response(201, 'POST task')
+                if isinstance(job_info, list):
+                    self.post_tasks(job_info)
+                    return
+                job_info = parse_job(job_info, self.client_address[0])
+                self.create_jobs([job_info])
                 # Send file content to client.
-                self.wfile.write(post_body)
-            except MySqlException:
+                self.response(201, 'POST task', post_body)
+            except StorageException:
                 self.send_error(404, 'Failed to POST job')
             except ValueError as error:
-                logger.error(f"Error when loading json {post_body}:\n{error}")
+                logger.error('Error when loading json %s:\n%s', post_body,
+                             error)
                 self.send_error(400, 'Bad request')
         else:
             self.send_error(404, 'Not found')
         return
 
+    def count_results(self, results):
+        """Update job metrics with finished jobs.
+
+        :Parameters:
+            - `results`: list of (job_info, result_info) pairs.
+        """
+        count_transition('finished', len(results), 'in_progress')
+        now = int(time.time())
+        for job_info, _ in results:
+            JOB_RUN_SECONDS.observe(now - job_info['stime'],
+                                    job_info.get('job_type', 'unknown'))
+
     def do_PUT(self):
         """Handle PUT command."""
         if self.path == 'job_result':
-            # Update task
-            content_len = int(self.headers.get('Content-Length'))
-            put_body = self.rfile.read(content_len)
-            job_info, result_info = json.loads(put_body)
-            job_info['status'] = 'finished'
+            # Update task or list of tasks. Response tells ids of jobs
+            # whose results were dropped. for e.g.:
+            # {'finished': 2, 'dropped': [3]}
+            put_body = b''.join(self.read_chunks())
+            try:
+                results = parse_results(json.loads(put_body))
+            except ValueError as error:
+                logger.error('Error when loading json %s:\n%s', put_body,
+                             error)
+                self.send_error(400, 'Bad request')
+                return
             try:
-                self._mysql_client.update_job(job_info, result_info)
-                self.response(200, 'Task updated')
-            except MySqlException as error:
-                logger.error(f'MySqlError: {error}')
-                self.send_error(404, 'Failed to update task')
+                finished = set(self._storage.update_jobs(results))
+            except StorageException as error:
+                # Clients drop results answered with 4xx and retry 5xx.
+                logger.error('StorageError: %s', error)
+                self.send_error(503, 'Failed to update task')
+                return
+            # Jobs not held by reporting claim are not finished by it.
+            dropped = [job_info['id'] for job_info, _ in results
+                       if job_info['id'] not in finished]
+            self.response(200, 'Task updated',
+                          json.dumps({'finished': len(finished),
+                                      'dropped': dropped}).encode())
+            held = {job_info['id']: (job_info, result_info)
+                    for job_info, result_info in results
+                    if job_info['id'] in finished}
+            self.count_results(list(held.values()))
+        elif self.path == 'heartbeat':
+            self.put_heartbeat()
         else:
             self.send_error(404, 'Not found')
 
+    def put_heartbeat(self):
+        """Extend leases of jobs in progress.
+
+        Request body is json list of job ids. Response has new lease
+        expiry and ids of jobs that are not held by worker anymore,
+        for e.g.: {'lease_expiry': 1553208111, 'lost': [3]}
+        """
+        put_body = b''.join(self.read_chunks())
+        try:
+            ids = json.loads(put_body)
+            if not isinstance(ids, list) or \
+                    not all(isinstance(job_id, int) for job_id in ids):
+                raise ValueError('Job ids must be a list of integers')
+        except ValueError as error:
+            logger.error('Error when loading heartbeat %s: %s', put_body,
+                         error)
+            self.send_error(400, 'Bad request')
+            return
+        try:
+            lease_expiry = int(time.time()) + LEASE
+            extended = set(self._storage.extend_leases(ids, LEASE))
+        except StorageException as error:
+            logger.error('StorageError: %s', error)
+            self.send_error(404, 'Failed to extend leases')
+            return
+        lost = [job_id for job_id in ids if job_id not in extended]
+        if lost:
+            logger.warning('Heartbeat of lost jobs %s', lost)
+        self.response(200, 'Leases extended',
+                      json.dumps({'lease_expiry': lease_expiry,
+                                  'lost': lost}).encode())
+
+
+class SingleTaskHandler(TaskHandler):
+
+    """Handler of single mode, closes connection after every response.
+
+    Server of single mode reads next request only when connection is
+    closed, so keep-alive client or long poll would block all others.
+    """
+
+    protocol_version = 'HTTP/1.0'
+    max_wait = 0
+
+
+def seed_job_metrics(storage):
+    """Set jobs by status gauge from storage.
+
+    :Parameters:
+        - `storage`: Storage instance.
+    """
+    try:
+        for status, amount in storage.count_jobs().items():
+            JOBS.set(amount, status)
+    except StorageException as error:
+        logger.error('Failed to count jobs: %s', error)
+
+
+def create_server(storage):
+    """Create HTTP server for configured concurrency model.
+
+    :Parameters:
+        - `storage`: Storage instance used by all handlers.
+
+    :Exceptions:
+        - `ValueError`: is raised if mode is unknown.
+
+    :Returns:
+        HTTP server instance.
+    """
+    if MODE == 'single':
+        httpd = HTTPServer((HOST, PORT), SingleTaskHandler)
+    elif MODE == 'threaded':
+        httpd = ThreadPoolHTTPServer((HOST, PORT), TaskHandler, WORKERS)
+    elif MODE == 'asyncio':
+        httpd = AsyncHTTPServer((HOST, PORT), TaskHandler, WORKERS)
+    else:
+        raise ValueError(f'Unknown server mode: {MODE}')
+    httpd.storage = storage
+    seed_job_metrics(storage)
+    httpd.job_notifier = JobNotifier(LONG_POLL_WAITERS)
+    httpd.queue_state = None
+    if QUEUE_STATE:
+        httpd.queue_state = QueueState(storage, logger, QUEUE_STATE_SHARED,
+                                       QUEUE_STATE_TTL, QUEUE_STATE_INTERVAL)
+    httpd.archiver = None
+    if ARCHIVE:
+        httpd.archiver = Archiver(
+            storage, logger, ARCHIVE_RETENTION_DAYS, ARCHIVE_BATCH,
+            ARCHIVE_PAUSE, ARCHIVE_KEEP_MONTHS,
+            on_archive=lambda status, amount: JOBS.inc(status,
+                                                       amount=-amount))
+        httpd.archiver.start(ARCHIVE_INTERVAL)
+    httpd.reaper = Reaper(
+        storage, logger, MAX_ATTEMPTS, REAPER_BATCH, REAPER_INTERVAL,
+        on_reap=lambda requeued, dead: jobs_reaped(httpd, requeued, dead))
+    httpd.submit_buffer = None
+    if SUBMIT_MODE != 'direct':
+        httpd.submit_buffer = SubmitBuffer(
+            storage, logger, SUBMIT_MODE, SUBMIT_MAX_JOBS, SUBMIT_INTERVAL,
+            on_flush=lambda amount: jobs_created(httpd, amount))
+    return httpd
+
 
 def run():
-    with HTTPServer((HOST, PORT), TaskHandler) as httpd:
-        print("serving at port", PORT)
-        logger.info('Started server')
-        httpd.serve_forever()
+    storage = create_storage(config, logger)
+    try:
+        # Leaving context waits for in-flight requests.
+        with create_server(storage) as httpd:
+
+            def stop(signum, frame):
+                # shutdown() waits for serve_forever(), so it can not be
+                # called from main thread.
+                logger.info('Stopping server on signal %s', signum)
+                threading.Thread(target=httpd.shutdown).start()
+
+            signal.signal(signal.SIGINT, stop)
+            signal.signal(signal.SIGTERM, stop)
+            print("serving at port", PORT)
+            logger.info('Started %s server with %d workers', MODE, WORKERS)
+            httpd.serve_forever()
+        if httpd.submit_buffer is not None:
+            httpd.submit_buffer.close()
+        if httpd.queue_state is not None:
+            httpd.queue_state.close()
+        if httpd.archiver is not None:
+            httpd.archiver.close()
+        httpd.reaper.close()
+    finally:
+        storage.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,648 @@
+#!/usr/bin/env python3.7
+
+"""This module keeps job queue in embedded SQLite database."""
+
+import functools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import Future
+
+from constants import DEFAULT_PRIORITY, LEASE, SQLITE_BATCH, \
+    SQLITE_BUSY_TIMEOUT, SQLITE_PATH
+from scheduler import create_scheduler
+from statements import in_list, insert_statement, update_statement
+from storage import CLAIM_COLUMNS, HISTORY_JOB_COLUMNS, \
+    HISTORY_RESULT_COLUMNS, HISTORY_TABLE, Storage, StorageException, \
+    held_results, history_month, history_tables, measured
+from tools.migrate import MIGRATIONS_DIR, load_migrations
+
+SQLITE_MIGRATIONS_DIR = os.path.join(MIGRATIONS_DIR, 'sqlite')
+
+
+class SqliteException(StorageException):
+    """Base SqliteClient Exception Error class."""
+    pass
+
+
+class SqliteClient(Storage):
+
+    """Class that keeps job queue in SQLite database in WAL mode.
+
+    All transactions are run by single writer thread. Transactions queued
+    while previous commit was in progress are committed together, so
+    under load one fsync is shared by many requests. Each transaction
+    runs in its own savepoint, so failed one does not affect others.
+    """
+
+    def __init__(self, config, logger):
+        """Open database and start writer thread.
+
+        :Parameters:
+            - `config`: configparser instance.
+            - `logger': logging.logger instance.
+        """
+        self.config = config
+        self.logger = logger
+        self.__path = self.config.get('sqlite', 'path', fallback=SQLITE_PATH)
+        # NORMAL loses no data on process crash in WAL mode,
+        # FULL survives power loss as well.
+        self.__synchronous = self.config.get('sqlite', 'synchronous',
+                                             fallback='NORMAL')
+        self.__batch_size = self.config.getint('sqlite', 'batch_size',
+                                               fallback=SQLITE_BATCH)
+        # Order of claims, None claims oldest jobs first.
+        self.scheduler = create_scheduler(config)
+        self.__cnx = self.__connect()
+        self.__migrate()
+        # Queued transactions as (func, args, kwargs, future) tuples.
+        self.__queue = queue.Queue()
+        # Counters.
+        self.transactions = 0
+        self.commits = 0
+        self.__writer = threading.Thread(target=self.__write,
+                                         name='sqlite-writer', daemon=True)
+        self.__writer.start()
+
+    def __connect(self):
+        """Open database connection used by writer thread."""
+        cnx = sqlite3.connect(self.__path, timeout=SQLITE_BUSY_TIMEOUT,
+                              isolation_level=None, check_same_thread=False)
+        cnx.execute('PRAGMA journal_mode = WAL')
+        cnx.execute(f'PRAGMA synchronous = {self.__synchronous}')
+        cnx.execute('PRAGMA foreign_keys = ON')
+        return cnx
+
+    def __migrate(self):
+        """Apply not applied migrations of SQLite schema."""
+        cursor = self.__cnx.cursor()
+        cursor.execute('CREATE TABLE IF NOT EXISTS schema_migrations('
+                       'version INTEGER PRIMARY KEY, '
+                       'name VARCHAR(100) NOT NULL, '
+                       'applied_at INTEGER NOT NULL)')
+        cursor.execute('SELECT version FROM schema_migrations')
+        done = {row[0] for row in cursor.fetchall()}
+        for version, name, statements in \
+                load_migrations(SQLITE_MIGRATIONS_DIR):
+            if version in done:
+                continue
+            self.logger.info('Applying SQLite migration %s_%s', version, name)
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute('INSERT INTO schema_migrations '
+                               '(version, name, applied_at) VALUES (?, ?, ?)',
+                               (version, name, int(time.time())))
+            except sqlite3.Error:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+
+    def with_transaction(func):
+        """Transaction decorator.
+
+        Queues decorated method to writer thread and waits until its
+        batch is committed.
+        """
+        @functools.wraps(func)
+        @measured('sqlite', func.__name__)
+        def wrapper(self, *args, **kwargs):
+            if not self.__writer.is_alive():
+                raise SqliteException('SQLite storage is closed')
+            future = Future()
+            self.logger.debug('Calling func %s', func.__name__)
+            self.__queue.put((func, args, kwargs, future))
+            return future.result()
+        return wrapper
+
+    def __write(self):
+        """Run queued transactions in batches until storage is closed."""
+        stop = False
+        while not stop:
+            batch = []
+            item = self.__queue.get()
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.__batch_size:
+                    break
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self.__commit(batch)
+
+    def __commit(self, batch):
+        """Run transactions in savepoints and commit them at once.
+
+        :Parameters:
+            - `batch`: list of (func, args, kwargs, future) tuples.
+        """
+        cursor = self.__cnx.cursor()
+        done = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for func, args, kwargs, future in batch:
+                cursor.execute('SAVEPOINT job')
+                try:
+                    result = func(self, cursor, *args, **kwargs)
+                except Exception as error:
+                    self.logger.error(error)
+                    self.logger.info("Rollbacking changes")
+                    cursor.execute('ROLLBACK TO job')
+                    cursor.execute('RELEASE job')
+                    future.set_exception(SqliteException(error))
+                    continue
+                cursor.execute('RELEASE job')
+                done.append((future, result))
+            cursor.execute('COMMIT')
+        except sqlite3.Error as error:
+            self.logger.error('Error occured when committing '
+                              '%d transactions: %s', len(batch), error)
+            if self.__cnx.in_transaction:
+                self.__cnx.rollback()
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(SqliteException(error))
+            return
+        self.transactions += len(batch)
+        self.commits += 1
+        self.logger.debug('Committed %d transactions', len(batch))
+        for future, result in done:
+            future.set_result(result)
+
+    def insert_rows(self, cursor, table, columns, rows):
+        """Insert many rows with one prepared statement.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `table`: a string with table name.
+            - `columns`: tuple of column names.
+            - `rows`: list of tuples with values of `columns`.
+        """
+        sql_query = insert_statement(table, columns, '?')
+        self.logger.debug('Executing query for %d rows: %s', len(rows),
+                          sql_query)
+        cursor.executemany(sql_query, rows)
+
+    @with_transaction
+    def create_job(self, cursor, job_info):
+        """Create new job.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `job_info`: dictionary with job type and job argument. for e.g.:
+                           {'job_type': 'create', 'job_arg': '/tmp/text.txt'}
+        """
+        now = int(time.time())
+        job_info['ctime'] = now
+        job_info['mtime'] = now
+        self.insert_rows(cursor, 'job_queue', tuple(job_info),
+                         [tuple(job_info.values())])
+
+    @with_transaction
+    def create_jobs(self, cursor, jobs):
+        """Create many jobs in one transaction.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `jobs`: list of dictionaries with client host, job type and
+                      job argument.
+        """
+        now = int(time.time())
+        columns = ('client_host', 'job_type', 'job_arg', 'priority',
+                   'affinity', 'ctime', 'mtime')
+        rows = [(job['client_host'], job['job_type'], job['job_arg'],
+                 job.get('priority', DEFAULT_PRIORITY),
+                 job.get('affinity', ''), now, now)
+                for job in jobs]
+        self.logger.debug('Create %d jobs', len(rows))
+        self.insert_rows(cursor, 'job_queue', columns, rows)
+
+    @with_transaction
+    def update_job(self, cursor, job_info, result_info=None):
+        """Update job.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `job_info: dictionary with job_info to update. for e.g.:
+                         {'id': 1, 'status': 'finished'}
+            - `result_info`: dictionary with job result info.
+                            by default None.
+        """
+        not_update = ('id',)
+        job_id = job_info['id']
+        job_info['mtime'] = int(time.time())
+        columns = tuple(column for column in job_info
+                        if column not in not_update)
+        sql_query = update_statement('job_queue', columns, 'id', '?')
+        self.logger.debug('Update job with id %s status to %s', job_id,
+                          job_info)
+        cursor.execute(sql_query,
+                       (*(job_info[column] for column in columns), job_id))
+        if result_info:
+            result_info['job_id'] = job_info['id']
+            result_info['run_time'] = int(time.time()) - job_info['stime']
+            self.insert_rows(cursor, 'job_result', tuple(result_info),
+                             [tuple(result_info.values())])
+
+    @with_transaction
+    def update_jobs(self, cursor, results):
+        """Finish many jobs and save their results in one transaction.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `results`: list of (job_info, result_info) pairs.
+
+        :Returns:
+            list of ids of finished jobs, see `Storage.update_jobs`.
+        """
+        if not results:
+            return []
+        ids = list(dict.fromkeys(job_info['id'] for job_info, _ in results))
+        cursor.execute(f"SELECT id, stime, attempts FROM job_queue "
+                       f"WHERE id IN {in_list(len(ids), '?')} "
+                       f"AND status = 'in_progress'", ids)
+        claims = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        results, dropped = held_results(results, claims)
+        if dropped:
+            self.logger.warning('Dropped results of jobs not held by '
+                                'reporting claim: %s', dropped)
+        if not results:
+            return []
+        now = int(time.time())
+        ids = [job_info['id'] for job_info, _ in results]
+        sql_query = (f"UPDATE job_queue SET status = 'finished', mtime = ? "
+                     f"WHERE id IN {in_list(len(ids), '?')}")
+        self.logger.debug('Finish %d jobs', len(ids))
+        cursor.execute(sql_query, (now, *ids))
+        rows = [(job_info['id'], result_info['result'],
+                 str(result_info['result_info'])[:255],
+                 now - job_info['stime'])
+                for job_info, result_info in results]
+        columns = ('job_id', 'result', 'result_info', 'run_time')
+        self.insert_rows(cursor, 'job_result', columns, rows)
+        return ids
+
+    @with_transaction
+    def get_jobs(self, cursor, limit=1, lease=LEASE, affinities=(),
+                 stale_before=None):
+        """Claim new jobs to process them.
+
+        Writer thread runs claims one by one, so no locking of selected
+        rows is needed.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `limit`: max amount of jobs to claim. by default 1.
+            - `lease`: seconds jobs are held. by default `LEASE`.
+            - `affinities`: hosts and labels of worker. by default none.
+            - `stale_before`: timestamp, pinned jobs created before it
+                              go to any worker, oldest first. by
+                              default never.
+
+        :Returns:
+            List of dictionaries with job information. for e.g.:
+            [{'id': 1, 'client_host: 'localhost',
+              'job_type': 'create', 'job_arg': 'test.txt', 'priority': 0,
+              'affinity': 'localhost', 'attempts': 1,
+              'status': 'in_progress', 'stime': 1553207811,
+              'lease_expiry': 1553208111}]
+        """
+        jobs = []
+        for affinity in dict.fromkeys((*affinities, '')):
+            jobs.extend(self.claim_affinity(cursor, limit - len(jobs), lease,
+                                            affinity))
+            if len(jobs) >= limit:
+                break
+        if len(jobs) < limit and stale_before is not None:
+            # Stale jobs bypass scheduler and go oldest first: their
+            # bands would need a scan of all pinned jobs. Jobs without
+            # affinity are claimed already, so scan of `idx_status_ctime`
+            # from oldest job meets stale ones only.
+            jobs.extend(self.claim_jobs(
+                cursor, limit - len(jobs), lease,
+                "AND affinity <> '' AND ctime < ?", (stale_before, )))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('Get new tasks: %s', jobs)
+        return jobs
+
+    def claim_affinity(self, cursor, limit, lease, affinity):
+        """Claim new jobs of one affinity.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `limit`: max amount of jobs to claim.
+            - `lease`: seconds jobs are held.
+            - `affinity`: host or label of jobs, empty for any worker.
+
+        :Returns:
+            list of claimed jobs like in `get_jobs`.
+        """
+        if self.scheduler is None:
+            # Range scan of `idx_status_affinity_ctime` index.
+            return self.claim_jobs(cursor, limit, lease,
+                                   'AND affinity = ?', (affinity, ))
+        return self.scheduler.claim(
+            limit,
+            lambda band: self.top_band(cursor, affinity, band),
+            lambda band: self.band_hosts(cursor, affinity, band),
+            lambda band, host, amount: self.claim_jobs(
+                cursor, amount, lease,
+                'AND affinity = ? AND priority = ? AND client_host = ?',
+                (affinity, band, host)),
+            affinity)
+
+    def top_band(self, cursor, affinity, below=None):
+        """Get highest priority of new jobs.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `affinity`: host or label of jobs.
+            - `below`: only priorities lower than it are checked.
+                       by default all.
+
+        :Returns:
+            priority or None if there are no new jobs.
+        """
+        # Backward seek of `idx_status_affinity_priority_host` index.
+        if below is None:
+            cursor.execute("SELECT priority FROM job_queue "
+                           "WHERE status = 'new' AND affinity = ? "
+                           "ORDER BY priority DESC LIMIT 1", (affinity, ))
+        else:
+            cursor.execute("SELECT priority FROM job_queue "
+                           "WHERE status = 'new' AND affinity = ? "
+                           "AND priority < ? "
+                           "ORDER BY priority DESC LIMIT 1",
+                           (affinity, below))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def band_hosts(self, cursor, affinity, band):
+        """Get hosts with new jobs of priority.
+
+        SQLite has no loose index scan, so hosts are walked by seeks of
+        next host in `idx_status_affinity_priority_host` index.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `affinity`: host or label of jobs.
+            - `band`: priority of jobs.
+
+        :Returns:
+            list of hosts.
+        """
+        cursor.execute("WITH RECURSIVE hosts(client_host) AS ("
+                       "SELECT MIN(client_host) FROM job_queue "
+                       "WHERE status = 'new' AND affinity = :affinity "
+                       "AND priority = :band "
+                       "UNION ALL "
+                       "SELECT (SELECT MIN(client_host) FROM job_queue "
+                       "WHERE status = 'new' AND affinity = :affinity "
+                       "AND priority = :band "
+                       "AND client_host > hosts.client_host) "
+                       "FROM hosts WHERE client_host IS NOT NULL) "
+                       "SELECT client_host FROM hosts "
+                       "WHERE client_host IS NOT NULL",
+                       {'affinity': affinity, 'band': band})
+        return [row[0] for row in cursor.fetchall()]
+
+    def claim_jobs(self, cursor, limit, lease, condition='', params=()):
+        """Claim oldest new jobs matching condition.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `limit`: max amount of jobs to claim.
+            - `lease`: seconds jobs are held.
+            - `condition`: a string with SQL condition added to
+                           `status = 'new'`. by default any job.
+            - `params`: tuple with values of condition placeholders.
+
+        :Returns:
+            list of claimed jobs like in `get_jobs`.
+        """
+        select_expression = ','.join(CLAIM_COLUMNS)
+        sql_query = (f"SELECT {select_expression} FROM job_queue "
+                     f"WHERE status = 'new' {condition} "
+                     f"ORDER BY ctime LIMIT ?")
+        cursor.execute(sql_query, (*params, limit))
+        jobs = [dict(zip(CLAIM_COLUMNS, row)) for row in cursor.fetchall()]
+        if not jobs:
+            return jobs
+        now = int(time.time())
+        ids = [job['id'] for job in jobs]
+        sql_query = (f"UPDATE job_queue "
+                     f"SET status = 'in_progress', stime = ?, mtime = ?, "
+                     f"lease_expiry = ?, attempts = attempts + 1 "
+                     f"WHERE id IN {in_list(len(ids), '?')}")
+        cursor.execute(sql_query, (now, now, now + lease, *ids))
+        for job in jobs:
+            job['status'] = 'in_progress'
+            job['stime'] = now
+            job['lease_expiry'] = now + lease
+            job['attempts'] += 1
+        return jobs
+
+    @with_transaction
+    def has_new_jobs(self, cursor):
+        """Check if queue has new jobs of any affinity.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+
+        :Returns:
+            True if there are jobs with status 'new'.
+        """
+        cursor.execute("SELECT 1 FROM job_queue WHERE status = 'new' LIMIT 1")
+        return cursor.fetchone() is not None
+
+    @with_transaction
+    def extend_leases(self, cursor, ids, lease=LEASE):
+        """Extend leases of jobs still in progress.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `ids`: list of job ids.
+            - `lease`: seconds jobs are held from now. by default `LEASE`.
+
+        :Returns:
+            list of ids of extended jobs.
+        """
+        if not ids:
+            return []
+        cursor.execute(f"SELECT id FROM job_queue "
+                       f"WHERE id IN {in_list(len(ids), '?')} "
+                       f"AND status = 'in_progress'", ids)
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids:
+            sql_query = (f"UPDATE job_queue SET lease_expiry = ? "
+                         f"WHERE id IN {in_list(len(ids), '?')}")
+            cursor.execute(sql_query, (int(time.time()) + lease, *ids))
+        return ids
+
+    @with_transaction
+    def requeue_expired(self, cursor, now, limit, max_attempts):
+        """Return jobs with expired leases to queue.
+
+        Runs over `idx_status_lease` index.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `now`: current timestamp.
+            - `limit`: max amount of jobs handled in one transaction.
+            - `max_attempts`: max amount of claims of job.
+
+        :Returns:
+            (amount of requeued jobs, amount of dead jobs) tuple.
+        """
+        cursor.execute("SELECT id, attempts FROM job_queue "
+                       "WHERE status = 'in_progress' AND lease_expiry < ? "
+                       "ORDER BY lease_expiry LIMIT ?", (now, limit))
+        expired = cursor.fetchall()
+        requeued = [job_id for job_id, attempts in expired
+                    if attempts < max_attempts]
+        dead = [job_id for job_id, attempts in expired
+                if attempts >= max_attempts]
+        for status, ids in (('new', requeued), ('dead', dead)):
+            if ids:
+                cursor.execute(f"UPDATE job_queue "
+                               f"SET status = ?, lease_expiry = NULL, "
+                               f"mtime = ? "
+                               f"WHERE id IN {in_list(len(ids), '?')}",
+                               (status, now, *ids))
+        if expired:
+            self.logger.debug('Requeued jobs %s, dead jobs %s', requeued,
+                              dead)
+        return len(requeued), len(dead)
+
+    def create_history(self, cursor, month):
+        """Create history tables of month with schema of templates.
+
+        :Parameters:
+            - `cursor`: connection cursor object.
+            - `month`: YYYYMM integer.
+        """
+        for template, table in zip(('job_queue_history', 'job_result_history'),
+                                   history_tables(month)):
+            cursor.execute("SELECT sql FROM sqlite_master "
+                           "WHERE type = 'table' AND name = ?", (template, ))
+            # Stored statement starts with `CREATE TABLE <template>`.
+            sql_query = cursor.fetchone()[0].replace(
+                template, f'IF NOT EXISTS {table}', 1)
+            cursor.execute(sql_query)
+        _, results_table = history_tables(month)
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{results_table} '
+                       f'ON {results_table} (job_id)')
+
+    @with_transaction
+    def archive_jobs(self, cursor, before, limit, status='finished'):
+        """Move jobs of terminal status with results to history tables.
+
+        Runs in writer thread, so `limit` bounds time claims wait.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `before`: timestamp, jobs modified before it are moved.
+            - `limit`: max amount of jobs moved in one transaction.
+            - `status`: one of `ARCHIVED_STATUSES`. by default 'finished'.
+
+        :Returns:
+            amount of moved jobs.
+        """
+        cursor.execute("SELECT id, ctime FROM job_queue "
+                       "WHERE status = ? AND mtime < ? "
+                       "ORDER BY mtime LIMIT ?", (status, before, limit))
+        months = {}
+        for job_id, ctime in cursor.fetchall():
+            months.setdefault(history_month(ctime), []).append(job_id)
+        jobs_columns = ','.join(HISTORY_JOB_COLUMNS)
+        results_columns = ','.join(HISTORY_RESULT_COLUMNS)
+        moved = 0
+        for month, ids in months.items():
+            self.create_history(cursor, month)
+            jobs_table, results_table = history_tables(month)
+            id_list = in_list(len(ids), '?')
+            cursor.execute(f'INSERT INTO {jobs_table} ({jobs_columns}) '
+                           f'SELECT {jobs_columns} FROM job_queue '
+                           f'WHERE id IN {id_list}', ids)
+            cursor.execute(f'INSERT INTO {results_table} ({results_columns}) '
+                           f'SELECT {results_columns} FROM job_result '
+                           f'WHERE job_id IN {id_list}', ids)
+            cursor.execute(f'DELETE FROM job_result WHERE job_id IN {id_list}',
+                           ids)
+            cursor.execute(f'DELETE FROM job_queue WHERE id IN {id_list}', ids)
+            moved += len(ids)
+        self.logger.debug('Archived %d jobs', moved)
+        return moved
+
+    @with_transaction
+    def history_months(self, cursor):
+        """Get months of existing history tables.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+
+        :Returns:
+            sorted list of months as YYYYMM integers.
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                       "AND name LIKE 'job_queue_history_%'")
+        return sorted(int(match.group(1)) for match in
+                      (HISTORY_TABLE.match(row[0])
+                       for row in cursor.fetchall()) if match)
+
+    @with_transaction
+    def drop_history(self, cursor, month):
+        """Drop history tables of month.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+            - `month`: YYYYMM integer.
+        """
+        jobs_table, results_table = history_tables(month)
+        self.logger.info('Dropping history tables %s and %s', jobs_table,
+                         results_table)
+        cursor.execute(f'DROP TABLE IF EXISTS {results_table}')
+        cursor.execute(f'DROP TABLE IF EXISTS {jobs_table}')
+
+    @with_transaction
+    def count_jobs(self, cursor):
+        """Count jobs by status.
+
+        :Parameters:
+            - `cursor`: connection cursor object. It comes from decorator.
+
+        :Returns:
+            dictionary with amount of jobs by status. for e.g.:
+            {'new': 10, 'in_progress': 2, 'finished': 100}
+        """
+        cursor.execute('SELECT status, COUNT(*) FROM job_queue '
+                       'GROUP BY status')
+        return dict(cursor.fetchall())
+
+    def stats(self):
+        """Get writer counters.
+
+        :Returns:
+            a dictionary with amount of transactions and commits.
+        """
+        return {'transactions': self.transactions,
+                'commits': self.commits,
+                'queued': self.__queue.qsize()}
+
+    def close(self):
+        """Commit queued transactions, stop writer and close database."""
+        if self.__writer.is_alive():
+            self.__queue.put(None)
+            self.__writer.join()
+        self.logger.info('SQLite storage stats: %s', self.stats())
+        self.__cnx.close()
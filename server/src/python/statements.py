@@ -0,0 +1,81 @@
+#!/usr/bin/env python3.7
+
+"""Builders of parameterized sql statements.
+
+Statements are cached by table and column set, so every call with the
+same shape reuses the same sql text and values are always passed to
+driver separately. Placeholders default to `%s` of pymysql, SQLite
+driver expects `?`.
+"""
+
+import functools
+import re
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def check_identifiers(*names):
+    """Check that table and column names are safe to put into sql.
+
+    :Parameters:
+        - `names`: strings with table or column names.
+
+    :Exceptions:
+        - `ValueError`: is raised if name is not valid identifier.
+    """
+    for name in names:
+        if not IDENTIFIER.match(name):
+            raise ValueError(f'Invalid sql identifier: {name!r}')
+
+
+@functools.lru_cache(maxsize=256)
+def insert_statement(table, columns, placeholder='%s'):
+    """Build INSERT statement.
+
+    :Parameters:
+        - `table`: a string with table name.
+        - `columns`: tuple of column names.
+        - `placeholder`: a string with driver placeholder. by default '%s'.
+
+    :Returns:
+        a string with statement. for e.g.:
+        'INSERT INTO job_result (job_id,result) VALUES (%s,%s)'
+    """
+    check_identifiers(table, *columns)
+    return (f"INSERT INTO {table} ({','.join(columns)}) "
+            f"VALUES ({','.join([placeholder] * len(columns))})")
+
+
+@functools.lru_cache(maxsize=256)
+def update_statement(table, columns, key='id', placeholder='%s'):
+    """Build UPDATE statement of one row.
+
+    :Parameters:
+        - `table`: a string with table name.
+        - `columns`: tuple of updated column names.
+        - `key`: a string with column name of row key. by default 'id'.
+        - `placeholder`: a string with driver placeholder. by default '%s'.
+
+    :Returns:
+        a string with statement, values of `columns` and `key` follow
+        in parameters. for e.g.:
+        'UPDATE job_queue SET status = %s WHERE id = %s'
+    """
+    check_identifiers(table, key, *columns)
+    set_expression = ', '.join(f'{column} = {placeholder}'
+                               for column in columns)
+    return f"UPDATE {table} SET {set_expression} WHERE {key} = {placeholder}"
+
+
+@functools.lru_cache(maxsize=256)
+def in_list(size, placeholder='%s'):
+    """Build placeholders of IN list.
+
+    :Parameters:
+        - `size`: amount of values in list.
+        - `placeholder`: a string with driver placeholder. by default '%s'.
+
+    :Returns:
+        a string with placeholders. for e.g.: '(%s,%s,%s)'
+    """
+    return f"({','.join([placeholder] * size)})"
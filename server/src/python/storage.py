@@ -0,0 +1,328 @@
+#!/usr/bin/env python3.7
+
+"""Interface of job queue storage."""
+
+import functools
+import re
+import time
+
+from constants import LEASE
+from metrics import REGISTRY
+
+# Storage backends by name from `backend` option of `storage` section.
+BACKENDS = ('mysql', 'sqlite')
+
+DB_SECONDS = REGISTRY.histogram('task_manager_db_seconds',
+                                'Latency of storage calls.',
+                                ('backend', 'method'))
+DB_ERRORS = REGISTRY.counter('task_manager_db_errors_total',
+                             'Failed storage calls.', ('backend', 'method'))
+DB_RETRIES = REGISTRY.counter('task_manager_db_retries_total',
+                              'Storage calls retried after connection '
+                              'errors.', ('backend', 'method'))
+# Columns of claimed jobs returned to workers.
+CLAIM_COLUMNS = ('id', 'client_host', 'job_type', 'job_arg', 'priority',
+                 'affinity', 'attempts')
+# Terminal job statuses, jobs with them are moved to history tables.
+ARCHIVED_STATUSES = ('finished', 'dead')
+# Columns copied to monthly history tables by archival.
+HISTORY_JOB_COLUMNS = ('id', 'client_host', 'job_type', 'job_arg', 'status',
+                       'ctime', 'stime', 'mtime')
+HISTORY_RESULT_COLUMNS = ('id', 'job_id', 'result', 'result_info',
+                          'run_time')
+HISTORY_TABLE = re.compile(r'^job_queue_history_(\d{6})$')
+
+
+class StorageException(Exception):
+    """Base storage Exception Error class."""
+    pass
+
+
+class Storage:
+
+    """Job queue storage used by server handlers.
+
+    Every method runs in its own transaction and raises
+    `StorageException` if it failed.
+    """
+
+    def create_job(self, job_info):
+        """Create new job.
+
+        :Parameters:
+            - `job_info`: dictionary with client host, job type and job
+                          argument. for e.g.:
+                          {'client_host': 'localhost', 'job_type': 'create',
+                           'job_arg': '/tmp/text.txt', 'priority': 0,
+                           'affinity': 'localhost'}
+        """
+        raise NotImplementedError
+
+    def create_jobs(self, jobs):
+        """Create many jobs in one transaction.
+
+        :Parameters:
+            - `jobs`: list of dictionaries like in `create_job`.
+        """
+        raise NotImplementedError
+
+    def update_job(self, job_info, result_info=None):
+        """Update job.
+
+        :Parameters:
+            - `job_info: dictionary with job_info to update. for e.g.:
+                         {'id': 1, 'status': 'finished', 'stime': 1553207811}
+            - `result_info`: dictionary with job result info.
+                            by default None. for e.g.:
+                            {'result': 'PASS',
+                             'result_info: 'File test.txt created'}
+        """
+        raise NotImplementedError
+
+    def update_jobs(self, results):
+        """Finish many jobs and save their results in one transaction.
+
+        Only jobs still in progress under reporting claim are finished,
+        see `held_results`. Results of unknown jobs, of dead or finished
+        ones and late results of claims whose lease expired are dropped.
+
+        :Parameters:
+            - `results`: list of (job_info, result_info) pairs like
+                         in `update_job`.
+
+        :Returns:
+            list of ids of finished jobs.
+        """
+        raise NotImplementedError
+
+    def get_jobs(self, limit=1, lease=LEASE, affinities=(),
+                 stale_before=None):
+        """Claim new jobs, so no other worker gets them.
+
+        Jobs pinned to one of `affinities` are claimed first, then jobs
+        without affinity, then jobs pinned elsewhere created before
+        `stale_before`, oldest first regardless of priority. Other jobs
+        are claimed in order of `scheduler.Scheduler` of `[scheduler]`
+        config section, or oldest first with `fifo` policy. Claimed job
+        is held until `lease_expiry`, then reaper returns it to queue,
+        see `requeue_expired`.
+
+        :Parameters:
+            - `limit`: max amount of jobs to claim. by default 1.
+            - `lease`: seconds jobs are held. by default `LEASE`.
+            - `affinities`: hosts and labels of worker. by default none.
+            - `stale_before`: timestamp, pinned jobs created before it
+                              go to any worker. by default never.
+
+        :Returns:
+            List of dictionaries with job information. for e.g.:
+            [{'id': 1, 'client_host: 'localhost',
+              'job_type': 'create', 'job_arg': 'test.txt', 'priority': 0,
+              'affinity': 'localhost', 'attempts': 1,
+              'status': 'in_progress', 'stime': 1553207811,
+              'lease_expiry': 1553208111}]
+        """
+        raise NotImplementedError
+
+    def get_job(self, lease=LEASE, affinities=(), stale_before=None):
+        """Get new job to process it.
+
+        :Parameters:
+            - `lease`: seconds job is held. by default `LEASE`.
+            - `affinities`: hosts and labels of worker like in `get_jobs`.
+            - `stale_before`: timestamp like in `get_jobs`.
+
+        :Returns:
+            1) Empty dict if no jobs in queue with status 'new'.
+            2) Dictionary with job information like in `get_jobs`.
+        """
+        jobs = self.get_jobs(1, lease, affinities, stale_before)
+        return jobs[0] if jobs else {}
+
+    def has_new_jobs(self):
+        """Check if queue has new jobs of any affinity.
+
+        :Returns:
+            True if there are jobs with status 'new'.
+        """
+        raise NotImplementedError
+
+    def extend_leases(self, ids, lease=LEASE):
+        """Extend leases of jobs still in progress.
+
+        :Parameters:
+            - `ids`: list of job ids.
+            - `lease`: seconds jobs are held from now. by default `LEASE`.
+
+        :Returns:
+            list of ids of extended jobs.
+        """
+        raise NotImplementedError
+
+    def requeue_expired(self, now, limit, max_attempts):
+        """Return jobs with expired leases to queue.
+
+        Oldest expired jobs are switched back to 'new', or to 'dead'
+        if they were claimed `max_attempts` times.
+
+        :Parameters:
+            - `now`: current timestamp.
+            - `limit`: max amount of jobs handled in one transaction.
+            - `max_attempts`: max amount of claims of job.
+
+        :Returns:
+            (amount of requeued jobs, amount of dead jobs) tuple.
+        """
+        raise NotImplementedError
+
+    def archive_jobs(self, before, limit, status='finished'):
+        """Move jobs of terminal status with results to history tables.
+
+        Jobs go to `job_queue_history_<YYYYMM>` and
+        `job_result_history_<YYYYMM>` tables by month of creation time,
+        see `history_tables`. One status is moved at once, so selection
+        runs over `idx_status_mtime` index in mtime order.
+
+        :Parameters:
+            - `before`: timestamp, jobs modified before it are moved.
+            - `limit`: max amount of jobs moved in one transaction.
+            - `status`: one of `ARCHIVED_STATUSES`. by default 'finished'.
+
+        :Returns:
+            amount of moved jobs.
+        """
+        raise NotImplementedError
+
+    def history_months(self):
+        """Get months of existing history tables.
+
+        :Returns:
+            sorted list of months as YYYYMM integers.
+        """
+        raise NotImplementedError
+
+    def drop_history(self, month):
+        """Drop history tables of month.
+
+        :Parameters:
+            - `month`: YYYYMM integer.
+        """
+        raise NotImplementedError
+
+    def count_jobs(self):
+        """Count jobs by status.
+
+        :Returns:
+            dictionary with amount of jobs by status. for e.g.:
+            {'new': 10, 'in_progress': 2, 'finished': 100}
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release storage resources."""
+        pass
+
+
+def measured(backend, name):
+    """Decorator of storage call that records its latency and failures.
+
+    :Parameters:
+        - `backend`: a string with backend name.
+        - `name`: a string with storage method name.
+    """
+    def decorator(call):
+        @functools.wraps(call)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return call(*args, **kwargs)
+            except StorageException:
+                DB_ERRORS.inc(backend, name)
+                raise
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - start,
+                                   backend, name)
+        return wrapper
+    return decorator
+
+
+def held_results(results, claims):
+    """Get results of jobs held by reporting claim.
+
+    Claim is identified by its start time and attempt, so late result
+    of expired claim does not finish job claimed again. Results without
+    attempt, for e.g. from spool of older client, match by start time.
+
+    :Parameters:
+        - `results`: list of (job_info, result_info) pairs.
+        - `claims`: dictionary with (stime, attempts) tuples of jobs in
+                    progress by id.
+
+    :Returns:
+        (list of held pairs, list of ids of dropped results) tuple.
+        Every job is held once, repeated results of it are dropped.
+    """
+    held = []
+    dropped = []
+    for job_info, result_info in results:
+        claim = claims.get(job_info['id'])
+        if claim is not None and job_info['stime'] == claim[0] and \
+                job_info.get('attempts', claim[1]) == claim[1]:
+            del claims[job_info['id']]
+            held.append((job_info, result_info))
+        else:
+            dropped.append(job_info['id'])
+    return held, dropped
+
+
+def history_month(timestamp):
+    """Get history month of job.
+
+    :Parameters:
+        - `timestamp`: job creation time.
+
+    :Returns:
+        UTC month as YYYYMM integer. for e.g.: 201903
+    """
+    return int(time.strftime('%Y%m', time.gmtime(timestamp)))
+
+
+def history_tables(month):
+    """Get names of history tables of month.
+
+    :Parameters:
+        - `month`: YYYYMM integer.
+
+    :Returns:
+        (jobs table, results table) tuple of strings. for e.g.:
+        ('job_queue_history_201903', 'job_result_history_201903')
+    """
+    month = int(month)
+    return f'job_queue_history_{month}', f'job_result_history_{month}'
+
+
+def create_storage(config, logger):
+    """Create storage for configured backend.
+
+    Backend modules are imported on demand, so MySql driver is not
+    needed by deployments on SQLite.
+
+    :Parameters:
+        - `config`: configparser instance.
+        - `logger': logging.logger instance.
+
+    :Exceptions:
+        - `ValueError`: is raised if backend is unknown.
+
+    :Returns:
+        Storage instance.
+    """
+    backend = config.get('storage', 'backend', fallback='mysql')
+    if backend == 'mysql':
+        from mysql_client import MySqlClient
+        return MySqlClient(config, logger)
+    if backend == 'sqlite':
+        from sqlite_client import SqliteClient
+        return SqliteClient(config, logger)
+    raise ValueError(f'Unknown storage backend: {backend}, '
+                     f'expected one of {BACKENDS}')
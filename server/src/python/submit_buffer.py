@@ -0,0 +1,153 @@
+#!/usr/bin/env python3.7
+
+"""Group commit of submitted jobs."""
+
+import threading
+import time
+
+from concurrent.futures import Future
+
+from constants import DELAY
+from metrics import REGISTRY
+from storage import StorageException
+
+# Acknowledge submission after its jobs are committed or once buffered.
+MODES = ('flush', 'enqueue')
+
+FLUSH_JOBS = REGISTRY.histogram('task_manager_submit_flush_jobs',
+                                'Jobs inserted by one flush of submit '
+                                'buffer.', buckets=(1, 10, 100, 1000, 10000))
+
+
+class SubmitBuffer:
+
+    """Buffer of submitted jobs inserted by background thread.
+
+    Jobs of all requests are inserted by one multi-row transaction every
+    `interval` seconds or as soon as `max_jobs` are pending. In `flush`
+    mode submission returns after its jobs are committed. In `enqueue`
+    mode it returns once jobs are buffered, so buffered jobs are lost if
+    server crashes, and failed flushes are retried.
+    """
+
+    def __init__(self, storage, logger, mode='flush', max_jobs=1000,
+                 interval=0.005, max_pending=100000, on_flush=None):
+        """Initialize buffer and start flushing thread.
+
+        :Parameters:
+            - `storage`: Storage instance.
+            - `logger`: logging.logger instance.
+            - `mode`: a string with acknowledge mode from `MODES`.
+            - `max_jobs`: amount of pending jobs that are flushed at once.
+            - `interval`: max seconds job waits for flush.
+            - `max_pending`: max amount of buffered jobs in `enqueue`
+                             mode, submissions over it are rejected.
+            - `on_flush`: function called with amount of inserted jobs.
+
+        :Exceptions:
+            - `ValueError`: is raised if mode is unknown.
+        """
+        if mode not in MODES:
+            raise ValueError(f'Unknown submit mode: {mode}, '
+                             f'expected one of {MODES}')
+        self.logger = logger
+        self.__storage = storage
+        self.__mode = mode
+        self.__max_jobs = max_jobs
+        self.__interval = interval
+        self.__max_pending = max_pending
+        self.__on_flush = on_flush
+        self.__pending = []
+        # Monotonic time when first pending job was buffered.
+        self.__first = 0
+        # Future of pending jobs flush.
+        self.__batch = Future()
+        self.__closed = False
+        self.__cond = threading.Condition()
+        self.__flusher = threading.Thread(target=self.__run,
+                                          name='submit-buffer', daemon=True)
+        self.__flusher.start()
+
+    def submit(self, jobs):
+        """Buffer jobs.
+
+        :Parameters:
+            - `jobs`: list of job dictionaries like in
+                      `Storage.create_jobs`.
+
+        :Exceptions:
+            - `StorageException`: is raised if jobs were not buffered or,
+                                  in `flush` mode, not inserted.
+        """
+        with self.__cond:
+            if self.__closed:
+                raise StorageException('Submit buffer is closed')
+            if self.__mode == 'enqueue' and \
+                    len(self.__pending) >= self.__max_pending:
+                raise StorageException('Submit buffer is full')
+            if not self.__pending:
+                self.__first = time.monotonic()
+                self.__cond.notify()
+            self.__pending.extend(jobs)
+            if len(self.__pending) >= self.__max_jobs:
+                self.__cond.notify()
+            batch = self.__batch
+        if self.__mode == 'flush':
+            batch.result()
+
+    def __run(self):
+        """Flush pending jobs until buffer is closed."""
+        while True:
+            with self.__cond:
+                while not self.__pending and not self.__closed:
+                    self.__cond.wait()
+                if not self.__pending:
+                    return
+                deadline = self.__first + self.__interval
+                while len(self.__pending) < self.__max_jobs \
+                        and not self.__closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__cond.wait(remaining)
+                jobs = self.__pending
+                batch = self.__batch
+                self.__pending = []
+                self.__batch = Future()
+            self.__flush(jobs, batch)
+
+    def __flush(self, jobs, batch):
+        """Insert jobs and resolve their future.
+
+        :Parameters:
+            - `jobs`: list of job dictionaries.
+            - `batch`: Future of submissions waiting for jobs.
+        """
+        try:
+            self.__storage.create_jobs(jobs)
+        except StorageException as error:
+            if self.__mode == 'flush':
+                batch.set_exception(error)
+                return
+            with self.__cond:
+                if self.__closed:
+                    self.logger.error('Lost %d submitted jobs on close: %s',
+                                      len(jobs), error)
+                    return
+                self.__pending[:0] = jobs
+                self.__first = time.monotonic()
+            self.logger.error('Failed to flush %d submitted jobs, will '
+                              'retry: %s', len(jobs), error)
+            time.sleep(DELAY)
+            return
+        FLUSH_JOBS.observe(len(jobs))
+        batch.set_result(len(jobs))
+        if self.__on_flush:
+            self.__on_flush(len(jobs))
+
+    def close(self):
+        """Flush pending jobs and stop flushing thread."""
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify()
+        self.__flusher.join()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3.7
+
+"""Archival of finished and dead jobs and purge of job history.
+
+Moves jobs finished or dead before retention window with their results
+from `job_queue` and `job_result` to monthly history tables by job
+creation time, then drops history tables older than kept months. Defaults come
+from `[archive]` section of server config. Usage from `src/python`
+directory:
+
+    python3 -m tools.archive
+    python3 -m tools.archive --retention-days 30 --keep-months 6
+    python3 -m tools.archive --list
+"""
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+from archiver import Archiver
+from constants import ARCHIVE_BATCH, ARCHIVE_KEEP_MONTHS, ARCHIVE_PAUSE, \
+    ARCHIVE_RETENTION_DAYS
+from storage import create_storage
+from tools.config_init import config, logger
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='archival of finished and dead jobs',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-r', '--retention-days',
+                        type=float,
+                        default=config.getfloat(
+                            'archive', 'retention_days',
+                            fallback=ARCHIVE_RETENTION_DAYS),
+                        help='Days finished and dead jobs stay in job_queue.')
+    parser.add_argument('-b', '--batch-size',
+                        type=int,
+                        default=config.getint('archive', 'batch_size',
+                                              fallback=ARCHIVE_BATCH),
+                        help='Max amount of jobs moved by one transaction.')
+    parser.add_argument('-p', '--pause-ms',
+                        type=float,
+                        default=config.getfloat('archive', 'pause_ms',
+                                                fallback=ARCHIVE_PAUSE),
+                        help='Milliseconds between transactions.')
+    parser.add_argument('-k', '--keep-months',
+                        type=int,
+                        default=config.getint('archive', 'keep_months',
+                                              fallback=ARCHIVE_KEEP_MONTHS),
+                        help='Months of history tables kept, 0 keeps all.')
+    parser.add_argument('-l', '--list',
+                        action='store_true',
+                        help='Only list months of history tables.')
+    return parser.parse_args()
+
+
+def main():
+    args = args_parser()
+    storage = create_storage(config, logger)
+    try:
+        if args.list:
+            print(f'History months: {storage.history_months() or "none"}')
+            return
+        archiver = Archiver(storage, logger, args.retention_days,
+                            args.batch_size, args.pause_ms / 1000,
+                            args.keep_months)
+        moved, dropped = archiver.run()
+        print(f'Archived jobs: {moved}')
+        print(f'Dropped history months: {dropped or "none"}')
+    finally:
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3.7
+
+"""Benchmark of job claim latency against job_queue size.
+
+Fills scratch database with finished jobs and a tail of new ones, then
+measures `MySqlClient.get_jobs` latency without claim indexes and with
+them. Schema is migrated to latest version, so claim queries match the
+server, only claim indexes are dropped and created again. Usage from
+`src/python` directory:
+
+    python3 -m tools.bench_claim --sizes 10000 100000 1000000
+"""
+
+import configparser
+import statistics
+import time
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+from mysql_client import MySqlClient
+from tools.config_init import config, logger
+from tools.migrate import connect, migrate
+
+BATCH = 10000
+# Indexes of job_queue used by claim queries.
+CLAIM_INDEXES = ('idx_status_ctime', 'idx_status_affinity_priority_host',
+                 'idx_status_affinity_ctime')
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='claim latency benchmark',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-s', '--sizes',
+                        type=int,
+                        nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Amounts of rows in job_queue to test.')
+    parser.add_argument('-n', '--claims',
+                        type=int,
+                        default=200,
+                        help='Amount of measured claims per size.')
+    parser.add_argument('-d', '--database',
+                        default='task_manager_bench',
+                        help='Scratch database name. It is dropped!')
+    return parser.parse_args()
+
+
+def fill(cnx, size, new_jobs):
+    """Fill job_queue with finished jobs and `new_jobs` new ones."""
+    now = int(time.time())
+    sql_query = ('INSERT INTO job_queue (client_host, job_type, job_arg, '
+                 'status, ctime, stime, mtime) '
+                 'VALUES (%s, %s, %s, %s, %s, %s, %s)')
+    with cnx.cursor() as cursor:
+        for start in range(0, size, BATCH):
+            rows = []
+            for i in range(start, min(start + BATCH, size)):
+                status = 'new' if i >= size - new_jobs else 'finished'
+                ctime = now - size + i
+                rows.append(('localhost', 'count', f'/tmp/{i}',
+                             status, ctime, ctime, ctime))
+            cursor.executemany(sql_query, rows)
+            cnx.commit()
+
+
+def drop_claim_indexes(cnx):
+    """Drop claim indexes of job_queue.
+
+    :Returns:
+        list of statements that create dropped indexes again.
+    """
+    placeholders = ', '.join(['%s'] * len(CLAIM_INDEXES))
+    with cnx.cursor() as cursor:
+        cursor.execute('SELECT index_name, column_name '
+                       'FROM information_schema.statistics '
+                       'WHERE table_schema = DATABASE() '
+                       "AND table_name = 'job_queue' "
+                       f'AND index_name IN ({placeholders}) '
+                       'ORDER BY index_name, seq_in_index', CLAIM_INDEXES)
+        columns = {}
+        for index_name, column_name in cursor.fetchall():
+            columns.setdefault(index_name, []).append(column_name)
+        for index_name in columns:
+            cursor.execute(f'ALTER TABLE job_queue DROP INDEX {index_name}')
+    return [f'ALTER TABLE job_queue ADD INDEX {index_name} '
+            f'({", ".join(index_columns)})'
+            for index_name, index_columns in columns.items()]
+
+
+def measure(mysql_client, claims):
+    """Measure claims latency in milliseconds."""
+    latencies = []
+    for _ in range(claims):
+        start = time.perf_counter()
+        mysql_client.get_jobs(1)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {'median': statistics.median(latencies),
+            'p99': latencies[int(len(latencies) * 0.99) - 1]}
+
+
+def main():
+    args = args_parser()
+    bench_config = configparser.RawConfigParser()
+    bench_config.read_dict(config)
+    bench_config.set('db', 'name', args.database)
+    # Claims are logged on INFO level, keep output for results only.
+    logger.setLevel('WARNING')
+    print(f'{"rows":>10} {"index":>6} {"median ms":>10} {"p99 ms":>10}')
+    for size in args.sizes:
+        for with_index in (False, True):
+            cnx = connect(bench_config)
+            with cnx.cursor() as cursor:
+                cursor.execute(f'DROP DATABASE `{args.database}`')
+            cnx.close()
+            cnx = connect(bench_config)
+            migrate(cnx)
+            # Rows are inserted without indexes, then indexes are built.
+            create_indexes = drop_claim_indexes(cnx)
+            fill(cnx, size, args.claims)
+            if with_index:
+                with cnx.cursor() as cursor:
+                    for statement in create_indexes:
+                        cursor.execute(statement)
+            cnx.close()
+            mysql_client = MySqlClient(bench_config, logger)
+            result = measure(mysql_client, args.claims)
+            mysql_client.pool.close()
+            print(f'{size:>10} {"yes" if with_index else "no":>6} '
+                  f'{result["median"]:>10.3f} {result["p99"]:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
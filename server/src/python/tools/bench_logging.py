@@ -0,0 +1,141 @@
+#!/usr/bin/env python3.7
+
+"""Benchmark of logging overhead in request threads.
+
+Compares old synchronous file logging of eagerly formatted f-strings
+with queue logging of lazy %-style messages, both for enabled messages
+and for disabled DEBUG ones. Time spent by logging threads is measured,
+which is what request latency pays. Usage from `src/python` directory:
+
+    python3 -m tools.bench_logging --calls 20000 --threads 4
+    python3 -m tools.bench_logging --io-delay 0.2
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+from log_queue import start_queue_logging
+
+FORMAT = '%(asctime)s - [%(name)s:%(module)s] - %(levelname)s: %(message)s'
+# Jobs of typical claim request.
+JOBS = [{'id': i, 'client_host': '127.0.0.1', 'job_type': 'count',
+         'job_arg': f'/tmp/file_{i}', 'status': 'in_progress',
+         'stime': 1553207811} for i in range(10)]
+
+
+def eager_info(logger):
+    logger.info(f'Get new tasks: {JOBS}')
+
+
+def lazy_info(logger):
+    logger.info('Get new tasks: %s', JOBS)
+
+
+def eager_debug(logger):
+    logger.debug(f'Get new tasks: {JOBS}')
+
+
+def lazy_debug(logger):
+    logger.debug('Get new tasks: %s', JOBS)
+
+
+def guarded_debug(logger):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Get new tasks: %s', JOBS)
+
+
+# (name, logger level, queued, logging call).
+CASES = (('sync, enabled f-string', logging.DEBUG, False, eager_info),
+         ('queue, enabled %-style', logging.DEBUG, True, lazy_info),
+         ('sync, disabled f-string', logging.INFO, False, eager_debug),
+         ('disabled %-style', logging.INFO, True, lazy_debug),
+         ('disabled isEnabledFor', logging.INFO, True, guarded_debug))
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='logging overhead benchmark',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-c', '--calls',
+                        type=int,
+                        default=20000,
+                        help='Logging calls per thread.')
+    parser.add_argument('-t', '--threads',
+                        type=int,
+                        default=4,
+                        help='Amount of logging threads.')
+    parser.add_argument('--io-delay',
+                        type=float,
+                        default=0,
+                        help='Milliseconds added to every write, models\n'
+                             'slow disk or blocked console.')
+    return parser.parse_args()
+
+
+class SlowFileHandler(logging.FileHandler):
+
+    """File handler with delay of every write."""
+
+    def __init__(self, file_name, delay):
+        super().__init__(file_name)
+        self.__delay = delay
+
+    def emit(self, record):
+        if self.__delay:
+            time.sleep(self.__delay)
+        super().emit(record)
+
+
+def measure(name, level, queued, call, log_dir, calls, threads, io_delay):
+    """Log from threads.
+
+    :Returns:
+        (microseconds per call in logging thread, seconds to drain queue).
+    """
+    logger = logging.getLogger(f'bench_logging.{name}')
+    logger.propagate = False
+    logger.setLevel(level)
+    handler = SlowFileHandler(os.path.join(log_dir, f'{id(logger)}.log'),
+                              io_delay / 1000)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    logger.addHandler(handler)
+    listeners = start_queue_logging(logger.name) if queued else []
+    spent = []
+
+    def run():
+        start = time.perf_counter()
+        for _ in range(calls):
+            call(logger)
+        spent.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    start = time.perf_counter()
+    for listener in listeners:
+        # Listener marks every written record as done.
+        listener.queue.join()
+    drain = time.perf_counter() - start
+    return sum(spent) / (calls * threads) * 1e6, drain
+
+
+def main():
+    args = args_parser()
+    print(f'{"case":<26} {"us/call":>9} {"drain s":>9}')
+    with tempfile.TemporaryDirectory() as log_dir:
+        for name, level, queued, call in CASES:
+            per_call, drain = measure(name, level, queued, call, log_dir,
+                                      args.calls, args.threads,
+                                      args.io_delay)
+            print(f'{name:<26} {per_call:>9.2f} {drain:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3.7
+
+"""Micro-benchmark of insert and update throughput.
+
+Compares old string-building statements with cached parameterized ones
+and with multi-row `executemany` inserts. Statement building alone is
+measured without database, queries are run in scratch database.
+Usage from `src/python` directory:
+
+    python3 -m tools.bench_statements --rows 10000
+"""
+
+import configparser
+import time
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+from statements import insert_statement, update_statement
+from tools.config_init import config
+from tools.migrate import connect, migrate
+
+COLUMNS = ('client_host', 'job_type', 'job_arg', 'ctime', 'mtime')
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='sql statements benchmark',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-r', '--rows',
+                        type=int,
+                        default=10000,
+                        help='Amount of inserted and updated rows.')
+    parser.add_argument('-d', '--database',
+                        default='task_manager_bench',
+                        help='Scratch database name. It is dropped!')
+    parser.add_argument('--no-db',
+                        action='store_true',
+                        help='Measure statement building only.')
+    return parser.parse_args()
+
+
+def string_insert(data):
+    """Old way of INSERT building with values in sql text."""
+    data_set = [(column, f'"{value}"') for column, value in data.items()]
+    columns, values = list(zip(*data_set))
+    return (f"INSERT INTO job_queue ({','.join(columns)}) "
+            f"VALUES({','.join(values)})")
+
+
+def string_update(job_info):
+    """Old way of UPDATE building with values in sql text."""
+    data_set = [f'{column} = "{value}"' for column, value in job_info.items()
+                if column != 'id']
+    return (f"UPDATE job_queue SET {','.join(data_set)} "
+            f"WHERE id = '{job_info['id']}'")
+
+
+def jobs(rows):
+    """Generate job rows."""
+    now = int(time.time())
+    return [dict(zip(COLUMNS, ('localhost', 'count', f'/tmp/{i}', now, now)))
+            for i in range(rows)]
+
+
+def report(name, rows, seconds):
+    print(f'{name:<32} {rows / seconds:>12.0f} rows/s')
+
+
+def bench_building(data):
+    """Measure statement building cost only."""
+    start = time.perf_counter()
+    for job in data:
+        string_insert(job)
+    report('build string insert', len(data), time.perf_counter() - start)
+    start = time.perf_counter()
+    for job in data:
+        insert_statement('job_queue', tuple(job))
+        tuple(job.values())
+    report('build cached insert', len(data), time.perf_counter() - start)
+    start = time.perf_counter()
+    for i, job in enumerate(data, 1):
+        string_update({'id': i, 'status': 'finished', 'mtime': job['mtime']})
+    report('build string update', len(data), time.perf_counter() - start)
+    start = time.perf_counter()
+    for i, job in enumerate(data, 1):
+        update_statement('job_queue', ('status', 'mtime'))
+        ('finished', job['mtime'], i)
+    report('build cached update', len(data), time.perf_counter() - start)
+
+
+def bench_queries(cnx, data):
+    """Measure queries in scratch database."""
+    def timed(name, func):
+        with cnx.cursor() as cursor:
+            cursor.execute('TRUNCATE TABLE job_queue')
+        start = time.perf_counter()
+        with cnx.cursor() as cursor:
+            func(cursor)
+        cnx.commit()
+        report(name, len(data), time.perf_counter() - start)
+
+    def string_inserts(cursor):
+        for job in data:
+            cursor.execute(string_insert(job))
+
+    def cached_inserts(cursor):
+        for job in data:
+            cursor.execute(insert_statement('job_queue', tuple(job)),
+                           tuple(job.values()))
+
+    def many_inserts(cursor):
+        cursor.executemany(insert_statement('job_queue', COLUMNS),
+                           [tuple(job.values()) for job in data])
+
+    def string_updates(cursor):
+        many_inserts(cursor)
+        cnx.commit()
+        start = time.perf_counter()
+        for i in range(1, len(data) + 1):
+            cursor.execute(string_update({'id': i, 'status': 'finished'}))
+        return time.perf_counter() - start
+
+    def cached_updates(cursor):
+        many_inserts(cursor)
+        cnx.commit()
+        start = time.perf_counter()
+        sql_query = update_statement('job_queue', ('status', ))
+        for i in range(1, len(data) + 1):
+            cursor.execute(sql_query, ('finished', i))
+        return time.perf_counter() - start
+
+    timed('string insert', string_inserts)
+    timed('cached insert', cached_inserts)
+    timed('executemany insert', many_inserts)
+    for name, func in (('string update', string_updates),
+                       ('cached update', cached_updates)):
+        with cnx.cursor() as cursor:
+            cursor.execute('TRUNCATE TABLE job_queue')
+            seconds = func(cursor)
+        cnx.commit()
+        report(name, len(data), seconds)
+
+
+def main():
+    args = args_parser()
+    data = jobs(args.rows)
+    bench_building(data)
+    if args.no_db:
+        return
+    bench_config = configparser.RawConfigParser()
+    bench_config.read_dict(config)
+    bench_config.set('db', 'name', args.database)
+    cnx = connect(bench_config)
+    with cnx.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE `{args.database}`')
+    cnx.close()
+    cnx = connect(bench_config)
+    try:
+        migrate(cnx)
+        # Keep job_result foreign key from blocking truncation.
+        with cnx.cursor() as cursor:
+            cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+        bench_queries(cnx, data)
+    finally:
+        cnx.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,18 @@ import configparser
 import logging.config
 import os
 
+from log_queue import start_queue_logging
+
 # Variables from enviroment.
 ENV_DIR = '/home/ruslan/git/task_manager/server'
-CONF_ROOT = f'{ENV_DIR}/etc'
+# Config directory can be replaced, for e.g. by benchmarks.
+CONF_ROOT = os.environ.get('TASK_MANAGER_CONF', f'{ENV_DIR}/etc')
 
 # Logging initialization.
 logger_conf = os.path.join(CONF_ROOT, "logger.conf")
 logging.config.fileConfig(logger_conf)
+# File and console output is written by background threads.
+start_queue_logging('', 'task_manager')
 logger = logging.getLogger('task_manager')
 
 # Config initialization.
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3.7
+
+"""End-to-end load generator of task system.
+
+Starts server in separate process against local storage, submits jobs
+from M submitters and processes them by N simulated workers, which claim
+jobs, sleep for service time of job type and report results. Latency
+percentiles of submit, claim and report requests and jobs per second are
+printed and saved as json, previous results are compared with `--compare`.
+Usage from `src/python` directory:
+
+    python3 -m tools.loadgen --jobs 20000 --workers 16 --submitters 4 \\
+        --mix count:3:1 execute:1:5 --output loadgen.json
+"""
+
+import configparser
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+from tools.config_init import config
+
+# Directory of server module.
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Logging of server process, only problems are written.
+LOGGER_CONF = """[loggers]
+keys=root, task_manager
+
+[handlers]
+keys=fileHandler
+
+[formatters]
+keys=task_managerFormatter
+
+[logger_root]
+level=WARNING
+handlers=fileHandler
+
+[logger_task_manager]
+level=WARNING
+handlers=fileHandler
+qualname=task_manager
+propagate=0
+
+[handler_fileHandler]
+class=FileHandler
+level=WARNING
+formatter=task_managerFormatter
+args=(%(log_file)r, 'a')
+
+[formatter_task_managerFormatter]
+format=%%(asctime)s - [%%(name)s:%%(module)s] - %%(levelname)s: %%(message)s
+datefmt=
+"""
+OPERATIONS = ('submit', 'claim', 'report', 'pickup')
+# Source address of flood jobs, submitters use 127.0.0.2 and next ones.
+FLOOD_HOST = '127.0.0.250'
+
+
+def mix_arg(value):
+    """Parse job mix item like `count:3:1` to (type, weight, seconds)."""
+    parts = value.split(':')
+    if not 1 <= len(parts) <= 3 or not parts[0]:
+        raise ValueError(value)
+    weight = float(parts[1]) if len(parts) > 1 else 1.0
+    service_ms = float(parts[2]) if len(parts) > 2 else 0.0
+    return parts[0], weight, service_ms / 1000
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='task system load generator',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=10000,
+                        help='Amount of submitted jobs.')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=8,
+                        help='Amount of simulated workers, 0 only\n'
+                             'submits jobs.')
+    parser.add_argument('-s', '--submitters',
+                        type=int,
+                        default=2,
+                        help='Amount of submitters.')
+    parser.add_argument('-m', '--mix',
+                        type=mix_arg,
+                        nargs='+',
+                        default=[mix_arg('count:1:0')],
+                        help='Job mix as type:weight:service_ms items,\n'
+                             'for e.g. count:3:1 execute:1:5.')
+    parser.add_argument('-b', '--batch',
+                        type=int,
+                        default=1,
+                        help='Jobs per submit request, 1 submits single\n'
+                             'job object.')
+    parser.add_argument('-c', '--claim',
+                        type=int,
+                        default=1,
+                        help='Jobs per claim request.')
+    parser.add_argument('--wait',
+                        type=float,
+                        default=1,
+                        help='Long poll seconds of claim requests.')
+    parser.add_argument('--close',
+                        action='store_true',
+                        help='New connection for every request instead\n'
+                             'of keep-alive one.')
+    parser.add_argument('--backend',
+                        choices=['sqlite', 'mysql'],
+                        default='sqlite',
+                        help='Storage of server, mysql uses [db] section\n'
+                             'of server config.')
+    parser.add_argument('--mode',
+                        choices=['single', 'threaded', 'asyncio'],
+                        default='threaded',
+                        help='Concurrency model of server.')
+    parser.add_argument('--submit-mode',
+                        choices=['direct', 'flush', 'enqueue'],
+                        default='direct',
+                        help='Insert of submitted jobs by server: by\n'
+                             'request, or group commit acknowledged after\n'
+                             'flush or on enqueue.')
+    parser.add_argument('--submit-interval',
+                        type=float,
+                        default=5,
+                        help='Max milliseconds submitted job waits for\n'
+                             'group commit.')
+    parser.add_argument('--queue-state',
+                        choices=['off', 'local', 'shared'],
+                        default='shared',
+                        help='Cache of new jobs amount answering empty\n'
+                             'claims without storage query.')
+    parser.add_argument('--archive',
+                        type=float,
+                        default=0,
+                        help='Seconds between archival runs of server,\n'
+                             'which moves every finished job, 0 disables.')
+    parser.add_argument('--server-workers',
+                        type=int,
+                        default=10,
+                        help='Amount of server threads, in threaded mode\n'
+                             'every keep-alive connection holds one.')
+    parser.add_argument('--policy',
+                        choices=['fair', 'fifo'],
+                        default='fair',
+                        help='Claim policy of server.')
+    parser.add_argument('--priority',
+                        type=int,
+                        default=0,
+                        help='Priority of jobs of submitters.')
+    parser.add_argument('--flood',
+                        type=int,
+                        default=0,
+                        help='Amount of priority 0 jobs submitted from\n'
+                             'another host before run, pickup latency\n'
+                             'is measured for jobs of submitters only.')
+    parser.add_argument('--affinity',
+                        choices=['off', 'host'],
+                        default='off',
+                        help='off submits jobs for any worker, host pins\n'
+                             'jobs to submitting host and every worker\n'
+                             'advertises host of one submitter.')
+    parser.add_argument('--timeout',
+                        type=float,
+                        default=600,
+                        help='Max seconds of run.')
+    parser.add_argument('-o', '--output',
+                        help='Json file for results.')
+    parser.add_argument('--compare',
+                        help='Json file with results of previous run.')
+    return parser.parse_args()
+
+
+def free_port():
+    """Get free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_config(conf_dir, args, port):
+    """Write server and logger configs of benchmark server.
+
+    :Parameters:
+        - `conf_dir`: a string with path to config directory.
+        - `args`: parsed command line arguments.
+        - `port`: server port.
+    """
+    server_config = configparser.RawConfigParser()
+    server_config['server'] = {'host': '127.0.0.1',
+                               'port': str(port),
+                               'mode': args.mode,
+                               'workers': str(args.server_workers),
+                               'long_poll_waiters':
+                                   str(max(args.server_workers // 2, 1))}
+    server_config['storage'] = {'backend': args.backend}
+    server_config['queue_state'] = {
+        'enabled': str(args.queue_state != 'off'),
+        'shared': str(args.queue_state == 'shared')}
+    server_config['submit'] = {'mode': args.submit_mode,
+                               'interval_ms': str(args.submit_interval)}
+    server_config['archive'] = {'enabled': str(bool(args.archive)),
+                                'interval': str(args.archive),
+                                'retention_days': '0'}
+    server_config['scheduler'] = {'policy': args.policy}
+    server_config['affinity'] = {
+        'pinned_types': '' if args.affinity == 'off' else
+                        ','.join(job_type for job_type, _, _ in args.mix)}
+    server_config['sqlite'] = {'path': os.path.join(conf_dir, 'bench.db')}
+    if config.has_section('db'):
+        server_config['db'] = dict(config['db'])
+    with open(os.path.join(conf_dir, 'server.conf'), 'w') as f:
+        server_config.write(f)
+    log_file = os.path.join(conf_dir, 'server.log')
+    with open(os.path.join(conf_dir, 'logger.conf'), 'w') as f:
+        f.write(LOGGER_CONF % {'log_file': log_file})
+
+
+def start_server(conf_dir, port):
+    """Start server process and wait until it accepts connections.
+
+    :Exceptions:
+        - `RuntimeError`: is raised if server did not start.
+
+    :Returns:
+        subprocess.Popen instance.
+    """
+    env = dict(os.environ, TASK_MANAGER_CONF=conf_dir)
+    # Tracebacks of failed handlers go to stderr.
+    with open(os.path.join(conf_dir, 'stderr.log'), 'w') as stderr_log:
+        proc = subprocess.Popen([sys.executable, 'server.py'],
+                                cwd=SERVER_DIR, env=env,
+                                stdout=subprocess.DEVNULL, stderr=stderr_log)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'Server did not start, see {conf_dir}/server.log')
+
+
+class Recorder:
+
+    """Thread-safe collector of request latencies."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.samples = {operation: [] for operation in OPERATIONS}
+        self.errors = {operation: 0 for operation in OPERATIONS}
+        self.empty_claims = 0
+        self.finished = 0
+        # Submit time of jobs by job_arg.
+        self.submitted = {}
+
+    def add(self, operation, seconds, ok=True):
+        """Record request latency."""
+        with self.__lock:
+            self.samples[operation].append(seconds)
+            if not ok:
+                self.errors[operation] += 1
+
+    def submit(self, job_args, when):
+        """Record submit time of jobs."""
+        with self.__lock:
+            for job_arg in job_args:
+                self.submitted[job_arg] = when
+
+    def pickup(self, job_args, when):
+        """Record latency from submit to claim of jobs."""
+        with self.__lock:
+            for job_arg in job_args:
+                if job_arg in self.submitted:
+                    self.samples['pickup'].append(
+                        when - self.submitted.pop(job_arg))
+
+    def empty_claim(self):
+        """Record claim that got no jobs."""
+        with self.__lock:
+            self.empty_claims += 1
+
+    def finish(self, amount):
+        """Record reported jobs.
+
+        :Returns:
+            total amount of finished jobs.
+        """
+        with self.__lock:
+            self.finished += amount
+            return self.finished
+
+
+def request(conn, method, path, body=None, headers=None):
+    """Send request and measure its latency.
+
+    :Returns:
+        (status, body, seconds) tuple.
+    """
+    start = time.perf_counter()
+    conn.request(method, path, body, headers or {})
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, data, time.perf_counter() - start
+
+
+def submitter(port, jobs, args, recorder, rnd, index):
+    """Submit jobs of configured mix from own source address."""
+    types = [job_type for job_type, _, _ in args.mix]
+    weights = [weight for _, weight, _ in args.mix]
+    conn = http.client.HTTPConnection(
+        '127.0.0.1', port, source_address=(f'127.0.0.{2 + index}', 0))
+    sent = 0
+    while sent < jobs:
+        size = min(args.batch, jobs - sent)
+        items = [{'job_type': job_type, 'job_arg': f'{index}-{sent + i}',
+                  'priority': args.priority}
+                 for i, job_type in enumerate(rnd.choices(types, weights,
+                                                          k=size))]
+        body = json.dumps(items if args.batch > 1 else items[0])
+        recorder.submit([item['job_arg'] for item in items],
+                        time.perf_counter())
+        status, _, seconds = request(conn, 'POST', 'task', body)
+        recorder.add('submit', seconds, status == 201)
+        sent += size
+        if args.close:
+            conn.close()
+
+
+def worker(port, args, recorder, stop, index):
+    """Claim jobs, simulate their work and report results."""
+    service = {job_type: seconds for job_type, _, seconds in args.mix}
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    path = f'get_job?max={args.claim}&wait={args.wait}'
+    if args.affinity == 'host':
+        path += f'&host=127.0.0.{2 + index % max(args.submitters, 1)}'
+    while not stop.is_set():
+        status, body, seconds = request(conn, 'GET', path)
+        if args.close:
+            conn.close()
+        recorder.add('claim', seconds, status == 200)
+        jobs = json.loads(body) if status == 200 else []
+        if not jobs:
+            recorder.empty_claim()
+            continue
+        recorder.pickup([job['job_arg'] for job in jobs],
+                        time.perf_counter())
+        for job in jobs:
+            if service.get(job['job_type']):
+                time.sleep(service[job['job_type']])
+        results = [[job, {'result': 'PASS', 'result_info': 'loadgen'}]
+                   for job in jobs]
+        status, _, seconds = request(conn, 'PUT', 'job_result',
+                                     json.dumps(results))
+        if args.close:
+            conn.close()
+        recorder.add('report', seconds, status == 200)
+        if recorder.finish(len(jobs)) >= args.jobs + args.flood:
+            stop.set()
+
+
+def flood(port, args):
+    """Submit priority 0 jobs from flood host in batches."""
+    conn = http.client.HTTPConnection('127.0.0.1', port,
+                                      source_address=(FLOOD_HOST, 0))
+    sent = 0
+    while sent < args.flood:
+        size = min(1000, args.flood - sent)
+        items = [{'job_type': args.mix[0][0], 'job_arg': f'flood-{sent + i}',
+                  'affinity': ''}
+                 for i in range(size)]
+        status, _, _ = request(conn, 'POST', 'task', json.dumps(items))
+        if status != 201:
+            raise RuntimeError(f'Failed to submit flood jobs: {status}')
+        sent += size
+    conn.close()
+
+
+def percentiles(samples):
+    """Get latency statistics in milliseconds.
+
+    :Parameters:
+        - `samples`: list of latencies in seconds.
+
+    :Returns:
+        a dictionary with count, mean, p50, p90, p99 and max.
+    """
+    if not samples:
+        return {'count': 0}
+    samples = sorted(samples)
+
+    def rank(q):
+        return round(samples[min(int(q * len(samples)),
+                                 len(samples) - 1)] * 1000, 3)
+
+    return {'count': len(samples),
+            'mean': round(sum(samples) / len(samples) * 1000, 3),
+            'p50': rank(0.5),
+            'p90': rank(0.9),
+            'p99': rank(0.99),
+            'max': round(samples[-1] * 1000, 3)}
+
+
+def run(args, port):
+    """Run load against started server.
+
+    :Returns:
+        a dictionary with results.
+    """
+    recorder = Recorder()
+    stop = threading.Event()
+    rnd = random.Random(0)
+    workers = [threading.Thread(target=worker,
+                                args=(port, args, recorder, stop, i))
+               for i in range(args.workers)]
+    shares = [args.jobs // args.submitters +
+              (i < args.jobs % args.submitters)
+              for i in range(args.submitters)]
+    submitters = [threading.Thread(target=submitter,
+                                   args=(port, share, args, recorder,
+                                         random.Random(rnd.random()), i))
+                  for i, share in enumerate(shares)]
+    flood(port, args)
+    start = time.perf_counter()
+    for thread in workers + submitters:
+        thread.start()
+    for thread in submitters:
+        thread.join()
+    submitted = time.perf_counter() - start
+    if workers:
+        stop.wait(args.timeout)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {'params': {'jobs': args.jobs,
+                       'workers': args.workers,
+                       'submitters': args.submitters,
+                       'mix': [list(item) for item in args.mix],
+                       'batch': args.batch,
+                       'claim': args.claim,
+                       'wait': args.wait,
+                       'close': args.close,
+                       'backend': args.backend,
+                       'mode': args.mode,
+                       'submit_mode': args.submit_mode,
+                       'queue_state': args.queue_state,
+                       'archive': args.archive,
+                       'policy': args.policy,
+                       'priority': args.priority,
+                       'flood': args.flood,
+                       'affinity': args.affinity,
+                       'submit_interval': args.submit_interval,
+                       'server_workers': args.server_workers},
+            'env': {'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'cpus': os.cpu_count(),
+                    'time': int(time.time())},
+            'finished': recorder.finished,
+            'elapsed': round(elapsed, 3),
+            'jobs_per_sec': round(recorder.finished / elapsed, 1),
+            'submits_per_sec': round(args.jobs / submitted, 1),
+            'empty_claims': recorder.empty_claims,
+            'errors': recorder.errors,
+            'latency_ms': {operation: percentiles(recorder.samples[operation])
+                           for operation in OPERATIONS}}
+
+
+def report(result, previous=None):
+    """Print results and their change against previous run."""
+
+    def change(new, old):
+        if not old:
+            return ''
+        return f' ({(new - old) / old * 100:+.1f}%)'
+
+    prev_latency = (previous or {}).get('latency_ms', {})
+    print(f'finished {result["finished"]} jobs in {result["elapsed"]} s')
+    for key in ('jobs_per_sec', 'submits_per_sec'):
+        old = (previous or {}).get(key)
+        print(f'{key:<16} {result[key]:>10}{change(result[key], old)}')
+    print(f'{"latency ms":<10} {"count":>8} {"p50":>9} {"p90":>9} '
+          f'{"p99":>9} {"max":>9}')
+    for operation, stats in result['latency_ms'].items():
+        if not stats['count']:
+            continue
+        old = prev_latency.get(operation, {})
+        print(f'{operation:<10} {stats["count"]:>8} ' + ' '.join(
+            f'{stats[key]:>9}' for key in ('p50', 'p90', 'p99', 'max')) +
+            change(stats['p99'], old.get('p99')))
+    if any(result['errors'].values()):
+        print(f'errors: {result["errors"]}')
+
+
+def main():
+    args = args_parser()
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    port = free_port()
+    with tempfile.TemporaryDirectory() as conf_dir:
+        write_config(conf_dir, args, port)
+        proc = start_server(conf_dir, port)
+        try:
+            result = run(args, port)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    report(result, previous)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
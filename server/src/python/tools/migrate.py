@@ -0,0 +1,177 @@
+#!/usr/bin/env python3.7
+
+"""Database schema migration tool.
+
+Migrations are sql files in `db/migrations` named `<version>_<name>.sql`.
+Applied versions are recorded in `schema_migrations` table, so every
+migration runs only once. MySql driver is imported on connect, as SQLite
+backend loads its migrations from here. Usage from `src/python` directory:
+
+    python3 -m tools.migrate status
+    python3 -m tools.migrate up [--target VERSION]
+"""
+
+import os
+import re
+import time
+
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+from tools.config_init import ENV_DIR, config, logger
+
+MIGRATIONS_DIR = f'{ENV_DIR}/db/migrations'
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+
+class MigrationError(Exception):
+    """Base migration Exception Error class."""
+    pass
+
+
+def load_migrations(migrations_dir=MIGRATIONS_DIR):
+    """Load migrations from directory.
+
+    :Parameters:
+        - `migrations_dir`: a string with path to migrations directory.
+
+    :Exceptions:
+        - `MigrationError`: is raised if two files have same version.
+
+    :Returns:
+        list of (version, name, statements) tuples sorted by version.
+    """
+    migrations = {}
+    for file_name in os.listdir(migrations_dir):
+        match = MIGRATION_FILE.match(file_name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f'Duplicated migration version {version}')
+        with open(os.path.join(migrations_dir, file_name)) as f:
+            statements = split_statements(f.read())
+        migrations[version] = (version, match.group(2), statements)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql):
+    """Split sql script to separate statements.
+
+    :Parameters:
+        - `sql`: a string with sql script.
+
+    :Returns:
+        list of sql statements without comments.
+    """
+    lines = [line for line in sql.splitlines()
+             if not line.strip().startswith('--')]
+    statements = '\n'.join(lines).split(';')
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def connect(db_config=config):
+    """Connect to database, create it if it does not exist.
+
+    :Parameters:
+        - `db_config`: configparser instance with `db` section.
+
+    :Returns:
+        pymysql connection object.
+    """
+    import pymysql
+
+    name = db_config.get('db', 'name')
+    cnx = pymysql.connect(host=db_config.get('db', 'host'),
+                          user=db_config.get('db', 'user'),
+                          passwd=db_config.get('db', 'passwd'))
+    with cnx.cursor() as cursor:
+        cursor.execute(f'CREATE DATABASE IF NOT EXISTS `{name}`')
+    cnx.select_db(name)
+    return cnx
+
+
+def applied_versions(cnx):
+    """Get applied migration versions.
+
+    :Parameters:
+        - `cnx`: pymysql connection object.
+
+    :Returns:
+        set of applied versions.
+    """
+    with cnx.cursor() as cursor:
+        cursor.execute('CREATE TABLE IF NOT EXISTS schema_migrations('
+                       'version INT(11) NOT NULL, '
+                       'name VARCHAR(100) NOT NULL, '
+                       'applied_at INT(11) NOT NULL, '
+                       'PRIMARY KEY (version)'
+                       ') ENGINE = InnoDB DEFAULT CHARSET = utf8')
+        cursor.execute('SELECT version FROM schema_migrations')
+        return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(cnx, target=None, migrations_dir=MIGRATIONS_DIR):
+    """Apply not applied migrations up to target version.
+
+    DDL statements are committed implicitly by MySql, so migration is
+    recorded only after all its statements succeeded.
+
+    :Parameters:
+        - `cnx`: pymysql connection object.
+        - `target`: last version to apply. by default all migrations.
+        - `migrations_dir`: a string with path to migrations directory.
+
+    :Returns:
+        list of applied versions.
+    """
+    done = applied_versions(cnx)
+    applied = []
+    for version, name, statements in load_migrations(migrations_dir):
+        if version in done or (target is not None and version > target):
+            continue
+        logger.info(f'Applying migration {version}_{name}')
+        with cnx.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute('INSERT INTO schema_migrations '
+                           '(version, name, applied_at) VALUES (%s, %s, %s)',
+                           (version, name, int(time.time())))
+        cnx.commit()
+        applied.append(version)
+    return applied
+
+
+def args_parser():
+    # Parsing command line arguments.
+    parser = ArgumentParser(description='database migrations',
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument(dest='command',
+                        choices=['status', 'up'],
+                        action='store',
+                        help='status - show applied and pending migrations;\n'
+                             'up - apply pending migrations.')
+    parser.add_argument('-t', '--target',
+                        type=int,
+                        action='store',
+                        help='Last migration version to apply.')
+    return parser.parse_args()
+
+
+def main():
+    args = args_parser()
+    cnx = connect()
+    try:
+        if args.command == 'up':
+            applied = migrate(cnx, args.target)
+            print(f'Applied migrations: {applied or "none"}')
+        else:
+            done = applied_versions(cnx)
+            for version, name, _ in load_migrations():
+                state = 'applied' if version in done else 'pending'
+                print(f'{version:04d} {name}: {state}')
+    finally:
+        cnx.close()
+
+
+if __name__ == '__main__':
+    main()